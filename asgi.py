@@ -0,0 +1,303 @@
+import asyncio
+import json
+import logging
+import threading
+from asgiref.wsgi import WsgiToAsgi
+from webhook import admit_producer, check_duplicate, handle_news_webhook, handle_telegram_update, health_payload
+from webhook import MAX_STREAM_LINE_BYTES, STREAM_MIMETYPES, ingest_stream
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class BodyTooLarge(Exception):
+    """The request body exceeds MAX_BODY_BYTES."""
+
+
+class StreamBody:
+    """File-like view of a request body that a worker thread reads while the loop is still receiving it.
+
+    The loop calls `feed()` and `close()`; `readline()` blocks the reading
+    thread until a whole line (or `limit` bytes, or the end of the body) has
+    arrived. `feed()` waits while more than `high_water` bytes are unread, so
+    a producer sending faster than items are ingested is slowed down instead
+    of being buffered.
+    """
+
+    def __init__(self, loop, high_water):
+        self._loop = loop
+        self._high_water = high_water
+        self._cond = threading.Condition()
+        self._buffer = bytearray()
+        self._pos = 0
+        self._eof = False
+        self._drained = asyncio.Event()
+        self._drained.set()
+
+    def _unread(self):
+        # Caller holds the condition
+        return len(self._buffer) - self._pos
+
+    async def feed(self, chunk):
+        await self._drained.wait()
+        with self._cond:
+            self._buffer += chunk
+            if self._unread() >= self._high_water:
+                self._drained.clear()
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._eof = True
+            self._cond.notify()
+
+    def _wake_feeder(self):
+        with self._cond:
+            if self._unread() < self._high_water:
+                self._drained.set()
+
+    def readline(self, limit=-1):
+        with self._cond:
+            while True:
+                end = self._buffer.find(b'\n', self._pos) + 1
+                if end and (limit < 0 or end - self._pos <= limit):
+                    break
+                if 0 <= limit <= self._unread():
+                    end = self._pos + limit
+                    break
+                if self._eof:
+                    end = len(self._buffer)
+                    break
+                self._cond.wait()
+
+            line = bytes(self._buffer[self._pos:end])
+            self._pos = end
+            # Drop consumed bytes once they make up half the buffer, so each byte moves O(1) times
+            if self._pos * 2 >= len(self._buffer):
+                del self._buffer[:self._pos]
+                self._pos = 0
+            if self._unread() < self._high_water:
+                self._loop.call_soon_threadsafe(self._wake_feeder)
+            return line
+
+
+class WebhookASGI:
+    """ASGI app serving the hot webhook routes natively on the server's event loop.
+
+    `/news-webhook`, `/news-webhook/stream`, `/telegram-webhook` and `/health`
+    are handled here without going through WSGI or a per-request event loop.
+    Every other route falls through to the Flask app.
+    """
+
+    def __init__(self, flask_app, is_shutting_down=None):
+        self.fallback = WsgiToAsgi(flask_app)
+        self.is_shutting_down = is_shutting_down or (lambda: False)
+        self.routes = {
+            ('GET', '/health'): self.health,
+            ('POST', '/news-webhook'): self.news_webhook,
+            ('POST', '/news-webhook/stream'): self.news_webhook_stream,
+            ('POST', '/telegram-webhook'): self.telegram_webhook,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        handler = self.routes.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        if handler is None:
+            await self.fallback(scope, receive, send)
+            return
+
+        if self.is_shutting_down():
+            await self._send_json(send, {"error": "Service is shutting down"}, 503)
+            return
+        await handler(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # --------- Helpers ---------
+    @staticmethod
+    def _header(scope, wanted):
+        for name, value in scope.get('headers', []):
+            if name == wanted:
+                return value.decode('latin-1')
+        return None
+
+    def _content_type(self, scope):
+        value = self._header(scope, b'content-type')
+        return value.split(';')[0].strip() if value else None
+
+    @staticmethod
+    async def _read_json(receive):
+        """Read the request body and decode it as JSON; None if invalid.
+
+        Raises BodyTooLarge once the body grows past MAX_BODY_BYTES.
+        """
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise BodyTooLarge()
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                break
+        try:
+            return json.loads(b''.join(chunks))
+        except ValueError:
+            return None
+
+    async def _read_json_or_413(self, receive, send):
+        """`_read_json`, answering 413 itself for an oversized body; returns (data, answered)."""
+        try:
+            return await self._read_json(receive), False
+        except BodyTooLarge:
+            await self._send_json(send, {"error": f"Request body too large (max {MAX_BODY_BYTES} bytes)"}, 413)
+            return None, True
+
+    @staticmethod
+    async def _send_json(send, payload, status=200, headers=None):
+        body = json.dumps(payload).encode()
+        raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        raw_headers += [(name.lower().encode(), str(value).encode()) for name, value in (headers or {}).items()]
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    # --------- Native routes ---------
+    async def health(self, scope, receive, send):
+        await self._send_json(send, health_payload())
+
+    async def news_webhook(self, scope, receive, send):
+        if self._content_type(scope) != 'application/json':
+            await self._send_json(send, {"error": "Content-Type must be application/json"}, 415)
+            return
+
+        # A producer identified by header is rate limited before the body is even read
+        secret = self._header(scope, b'x-webhook-secret')
+        if secret:
+            producer, denied = admit_producer(secret)
+            if denied:
+                await self._send_json(send, *denied)
+                return
+
+        data, answered = await self._read_json_or_413(receive, send)
+        if answered:
+            return
+        if not isinstance(data, dict):
+            await self._send_json(send, {"error": "Invalid JSON body"}, 400)
+            return
+
+        if not secret:
+            producer, denied = admit_producer(data.get('secret'))
+            if denied:
+                await self._send_json(send, *denied)
+                return
+
+        try:
+            # Retries are answered from the in-memory dedup cache right here on the loop;
+            # anything else logs and plans with blocking SQLite writes, so keep it off the loop
+            payload, status, headers = (check_duplicate(data) or await asyncio.to_thread(
+                handle_news_webhook, data, producer, deduplicated=True))
+        except Exception as e:
+            logger.exception(f"Error processing webhook: {e}")
+            payload, status, headers = {"error": f"Internal server error: {str(e)}"}, 500, {}
+        await self._send_json(send, payload, status, headers)
+
+    @staticmethod
+    async def _receive_into(receive, body):
+        try:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                await body.feed(message.get('body', b''))
+                if not message.get('more_body'):
+                    return
+        finally:
+            body.close()
+
+    async def news_webhook_stream(self, scope, receive, send):
+        """Native /news-webhook/stream: each NDJSON item is acked while the rest of the body is still arriving.
+
+        WsgiToAsgi would read the whole body before calling the Flask view.
+        """
+        producer, denied = admit_producer(self._header(scope, b'x-webhook-secret'))
+        if denied:
+            await self._send_json(send, *denied)
+            return
+        if self._content_type(scope) not in STREAM_MIMETYPES:
+            await self._send_json(send, {"error": "Content-Type must be application/x-ndjson"}, 415)
+            return
+
+        loop = asyncio.get_running_loop()
+        body = StreamBody(loop, high_water=2 * MAX_STREAM_LINE_BYTES)
+        acks = asyncio.Queue()
+
+        def ingest():
+            # Each item is logged and planned with blocking SQLite writes, so parse on a worker thread
+            try:
+                for ack in ingest_stream(body, producer):
+                    loop.call_soon_threadsafe(acks.put_nowait, ack)
+            except Exception as e:
+                logger.exception(f"Error processing news stream: {e}")
+            finally:
+                loop.call_soon_threadsafe(acks.put_nowait, None)
+
+        receiving = asyncio.create_task(self._receive_into(receive, body))
+        ingesting = asyncio.create_task(asyncio.to_thread(ingest))
+        try:
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': [(b'content-type', b'application/x-ndjson')]})
+            while (ack := await acks.get()) is not None:
+                await send({'type': 'http.response.body', 'body': ack.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # A client that went away must not leave the ingest thread waiting for more lines
+            receiving.cancel()
+            body.close()
+            await ingesting
+
+    async def telegram_webhook(self, scope, receive, send):
+        update_json, answered = await self._read_json_or_413(receive, send)
+        if answered:
+            return
+
+        try:
+            payload, status = handle_telegram_update(update_json)
+        except Exception as e:
+            logger.exception(f"Error processing Telegram webhook: {e}")
+            payload, status = {"error": str(e)}, 500
+        await self._send_json(send, payload, status)
+
+
+def create_server(flask_app, host, port, is_shutting_down=None):
+    """Build a uvicorn server for `flask_app`; call `await server.serve()` on the bot's loop.
+
+    uvicorn is an optional dependency, only needed for SERVER_MODE=asgi.
+    """
+    try:
+        import uvicorn
+    except ImportError:
+        raise RuntimeError("SERVER_MODE=asgi requires uvicorn (pip install uvicorn)")
+
+    config = uvicorn.Config(
+        WebhookASGI(flask_app, is_shutting_down),
+        host=host,
+        port=port,
+        lifespan='off',
+        log_level='info',
+        access_log=False,
+    )
+    return uvicorn.Server(config)
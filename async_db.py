@@ -0,0 +1,147 @@
+import asyncio
+import functools
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import database
+from config import DB_READER_THREADS
+
+logger = logging.getLogger(__name__)
+
+# Connection plumbing is per thread and means nothing on an executor thread
+_NOT_EXPOSED = {"get_db_connection", "release_connection", "close_db_connection"}
+_READ_PREFIXES = ("get_", "count_")
+
+
+def is_read(name):
+    """Whether database.<name> only reads, and may run on a reader thread."""
+    return name.startswith(_READ_PREFIXES) or name == "unpack_webhook"
+
+
+class AsyncDatabase:
+    """Awaitable facade over database.py for code running on the event loop.
+
+    Every public function of database.py is available as a coroutine with the
+    same name and arguments (`await db.add_chat(...)`). Writes run on a single
+    writer thread, so they never contend with each other for SQLite's write
+    lock; reads run on a small pool of reader threads, which WAL mode lets
+    proceed alongside the writer. Each thread keeps its own pooled connection.
+
+    Threads without an event loop (Flask request threads, the message log
+    writer, the retention job) submit their writes with the blocking
+    `call()`. The only writes that bypass the writer thread are `init_db()`
+    and the migrations, which run at startup before anything else touches
+    the database.
+    """
+
+    def __init__(self, readers=DB_READER_THREADS):
+        self.readers = readers
+        self._lock = threading.Lock()
+        self._thread_state = threading.local()
+        self._writer = None
+        self._reader_pool = None
+        self._wrappers = {}
+        self.pending_reads = 0
+        self.pending_writes = 0
+        self.completed = 0
+
+    def _executor(self, write):
+        with self._lock:
+            if write:
+                if self._writer is None:
+                    self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer",
+                                                      initializer=self._mark_writer)
+                return self._writer
+            if self._reader_pool is None:
+                self._reader_pool = ThreadPoolExecutor(max_workers=self.readers, thread_name_prefix="db-reader")
+            return self._reader_pool
+
+    def _mark_writer(self):
+        self._thread_state.writer = True
+
+    def _queued(self, write, count):
+        with self._lock:
+            if write:
+                self.pending_writes += count
+            else:
+                self.pending_reads += count
+
+    def _call(self, write, func, args, kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                if write:
+                    self.pending_writes -= 1
+                else:
+                    self.pending_reads -= 1
+                self.completed += 1
+
+    async def run(self, func, *args, write=True, **kwargs):
+        """Run `func(*args, **kwargs)` on the writer thread (or a reader thread if `write` is False)."""
+        executor = self._executor(write)
+        self._queued(write, 1)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self._call, write, func, args, kwargs)
+
+    def call(self, func, *args, write=True, **kwargs):
+        """Blocking counterpart of `run()` for threads that have no event loop.
+
+        On the writer thread itself (inside a function given to `run()` or
+        `call()`), `func` runs inline instead of waiting on its own queue.
+        """
+        if write and getattr(self._thread_state, 'writer', False):
+            return func(*args, **kwargs)
+        executor = self._executor(write)
+        self._queued(write, 1)
+        try:
+            future = executor.submit(self._call, write, func, args, kwargs)
+        except RuntimeError:
+            # Executors refuse new work once the interpreter is exiting (the atexit message log flush)
+            self._queued(write, -1)
+            return func(*args, **kwargs)
+        return future.result()
+
+    def __getattr__(self, name):
+        # Looked up on database.py at call time, so functions added there are exposed too
+        if name.startswith("_") or name in _NOT_EXPOSED:
+            raise AttributeError(name)
+        func = getattr(database, name, None)
+        if not callable(func) or isinstance(func, type):
+            raise AttributeError(f"database has no function {name!r}")
+
+        wrapper = self._wrappers.get(name)
+        if wrapper is None or wrapper.__wrapped__ is not func:
+            write = not is_read(name)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await self.run(func, *args, write=write, **kwargs)
+
+            self._wrappers[name] = wrapper
+        return wrapper
+
+    def stats(self):
+        """Snapshot of queued and completed database calls."""
+        with self._lock:
+            return {
+                "readers": self.readers,
+                "pending_reads": self.pending_reads,
+                "pending_writes": self.pending_writes,
+                "completed": self.completed,
+            }
+
+    def shutdown(self):
+        """Finish queued calls and stop the executor threads."""
+        with self._lock:
+            writer, readers = self._writer, self._reader_pool
+            self._writer = self._reader_pool = None
+        if writer:
+            writer.shutdown(wait=True)
+        if readers:
+            readers.shutdown(wait=True)
+        logger.info("✅ Async database executors stopped.")
+
+
+# ✅ Shared async database facade for bot handlers and background jobs
+db = AsyncDatabase()
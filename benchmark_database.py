@@ -0,0 +1,113 @@
+"""
+Microbenchmark for database.py: per-call connections (the old behaviour) vs
+the pooled per-thread WAL connections.
+
+Each mode runs the same calls against its own throwaway database and prints
+calls per second, plus a threaded read/write mix that counts lock errors.
+
+    python benchmark_database.py --calls 2000 --threads 8
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import database
+
+# The pooled implementation, kept before per-call mode swaps it out
+POOLED = (database.get_db_connection, database.release_connection)
+OPERATIONS = ("add_chat", "get_all_chats", "log_message", "get_delivered_chat_ids", "get_market_prices")
+
+
+def legacy_connection():
+    """A fresh connection per call with SQLite defaults, as database.py used to open them."""
+    conn = sqlite3.connect(database.DATABASE_FILE, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def use_mode(mode, path):
+    database.DATABASE_FILE = path
+    if mode == "per-call":
+        database.get_db_connection = legacy_connection
+        database.release_connection = lambda conn: conn.close()
+    else:
+        database.get_db_connection = POOLED[0]
+        database.release_connection = POOLED[1]
+        database.close_db_connection()
+    database.init_db()
+    for chat_id in range(200):
+        database.add_chat(chat_id, f"chat {chat_id}", "private")
+    database.update_market_price("BTC", 60000.0, 1.5)
+
+
+def call(operation, index):
+    if operation == "add_chat":
+        database.add_chat(index % 500, f"chat {index}", "private")
+    elif operation == "get_all_chats":
+        database.get_all_chats()
+    elif operation == "log_message":
+        database.log_message(f"bench-{index // 100}", index % 100, index)
+    elif operation == "get_delivered_chat_ids":
+        database.get_delivered_chat_ids(f"bench-{index % 10}", list(range(50)))
+    elif operation == "get_market_prices":
+        database.get_market_prices()
+
+
+def run_serial(operation, calls):
+    started = time.perf_counter()
+    for index in range(calls):
+        call(operation, index)
+    return calls / (time.perf_counter() - started)
+
+
+def run_threaded(calls, threads):
+    """Half the threads write, half read; returns (calls/s, errors logged by database.py)."""
+    errors = []
+    handler = logging.Handler()
+    handler.emit = lambda record: errors.append(record) if record.levelno >= logging.ERROR else None
+    database.logger.addHandler(handler)
+
+    def worker(offset):
+        for index in range(calls // threads):
+            call("log_message" if offset % 2 else "get_delivered_chat_ids", offset * calls + index)
+
+    workers = [threading.Thread(target=worker, args=(offset,)) for offset in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    database.logger.removeHandler(handler)
+    return (calls // threads) * threads / elapsed, len(errors)
+
+
+def benchmark(calls, threads):
+    logging.getLogger().setLevel(logging.CRITICAL)
+    database.logger.setLevel(logging.ERROR)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("per-call", "pooled"):
+            use_mode(mode, os.path.join(tmp, f"{mode}.db"))
+            print(f"⏱  {mode}...")
+            results[mode] = {operation: run_serial(operation, calls) for operation in OPERATIONS}
+            results[mode]["threaded mix"], results[mode]["lock errors"] = run_threaded(calls, threads)
+        database.close_db_connection()
+
+    print(f"\n{'calls/s':26s}{'per-call':>12s}{'pooled':>12s}{'speedup':>10s}")
+    for operation in (*OPERATIONS, "threaded mix"):
+        before, after = results["per-call"][operation], results["pooled"][operation]
+        print(f"{operation:26s}{before:12.0f}{after:12.0f}{after / before:9.1f}x")
+    print(f"{'lock errors':26s}{results['per-call']['lock errors']:12d}{results['pooled']['lock errors']:12d}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000, help="calls per operation")
+    parser.add_argument("--threads", type=int, default=8, help="threads in the read/write mix")
+    args = parser.parse_args()
+    benchmark(args.calls, args.threads)
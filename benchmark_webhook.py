@@ -0,0 +1,154 @@
+"""
+Load benchmark for the webhook server: werkzeug (current default) vs ASGI mode.
+
+Each mode is started in its own subprocess against a throwaway database, then
+hammered with concurrent requests; requests per second and latency
+percentiles are printed per endpoint.
+
+    python benchmark_webhook.py --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BASE_PORT = 5101
+ENDPOINTS = ("health", "news")
+
+
+def serve(mode, port):
+    """Run the webhook app in `mode` the way main.py would, without the Telegram bot."""
+    from flask import Flask
+    import database
+    from webhook import webhook_bp
+    from dispatcher import dispatcher
+
+    # config.py configures DEBUG logging; keep log I/O out of the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+    database.init_db()
+    app = Flask(__name__)
+    app.register_blueprint(webhook_bp)
+
+    if mode == "werkzeug":
+        from werkzeug.serving import make_server
+        dispatcher.start()
+        make_server("127.0.0.1", port, app).serve_forever()
+    else:
+        from asgi import create_server
+
+        async def run():
+            dispatcher.start(asyncio.get_running_loop())
+            server = create_server(app, "127.0.0.1", port)
+            server.config.log_level = "warning"
+            await server.serve()
+
+        asyncio.run(run())
+
+
+def build_request(endpoint, index, secret):
+    if endpoint == "health":
+        return "GET", "/health", None
+    return "POST", "/news-webhook", {
+        "secret": secret,
+        "news": {"id": f"bench-{index}", "title": "Benchmark story", "content": "Load test", "tags": ["crypto"]},
+    }
+
+
+async def run_load(base_url, endpoint, total, concurrency, secret):
+    latencies, statuses = [], {}
+    counter = iter(range(total))
+
+    async def worker():
+        # One single-connection client per worker: a shared httpx pool becomes the
+        # bottleneck at high concurrency and would hide the server's behaviour
+        limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            for index in counter:
+                method, path, body = build_request(endpoint, index, secret)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        "rps": total / elapsed,
+        "p50": percentile(0.50),
+        "p99": percentile(0.99),
+        "statuses": statuses,
+    }
+
+
+async def wait_until_up(base_url, timeout=20):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not come up")
+
+
+def benchmark(modes, endpoints, total, concurrency):
+    from config import WEBHOOK_SECRET
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for offset, mode in enumerate(modes):
+            port = BASE_PORT + offset
+            env = dict(os.environ,
+                       DATABASE_FILE=os.path.join(tmp, f"{mode}.db"),
+                       DISPATCH_QUEUE_SIZE=str(total * len(endpoints) + 100))
+            server = subprocess.Popen([sys.executable, __file__, "--serve", mode, "--port", str(port)], env=env)
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                asyncio.run(wait_until_up(base_url))
+                for endpoint in endpoints:
+                    print(f"⏱  {mode:9s} {endpoint:7s} {total} requests, concurrency {concurrency}...")
+                    results.append((mode, endpoint, asyncio.run(
+                        run_load(base_url, endpoint, total, concurrency, WEBHOOK_SECRET))))
+            finally:
+                server.terminate()
+                server.wait()
+
+    print(f"\n{'mode':10s}{'endpoint':9s}{'req/s':>10s}{'p50 ms':>10s}{'p99 ms':>10s}  statuses")
+    for mode, endpoint, result in results:
+        print(f"{mode:10s}{endpoint:9s}{result['rps']:10.1f}{result['p50']:10.1f}{result['p99']:10.1f}  {result['statuses']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint and mode")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--modes", default="werkzeug,asgi")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--serve", choices=("werkzeug", "asgi"), help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=BASE_PORT, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+    else:
+        benchmark(args.modes.split(","), args.endpoints.split(","), args.requests, args.concurrency)
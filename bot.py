@@ -1,20 +1,42 @@
 import logging
 import asyncio
+import json
+import time
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from telegram.ext import filters  # Correctly import filters
 from telegram import Bot, Update
 from telegram.constants import ParseMode
 from telegram.ext import Updater, CommandHandler, CallbackContext, MessageHandler
 from telegram.ext.filters import MessageFilter
 from telegram.error import TelegramError
-from config import TELEGRAM_BOT_TOKEN
+from telegram.request import HTTPXRequest
+from config import TELEGRAM_BOT_TOKEN, BROADCAST_WORKERS, BROADCAST_SHARDS, TELEGRAM_GLOBAL_RATE
+from config import BROADCAST_SHARD_RATE_SHARE
 from config import WEBHOOK_URL
 import database
+from async_db import db
+from chat_registry import chat_registry
 from models import News
+from broadcaster import fan_out
+from ratelimit import limiter as rate_limiter
+from progress import registry as progress_registry, ProgressReporter, QueueProgressReporter
+from outbound import scheduler, LANE_INTERACTIVE, LANE_BREAKING, LANE_BULK, LANE_PRICE
+from update_processor import ChatOrderedUpdateProcessor
 
 logger = logging.getLogger(__name__)
 
-# Initialize the bot instance
-bot = Bot(token=TELEGRAM_BOT_TOKEN)
+# Initialize the bot instance (one pooled connection per broadcast worker)
+bot = Bot(token=TELEGRAM_BOT_TOKEN, request=HTTPXRequest(connection_pool_size=BROADCAST_WORKERS))
+
+async def reply(message, text, **kwargs):
+    """Reply to a message through the interactive lane of the outbound scheduler."""
+    return await scheduler.send(
+        message.chat_id, partial(message.reply_text, text, **kwargs), message.chat.type, lane=LANE_INTERACTIVE
+    )
 
 async def start_command(update: Update, context: CallbackContext) -> None:
     try:
@@ -31,7 +53,9 @@ async def start_command(update: Update, context: CallbackContext) -> None:
         )
 
         # ✅ Force completion of send_message BEFORE moving on
-        sent_message = await context.bot.send_message(chat_id=chat_id, text=welcome_message)
+        sent_message = await scheduler.send(
+            chat_id, partial(context.bot.send_message, chat_id=chat_id, text=welcome_message), lane=LANE_INTERACTIVE
+        )
         logger.info(f"✅ Message sent: {sent_message.message_id}")
 
         # Optional: Add a small delay to ensure no connection drop
@@ -58,9 +82,9 @@ async def start_command(update: Update, context: CallbackContext) -> None:
     
     # Store the chat in the database
     chat_title = update.effective_chat.title or f"Chat {chat_id}"  # Fallback title if none
-    database.add_chat(chat_id, chat_title, chat_type)
+    await db.add_chat(chat_id, chat_title, chat_type)
     
-    await update.message.reply_text(welcome_message)
+    await reply(update.message, welcome_message)
 
 logger.info("✅ Test message sent to chat")
 async def help_command(update: Update, context: CallbackContext) -> None:
@@ -82,7 +106,7 @@ async def help_command(update: Update, context: CallbackContext) -> None:
         "إنفترون داو - نبحث عن الجواهر ونموّلها"
     )
     
-    await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN)
+    await reply(update.message, help_text, parse_mode=ParseMode.MARKDOWN)
 
 # bot.py - Corrected Functions
 
@@ -109,19 +133,19 @@ async def about_command(update: Update, context: CallbackContext) -> None:
         "لأن هذا البوت ليس مجرد أداة للنشر، بل هو جزء من منظومة إنفترون داو التي تقود مستقبل الاستثمار والتمويل اللامركزي عبر تقنيات البلوك تشين. هدفنا تعزيز الشفافية، تمكين المجتمعات، ونشر المعرفة المالية الدقيقة والمحدثة.\n\n"
         "📱 هذا البوت مقدم حصرياً من: *إنفترون داو* \"نبحث عن الجواهر... ونموّلها\""
     )
-    await update.message.reply_text(about_text, parse_mode=ParseMode.MARKDOWN)  # Added await
+    await reply(update.message, about_text, parse_mode=ParseMode.MARKDOWN)  # Added await
 
 async def status_command(update: Update, context: CallbackContext) -> None:
     """Handle the /status command to check if the bot is working."""
-    await update.message.reply_text("✅ بوت أخبار الكريبتو يعمل بنجاح!")  # Added await
+    await reply(update.message, "✅ بوت أخبار الكريبتو يعمل بنجاح!")  # Added await
 
 async def price_command(update: Update, context: CallbackContext) -> None:
     """Handle the /price command to show cryptocurrency prices."""
     try:
         # Fetch the latest prices from the database
-        prices = database.get_market_prices()
+        prices = await db.get_market_prices()
         if not prices:
-            await update.message.reply_text("⚠️ عذراً، لا توجد بيانات أسعار متاحة حالياً.")
+            await reply(update.message, "⚠️ عذراً، لا توجد بيانات أسعار متاحة حالياً.")
             return
 
         # Build the price message
@@ -138,21 +162,21 @@ async def price_command(update: Update, context: CallbackContext) -> None:
         price_message += "⚠️ *ملاحظة*: هذه الأسعار تقريبية لأغراض العرض فقط."
 
         # Send the price message
-        await update.message.reply_text(price_message, parse_mode=ParseMode.MARKDOWN)
+        await reply(update.message, price_message, parse_mode=ParseMode.MARKDOWN)
 
     except Exception as e:
         logger.error(f"Failed to fetch prices: {e}")
         # Ensure only one response is sent
         if not asyncio.get_event_loop().is_closed():
-            await update.message.reply_text("⚠️ عذراً، حدث خطأ أثناء جلب الأسعار.")
+            await reply(update.message, "⚠️ عذراً، حدث خطأ أثناء جلب الأسعار.")
             
 async def market_command(update: Update, context: CallbackContext) -> None:
     """Handle the /market command to show cryptocurrency market information."""
     try:
         # Fetch the latest market summary from the database
-        market_data = database.get_market_summary()
+        market_data = await db.get_market_summary()
         if not market_data:
-            await update.message.reply_text("⚠️ عذراً، لا توجد بيانات سوق متاحة حالياً.")
+            await reply(update.message, "⚠️ عذراً، لا توجد بيانات سوق متاحة حالياً.")
             return
 
         # Extract and format market data
@@ -176,13 +200,13 @@ async def market_command(update: Update, context: CallbackContext) -> None:
         )
 
         # Send the market information message
-        await update.message.reply_text(market_info, parse_mode=ParseMode.MARKDOWN)
+        await reply(update.message, market_info, parse_mode=ParseMode.MARKDOWN)
 
     except Exception as e:
         logger.error(f"Failed to fetch market summary: {e}")
         # Ensure only one response is sent
         if not asyncio.get_event_loop().is_closed():
-            await update.message.reply_text("⚠️ عذراً، حدث خطأ أثناء جلب بيانات السوق.")
+            await reply(update.message, "⚠️ عذراً، حدث خطأ أثناء جلب بيانات السوق.")
 
 async def feedback_command(update: Update, context: CallbackContext) -> None:
     """Handle the /feedback command for receiving user feedback."""
@@ -191,7 +215,7 @@ async def feedback_command(update: Update, context: CallbackContext) -> None:
         user = update.effective_user
         chat = update.effective_chat
         logger.info(f"Feedback received from {user.id} ({user.username}): {feedback_message}")
-        await update.message.reply_text("👍 شكراً لك على ملاحظاتك! تم استلامها وسيتم النظر فيها.")  # Added await
+        await reply(update.message, "👍 شكراً لك على ملاحظاتك! تم استلامها وسيتم النظر فيها.")  # Added await
     else:
         instructions = (
             "🔄 *إرسال ملاحظات أو اقتراحات*\n\n"
@@ -199,7 +223,7 @@ async def feedback_command(update: Update, context: CallbackContext) -> None:
             "`/feedback أحب الأخبار التي يوفرها البوت، لكن أتمنى أن تكون هناك تنبيهات للأسعار`\n\n"
             "نحن نقدر ملاحظاتك ونسعى لتحسين البوت باستمرار!"
         )
-        await update.message.reply_text(instructions, parse_mode=ParseMode.MARKDOWN)  # Added await
+        await reply(update.message, instructions, parse_mode=ParseMode.MARKDOWN)  # Added await
 
 async def handle_group_migration(update: Update, context: CallbackContext) -> None:
     """Handle migration to a supergroup."""
@@ -208,8 +232,8 @@ async def handle_group_migration(update: Update, context: CallbackContext) -> No
         new_chat_id = update.effective_chat.id
         
         # Remove old chat and add the new one
-        database.remove_chat(old_chat_id)
-        database.add_chat(new_chat_id, update.effective_chat.title, update.effective_chat.type)
+        await db.remove_chat(old_chat_id)
+        await db.add_chat(new_chat_id, update.effective_chat.title, update.effective_chat.type)
         
         logger.info(f"Chat migrated from {old_chat_id} to {new_chat_id}")
 
@@ -232,7 +256,7 @@ async def chat_member_updated(update: Update, context: CallbackContext) -> None:
     if (result.old_chat_member.status in ['left', 'kicked'] and 
             result.new_chat_member.status in ['member', 'administrator']):
         # Add chat to database
-        database.add_chat(chat_id, chat_title, chat_type)
+        await db.add_chat(chat_id, chat_title, chat_type)
         logger.info(f"Bot was added to {chat_title} ({chat_id})")
         
         # Send welcome message if it's a group or supergroup
@@ -246,71 +270,419 @@ async def chat_member_updated(update: Update, context: CallbackContext) -> None:
                     "/about - معلومات عن البوت\n"
                     "/price - عرض أسعار العملات الرقمية\n"
                 )
-                context.bot.send_message(chat_id=chat_id, text=welcome_message)
+                await scheduler.send(
+                    chat_id, partial(context.bot.send_message, chat_id=chat_id, text=welcome_message),
+                    chat_type, lane=LANE_INTERACTIVE
+                )
             except Exception as e:
                 logger.error(f"Failed to send welcome message to {chat_id}: {e}")
         
     # Bot was removed from a group
     elif (result.old_chat_member.status in ['member', 'administrator'] and 
             result.new_chat_member.status in ['left', 'kicked']):
-        database.remove_chat(chat_id)
+        await db.remove_chat(chat_id)
         logger.info(f"Bot was removed from {chat_title} ({chat_id})")
         
     # Bot permissions were changed but still in the group
     elif (result.old_chat_member.status != result.new_chat_member.status and
           result.new_chat_member.status in ['member', 'administrator']):
         # Update the chat in database if there are permission changes
-        database.add_chat(chat_id, chat_title, chat_type)
+        await db.add_chat(chat_id, chat_title, chat_type)
         logger.info(f"Bot status updated in {chat_title} ({chat_id}) to {result.new_chat_member.status}")
 
-async def broadcast_news(news: News):
-    """Broadcast news to all chats where the bot is a member."""
-    chats = database.get_all_chats()
-    
+def broadcast_audience():
+    """Every chat as (chat_id, chat_type), read from the in-memory chat registry."""
+    if not chat_registry.loaded:
+        # Scripts that import bot without main.py start with an empty registry
+        chat_registry.load(database.get_all_chats())
+    return chat_registry.targets()
+
+def plan_broadcast(news: News):
+    """Create the durable delivery outbox for a story (one row per chat)."""
+    return plan_broadcasts([news])
+
+def plan_broadcasts(news_items):
+    """Create the delivery outboxes for several stories in one transaction."""
+    chats = broadcast_audience()
     if not chats:
         logger.warning("No chats to broadcast to.")
-        return 0, 0
+        return 0
     
-    message_text = news.format_telegram_message()
-    success_count = 0
-    error_count = 0
-    
-    for chat in chats:
-        chat_id = chat['chat_id']
+    stories = []
+    for news in news_items:
+        # Idempotent delivery: chats that already received this news_id are not queued again
+        delivered = database.get_delivered_chat_ids(news.news_id)
+        chat_ids = [chat_id for chat_id, _ in chats if chat_id not in delivered]
+        if delivered:
+            logger.info(f"Skipping {len(chats) - len(chat_ids)} chats that already received {news.news_id}")
+        stories.append((news.news_id, json.dumps(news.to_dict()), chat_ids))
+    return database.create_broadcasts(stories)
+
+class LiveStory:
+    """The current version of a story while it is being drained.
+
+    Corrections and retractions change the story's broadcasts row while a
+    drain is running. The drain re-reads that row before every claimed
+    batch, and before its next send when `stale` is set (by update_news and
+    retract_news in this process).
+    """
+
+    def __init__(self, news: News):
+        self.news = news
+        self.text = news.render()
+        self.version = None
+        self.retracted = False
+        self.stale = True
+
+    async def refresh(self):
+        self.stale = False
+        row = await db.get_broadcast(self.news.news_id)
+        if row is None:
+            return
+        content, status, version = row
+        self.retracted = status == 'retracted'
+        if version != self.version:
+            # Also on the first read: the story may have been corrected since it was planned
+            self.news = News.from_json(content)
+            self.text = self.news.render()
+            self.version = version
+
+# Stories being drained in this process, so corrections reach them before the next batch
+_live_stories = {}
+
+def _mark_stale(news_id):
+    for story in _live_stories.get(news_id, ()):
+        story.stale = True
+
+async def _claim_outbox(story: LiveStory, batch_size, shard=None):
+    """Lazily claim pending outbox rows in batches until the story is drained or retracted."""
+    news_id = story.news.news_id
+    while True:
+        await story.refresh()
+        if story.retracted:
+            return
+        batch = await db.claim_outbox_batch(news_id, batch_size, shard)
+        if not batch:
+            return
+        for index, (outbox_id, chat_id, chat_type) in enumerate(batch):
+            if story.stale:
+                await story.refresh()
+            if story.retracted:
+                # Claimed after retract_broadcast cancelled the pending rows
+                for outbox_id, _, _ in batch[index:]:
+                    database.message_log.mark_failed(outbox_id, "retracted")
+                return
+            yield chat_id, chat_type, outbox_id
+
+async def drain_outbox(news: News, lane=LANE_BREAKING, shard=None, progress=None, telegram_bot=None):
+    """Deliver every pending outbox row for a story under the worker pool.
+
+    With BROADCAST_SHARDS > 1 the outbox is split across worker processes;
+    `shard` is the (index, count) pair a worker process drains,
+    `progress` the hook it reports counts through and `telegram_bot` the
+    Bot it sends with (default: the shared `bot`).
+    """
+    if shard is None:
+        # Rows re-queued after a crash may already have a logged delivery
+        skipped = await db.skip_delivered_outbox(news.news_id)
+        if skipped:
+            logger.info(f"Skipped {skipped} outbox rows already delivered for {news.news_id}")
         
+        # Track live progress for the /broadcasts endpoints
+        progress_registry.start(news.news_id, await db.count_pending_outbox(news.news_id))
+        try:
+            if BROADCAST_SHARDS > 1:
+                return await _drain_sharded(news, lane)
+            return await _drain_local(news, lane, None, ProgressReporter(progress_registry, news.news_id))
+        finally:
+            progress_registry.finish(news.news_id)
+    
+    return await _drain_local(news, lane, shard, progress, telegram_bot)
+
+async def _drain_local(news: News, lane, shard, progress, telegram_bot=None):
+    """Drain the outbox (or one shard of it) in this process."""    
+    telegram_bot = telegram_bot or bot
+    story = LiveStory(news)
+    delivered = []  # (chat_id, chat_type, message_id, version) sent by this drain
+    
+    async def send_one(target):
+        chat_id, chat_type, outbox_id = target
+        current = story.news
+        version = story.version
         try:
             # Send message with no markdown formatting to avoid parsing errors
-            message = await bot.send_message(
+            message = await scheduler.send(chat_id, partial(
+                telegram_bot.send_message,
                 chat_id=chat_id,
-                text=message_text,
+                text=story.text,
                 parse_mode=None,  # No Markdown parsing
-                disable_web_page_preview=False if news.image_url else True
-            )
+                disable_web_page_preview=False if current.image_url else True
+            ), chat_type, defer=True, lane=lane)
             
-            # Log sent message
-            database.log_message(news.news_id, chat_id, message.message_id)
-            success_count += 1
-            
-            # Sleep briefly to avoid hitting rate limits
-            await asyncio.sleep(0.5)
+            # Record the delivery and log the sent message (written in bulk by the buffer)
+            database.message_log.log_message(news.news_id, chat_id, message.message_id, outbox_id)
+            delivered.append((chat_id, chat_type, message.message_id, version))
+            return True
             
         except TelegramError as e:
             logger.error(f"Failed to send message to chat {chat_id}: {e}")
-            error_count += 1
+            database.message_log.mark_failed(outbox_id, e)
             
             # If bot was kicked, remove the chat
             if "bot was kicked" in str(e) or "chat not found" in str(e):
-                database.remove_chat(chat_id)
+                await db.remove_chat(chat_id)
                 logger.info(f"Removed chat {chat_id} because bot was kicked or chat not found")
+            return False
+    
+    # Send concurrently; the outbound scheduler keeps us under Telegram's flood limits
+    _live_stories.setdefault(news.news_id, set()).add(story)
+    try:
+        result = await fan_out(_claim_outbox(story, BROADCAST_WORKERS * 4, shard), send_one, progress=progress)
+    finally:
+        _live_stories[news.news_id].discard(story)
+        if not _live_stories[news.news_id]:
+            del _live_stories[news.news_id]
     
-    logger.info(f"Broadcast completed. Success: {success_count}, Errors: {error_count}")
+    # Write out buffered delivery states before checking whether the story is done
+    await db.run(database.message_log.flush)
+    await db.complete_broadcast(news.news_id)
+    
+    logger.info(f"Broadcast completed. Success: {result.success}, Errors: {result.errors}, "
+                f"Throughput: {result.throughput:.1f} msg/s")
+    await _fix_outdated_deliveries(story, delivered, telegram_bot)
+    return result.success, result.errors
+
+async def _fix_outdated_deliveries(story: LiveStory, delivered, telegram_bot):
+    """Edit (or, for a retracted story, delete) this drain's deliveries sent with an outdated version.
+
+    A correction or retraction made while the drain was running only reaches
+    the deliveries logged when it ran; the ones still in flight are fixed here.
+    """
+    await story.refresh()
+    outdated = [(chat_id, chat_type, message_id) for chat_id, chat_type, message_id, version in delivered
+                if story.retracted or version != story.version]
+    if not outdated:
+        return
+    news_id = story.news.news_id
+    if story.retracted:
+        logger.info(f"Deleting {len(outdated)} copies of {news_id} delivered while it was being retracted")
+        await _fan_out_calls(news_id, "retract", _delete_call(telegram_bot), outdated)
+    else:
+        logger.info(f"Correcting {len(outdated)} copies of {news_id} delivered before its latest correction")
+        await _fan_out_calls(news_id, "update", _edit_call(story.news, telegram_bot), outdated)
+
+# --------- Sharded (multi-process) broadcasting ---------
+_shard_pool = None
+_shard_manager = None
+_shard_progress_queue = None
+_sharded_drains = 0  # sharded broadcasts running; while any are, this process sends at its reserved rate
+_sharded_drains_lock = threading.Lock()
+
+def shard_rates(count):
+    """(main process rate, per-shard rate) while `count` shard processes run; they add up to TELEGRAM_GLOBAL_RATE."""
+    shards_rate = TELEGRAM_GLOBAL_RATE * BROADCAST_SHARD_RATE_SHARE
+    return TELEGRAM_GLOBAL_RATE - shards_rate, shards_rate / count
+
+def _get_shard_pool():
+    """Lazily start one long-lived worker process per shard, plus the queue they report progress on."""
+    global _shard_pool, _shard_manager, _shard_progress_queue
+    if _shard_pool is None:
+        context = multiprocessing.get_context('spawn')
+        _shard_manager = context.Manager()
+        _shard_progress_queue = _shard_manager.Queue()
+        _shard_pool = ProcessPoolExecutor(max_workers=BROADCAST_SHARDS, mp_context=context)
+    return _shard_pool
+
+async def _drain_shard(news: News, lane, shard, progress):
+    """Drain one shard with a Bot whose connection pool belongs to the current event loop."""
+    # Each asyncio.run() in a worker process is a new loop; pooled connections
+    # opened on a previous (closed) loop would fail on first use
+    request = HTTPXRequest(connection_pool_size=BROADCAST_WORKERS)
+    try:
+        shard_bot = Bot(token=TELEGRAM_BOT_TOKEN, request=request)
+        return await drain_outbox(news, lane, shard=shard, progress=progress, telegram_bot=shard_bot)
+    finally:
+        await request.shutdown()
+
+def _run_shard(news_data, lane, index, count, rate, progress_queue):
+    """Worker process entry point: drain one shard with this process's own connection pool and rate share."""
+    rate_limiter.set_global_rate(rate)
+    news = News.from_json(news_data)
+    progress = QueueProgressReporter(progress_queue, news.news_id)
+    try:
+        return asyncio.run(_drain_shard(news, lane, (index, count), progress))
+    finally:
+        progress.flush()
+
+def _collect_shard_progress():
+    """Move progress reported by shard processes into this process's registry."""
+    while True:
+        try:
+            news_id, sent, failed, retried = _shard_progress_queue.get_nowait()
+        except queue.Empty:
+            return
+        progress_registry.record(news_id, sent, failed, retried)
+
+def _set_sharded_drains(delta):
+    # The main process gives up the shards' share of the global rate while any sharded broadcast runs
+    global _sharded_drains
+    with _sharded_drains_lock:
+        _sharded_drains += delta
+        main_rate, _ = shard_rates(BROADCAST_SHARDS)
+        rate_limiter.set_global_rate(main_rate if _sharded_drains else TELEGRAM_GLOBAL_RATE)
+
+async def _drain_sharded(news: News, lane):
+    """Fan a story out across BROADCAST_SHARDS worker processes partitioned by chat_id.
+
+    The shards split BROADCAST_SHARD_RATE_SHARE of the global rate and this
+    process keeps the rest, so together they stay under Telegram's limit
+    (the pool runs at most BROADCAST_SHARDS shards at once, however many
+    stories are queued). Shard processes have their own schedulers, so their
+    sends are not lane-scheduled against this process's traffic; the rate
+    kept here is what interactive replies, price posts and corrections get
+    while shards run.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _get_shard_pool()
+    started = time.monotonic()
+    _, shard_rate = shard_rates(BROADCAST_SHARDS)
+    _set_sharded_drains(+1)
+    try:
+        shards = asyncio.gather(*(
+            loop.run_in_executor(pool, _run_shard, news.to_dict(), lane, index, BROADCAST_SHARDS, shard_rate,
+                                 _shard_progress_queue)
+            for index in range(BROADCAST_SHARDS)
+        ), return_exceptions=True)
+        while not shards.done():
+            await asyncio.wait({shards}, timeout=0.5)
+            _collect_shard_progress()
+        results = shards.result()
+    finally:
+        _set_sharded_drains(-1)
+    
+    success_count = error_count = 0
+    for index, result in enumerate(results):
+        if isinstance(result, Exception):
+            # The shard's claimed rows stay in the outbox and are retried on the next resume
+            logger.error(f"Broadcast shard {index} failed: {result}")
+            continue
+        success_count += result[0]
+        error_count += result[1]
+    await db.complete_broadcast(news.news_id)
+    
+    elapsed = time.monotonic() - started
+    logger.info(f"Sharded broadcast completed across {BROADCAST_SHARDS} processes. Success: {success_count}, "
+                f"Errors: {error_count}, Throughput: {(success_count + error_count) / max(elapsed, 1e-9):.1f} msg/s")
     return success_count, error_count
 
+async def broadcast_news(news: News, lane=LANE_BREAKING):
+    """Broadcast news to all chats where the bot is a member."""
+    await db.run(plan_broadcast, news)
+    return await drain_outbox(news, lane)
+
+# --------- Corrections and retractions ---------
+def _edit_call(news: News, telegram_bot):
+    """API call replacing a delivered copy's text with `news`."""
+    message_text = news.render()
+    
+    def edit(chat_id, message_id):
+        return telegram_bot.edit_message_text(
+            text=message_text,
+            chat_id=chat_id,
+            message_id=message_id,
+            parse_mode=None,
+            disable_web_page_preview=False if news.image_url else True
+        )
+    return edit
+
+def _delete_call(telegram_bot):
+    """API call deleting a delivered copy."""
+    def delete(chat_id, message_id):
+        return telegram_bot.delete_message(chat_id=chat_id, message_id=message_id)
+    return delete
+
+async def _fan_out_calls(news_id, action, call_for, targets):
+    """Run one API call per (chat_id, chat_type, message_id) target through the rate-limited fan-out."""
+    async def send_one(target):
+        chat_id, chat_type, message_id = target
+        try:
+            await scheduler.send(chat_id, partial(call_for, chat_id, message_id), chat_type, defer=True,
+                                 lane=LANE_BREAKING, idempotent=True)
+            return True
+        except TelegramError as e:
+            # Already in the wanted state, e.g. handled by an overlapping correction or retraction
+            error = str(e).lower()
+            if "message is not modified" in error or "message to delete not found" in error:
+                return True
+            logger.error(f"Failed to {action} message {message_id} in chat {chat_id}: {e}")
+            return False
+    
+    progress_key = f"{news_id}:{action}"
+    progress_registry.start(progress_key, len(targets))
+    try:
+        result = await fan_out(targets, send_one, progress=ProgressReporter(progress_registry, progress_key))
+    finally:
+        progress_registry.finish(progress_key)
+    
+    logger.info(f"News {action} completed for {news_id}. Success: {result.success}, Errors: {result.errors}")
+    return result.success, result.errors
+
+async def _fan_out_to_sent_messages(news_id, action, call_for, chat_id=None):
+    """Run one API call per logged delivery of a story through the rate-limited fan-out."""
+    # Deliveries still sitting in the write buffer must be visible to the lookup
+    await db.run(database.message_log.flush)
+    targets = await db.get_sent_messages(news_id, chat_id)
+    if not targets:
+        logger.warning(f"No delivered messages found for {news_id}, nothing to {action}")
+        return 0, 0
+    return await _fan_out_calls(news_id, action, call_for,
+                                [(chat_id, chat_type, message_id) for chat_id, message_id, chat_type in targets])
+
+async def update_news(news: News, chat_id=None):
+    """Edit every delivered copy of a story in place with its corrected text.
+    
+    A broadcast still running picks up the correction for its remaining
+    sends and fixes its own in-flight deliveries when it finishes.
+    """
+    # Chats that have not received the story yet get the corrected version
+    await db.update_broadcast_content(news.news_id, json.dumps(news.to_dict()))
+    _mark_stale(news.news_id)
+    return await _fan_out_to_sent_messages(news.news_id, "update", _edit_call(news, bot), chat_id)
+
+async def retract_news(news_id, chat_id=None):
+    """Delete every delivered copy of a story and cancel deliveries that have not gone out yet.
+    
+    A broadcast still running stops sending and deletes its own in-flight
+    deliveries when it finishes.
+    """
+    if chat_id is None:
+        cancelled = await db.retract_broadcast(news_id, "retracted")
+        _mark_stale(news_id)
+        if cancelled:
+            logger.info(f"Cancelled {cancelled} pending deliveries of retracted news {news_id}")
+    
+    return await _fan_out_to_sent_messages(news_id, "retract", _delete_call(bot), chat_id)
+
+async def resume_broadcasts():
+    """Resume broadcasts interrupted by a crash or restart from the outbox."""
+    released = await db.release_outbox_inflight()
+    if released:
+        logger.info(f"Released {released} in-flight deliveries from a previous run")
+    
+    for news_id, content in await db.get_pending_broadcasts():
+        try:
+            news = News.from_json(content)
+        except ValueError as e:
+            logger.error(f"Cannot resume broadcast {news_id}: {e}")
+            continue
+        logger.info(f"Resuming broadcast {news_id}")
+        await drain_outbox(news, LANE_BULK)
+
 async def send_hourly_price_update(context: CallbackContext):
     """Send price updates to all chats."""
     from pycoingecko import CoinGeckoAPI
     cg = CoinGeckoAPI()
-    chats = database.get_all_chats()
+    chats = broadcast_audience()
     
     try:
         # Fetch prices once for all chats
@@ -337,16 +709,22 @@ async def send_hourly_price_update(context: CallbackContext):
         
         price_message += "\n⚠️ *ملاحظة*: هذه الأسعار تقريبية لأغراض العرض فقط."
         
-        # Send to all chats
-        for chat in chats:
+        async def send_one(target):
+            chat_id, chat_type = target
             try:
-                context.bot.send_message(
-                    chat_id=chat['chat_id'],
+                await scheduler.send(chat_id, partial(
+                    context.bot.send_message,
+                    chat_id=chat_id,
                     text=price_message,
                     parse_mode=ParseMode.MARKDOWN
-                )
-            except Exception as e:
-                logger.error(f"Failed to send price update to chat {chat['chat_id']}: {e}")
+                ), chat_type, defer=True, lane=LANE_PRICE)
+                return True
+            except TelegramError as e:
+                logger.error(f"Failed to send price update to chat {chat_id}: {e}")
+                return False
+        
+        # Send to all chats
+        await fan_out(chats, send_one)
                 
     except Exception as e:
         logger.error(f"Failed to fetch prices for hourly update: {e}")
@@ -356,7 +734,8 @@ from telegram.ext import Application, CommandHandler, MessageHandler
 async def setup_bot():
     """Set up the bot with handlers and webhook."""
     global application  # Make the application instance globally accessible
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    # Handlers run concurrently across chats, in order within each chat
+    application = Application.builder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(ChatOrderedUpdateProcessor()).build()
 
     # Add handlers
     application.add_handler(CommandHandler("start", start_command))
@@ -368,7 +747,7 @@ async def setup_bot():
     application.add_handler(CommandHandler("feedback", feedback_command))
     async def handle_text(update: Update, context: CallbackContext) -> None:
         """Handle generic text messages."""
-        await update.message.reply_text("🚀 شكراً لرسالتك! إذا كنت بحاجة إلى مساعدة، استخدم /help.")
+        await reply(update.message, "🚀 شكراً لرسالتك! إذا كنت بحاجة إلى مساعدة، استخدم /help.")
 
     # Add a generic message handler
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
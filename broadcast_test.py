@@ -50,7 +50,7 @@ async def test_broadcast():
             try:
                 message = await bot.send_message(
                     chat_id=chat['chat_id'],
-                    text=test_news.format_telegram_message(),
+                    text=test_news.render(),
                     parse_mode=None
                 )
                 log_message(test_news.news_id, chat['chat_id'], message.message_id)
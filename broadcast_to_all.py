@@ -59,8 +59,17 @@ async def broadcast_to_all_chats():
             tags=["إيثريوم", "سعر_قياسي", "تحديثات_تقنية", "ETH"]
         )
         
+        # Skip chats that already received this story (safe to rerun)
+        delivered = database.get_delivered_chat_ids(test_news.news_id)
+        if delivered:
+            chats = [chat for chat in chats if chat['chat_id'] not in delivered]
+            print(f"\n↩️ Skipping {len(delivered)} chats that already received this news.")
+            if not chats:
+                print("✓ Every chat has already received this news.")
+                return True
+        
         # Format the message
-        formatted_message = test_news.format_telegram_message()
+        formatted_message = test_news.render()
         
         print("\n📣 Starting broadcast...")
         
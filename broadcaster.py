@@ -0,0 +1,107 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from config import BROADCAST_WORKERS
+from outbound import Deferred
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastResult:
+    """Outcome of one fan-out run."""
+
+    def __init__(self, success=0, errors=0, retried=0, elapsed=0.0):
+        self.success = success
+        self.errors = errors
+        self.retried = retried
+        self.elapsed = elapsed
+
+    @property
+    def total(self):
+        return self.success + self.errors
+
+    @property
+    def throughput(self):
+        """Achieved send rate in messages per second."""
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f"BroadcastResult(success={self.success}, errors={self.errors}, retried={self.retried}, "
+                f"elapsed={self.elapsed:.2f}s, throughput={self.throughput:.1f} msg/s)")
+
+
+async def fan_out(targets, send_one, workers=BROADCAST_WORKERS, progress=None):
+    """Call `send_one(target)` for every target concurrently under a bounded worker pool.
+
+    Each target is a tuple whose first two items are `(chat_id, chat_type)`.
+    `targets` may be a lazy iterator or async iterator (e.g. one that claims
+    outbox rows in batches). `send_one` should route its request through the outbound
+    scheduler with `defer=True` and return True on success and False on a
+    handled failure. Targets whose chat is parked by flood control are
+    requeued until the park expires, while workers keep serving other chats.
+    `progress`, if given, is told about every sent, failed and retried target.
+    """
+    result = BroadcastResult()
+    if hasattr(targets, '__len__'):
+        if not targets:
+            return result
+        workers = min(workers, len(targets))
+
+    if hasattr(targets, '__anext__'):
+        # An async generator must not be resumed by two workers at once
+        claim_lock = asyncio.Lock()
+
+        async def take():
+            async with claim_lock:
+                return await anext(targets, None)
+    else:
+        pending = iter(targets)
+
+        async def take():
+            return next(pending, None)
+
+    deferred = []  # heap of (ready_at, seq, target)
+    sequence = itertools.count()
+    started = time.monotonic()
+
+    async def next_target():
+        if deferred and deferred[0][0] <= time.monotonic():
+            return heapq.heappop(deferred)[2]
+        return await take()
+
+    async def worker():
+        # All workers pull from the same iterator, so each target is sent once
+        while True:
+            target = await next_target()
+            if target is None:
+                if not deferred:
+                    return
+                await asyncio.sleep(max(deferred[0][0] - time.monotonic(), 0))
+                continue
+
+            chat_id = target[0]
+            try:
+                ok = await send_one(target)
+            except Deferred as e:
+                result.retried += 1
+                if progress:
+                    progress.retried()
+                heapq.heappush(deferred, (time.monotonic() + e.delay, next(sequence), target))
+                continue
+            except Exception as e:
+                logger.error(f"Unexpected error sending to chat {chat_id}: {e}")
+                ok = False
+            if ok:
+                result.success += 1
+            else:
+                result.errors += 1
+            if progress:
+                progress.sent() if ok else progress.failed()
+
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+
+    result.elapsed = time.monotonic() - started
+    logger.info(f"📊 Fan-out finished: {result}")
+    return result
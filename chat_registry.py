@@ -0,0 +1,138 @@
+import logging
+import sys
+import threading
+from array import array
+
+logger = logging.getLogger(__name__)
+
+# Chat types Telegram uses; anything else gets its own code on first sight
+CHAT_TYPES = ('private', 'group', 'supergroup', 'channel')
+
+
+class ChatRegistry:
+    """Resident copy of the chats table, so listing a broadcast audience is a memory read.
+
+    Chat IDs live in a compact `array('q')` with a parallel `array('B')` of
+    chat type codes; titles sit in a plain list alongside, and a dict maps
+    each chat_id to its slot. Removal swaps the last chat into the freed slot,
+    so order is not preserved.
+
+    database.add_chat / remove_chat write through to the shared registry after
+    each successful commit. Chats written by another process (the setup
+    scripts) are only picked up by `load()`, i.e. on the next restart.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = array('q')
+        self._types = array('B')
+        self._titles = []
+        self._slots = {}  # chat_id -> index into the arrays
+        self._object_bytes = 0  # titles and chat_id keys, tracked as they come and go
+        self._type_names = list(CHAT_TYPES)
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, chat_id):
+        return chat_id in self._slots
+
+    def _type_code(self, chat_type):
+        # Caller holds the lock
+        try:
+            return self._type_names.index(chat_type)
+        except ValueError:
+            self._type_names.append(chat_type)
+            return len(self._type_names) - 1
+
+    def _set(self, chat_id, chat_title, chat_type):
+        # Caller holds the lock
+        code = self._type_code(chat_type)
+        slot = self._slots.get(chat_id)
+        if slot is None:
+            self._slots[chat_id] = len(self._ids)
+            self._ids.append(chat_id)
+            self._types.append(code)
+            self._titles.append(chat_title)
+            self._object_bytes += sys.getsizeof(chat_id) + sys.getsizeof(chat_title)
+        else:
+            self._types[slot] = code
+            self._object_bytes += sys.getsizeof(chat_title) - sys.getsizeof(self._titles[slot])
+            self._titles[slot] = chat_title
+
+    def load(self, rows):
+        """Replace the registry with `rows` (chat_id, chat_title, chat_type), e.g. from get_all_chats()."""
+        with self._lock:
+            self._ids, self._types, self._titles, self._slots = array('q'), array('B'), [], {}
+            self._object_bytes = 0
+            for row in rows:
+                self._set(row['chat_id'], row['chat_title'], row['chat_type'])
+            self.loaded = True
+        stats = self.stats()
+        logger.info(f"✅ Loaded {stats['chats']} chats into the registry "
+                    f"({stats['bytes']} bytes, {stats['bytes_per_chat']} bytes/chat)")
+
+    def add(self, chat_id, chat_title, chat_type):
+        """Insert or update one chat."""
+        with self._lock:
+            self._set(chat_id, chat_title, chat_type)
+
+    def remove(self, chat_id):
+        """Drop one chat; returns False if it was not registered."""
+        with self._lock:
+            slot = self._slots.pop(chat_id, None)
+            if slot is None:
+                return False
+            self._object_bytes -= sys.getsizeof(chat_id) + sys.getsizeof(self._titles[slot])
+            last = len(self._ids) - 1
+            if slot != last:
+                moved = self._ids[last]
+                self._ids[slot] = moved
+                self._types[slot] = self._types[last]
+                self._titles[slot] = self._titles[last]
+                self._slots[moved] = slot
+            self._ids.pop()
+            self._types.pop()
+            self._titles.pop()
+            return True
+
+    def chat_ids(self):
+        """Snapshot of every chat_id as an array('q')."""
+        with self._lock:
+            return self._ids[:]
+
+    def targets(self):
+        """Snapshot of every chat as a (chat_id, chat_type) tuple, ready for fan_out."""
+        with self._lock:
+            names = self._type_names
+            return [(chat_id, names[code]) for chat_id, code in zip(self._ids, self._types)]
+
+    def get(self, chat_id):
+        """(chat_title, chat_type) of one chat, or None."""
+        with self._lock:
+            slot = self._slots.get(chat_id)
+            if slot is None:
+                return None
+            return self._titles[slot], self._type_names[self._types[slot]]
+
+    def memory_usage(self):
+        """Approximate bytes held by the registry: arrays, titles, and the slot index with its keys."""
+        with self._lock:
+            return (sys.getsizeof(self._ids) + sys.getsizeof(self._types) + sys.getsizeof(self._titles)
+                    + sys.getsizeof(self._slots) + self._object_bytes)
+
+    def stats(self):
+        """Chat count and measured memory footprint."""
+        size = self.memory_usage()
+        count = len(self)
+        return {
+            "chats": count,
+            "bytes": size,
+            "bytes_per_chat": round(size / count, 1) if count else 0,
+            "loaded": self.loaded,
+        }
+
+
+# ✅ Shared chat registry, loaded at startup and kept in sync by database.add_chat / remove_chat
+chat_registry = ChatRegistry()
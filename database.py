@@ -1,87 +1,74 @@
+import os
 import sqlite3
+import time
 import logging
-from config import DATABASE_FILE
+import threading
+import atexit
+import json
+import zlib
+from config import DATABASE_FILE, DATABASE_URL, MESSAGE_LOG_FLUSH_ROWS, MESSAGE_LOG_FLUSH_INTERVAL
+from config import DB_CACHE_SIZE_KB, DB_BUSY_TIMEOUT_MS, DB_CACHED_STATEMENTS, WORKER_ID, OUTBOX_LEASE_SECONDS
+from models import content_fingerprint
+from chat_registry import chat_registry
+import migrations
+import queries
 
 logger = logging.getLogger(__name__)
 
+_local = threading.local()
+
+def _connect():
+    conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False, cached_statements=DB_CACHED_STATEMENTS)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers run alongside the writer; NORMAL is durable across app crashes in WAL mode
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
 def get_db_connection():
-    """Create and return a database connection with thread safety."""
+    """Return this thread's pooled connection, opening it on first use.
+
+    Connections live for the life of the thread and keep their prepared
+    statement cache. A forked child gets a fresh connection rather than
+    reusing its parent's.
+    """
     try:
-        conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)  # ✅ Allow async/threaded access
-        conn.row_factory = sqlite3.Row
+        conn = getattr(_local, 'conn', None)
+        if conn is None or _local.pid != os.getpid():
+            conn = _connect()
+            _local.conn = conn
+            _local.pid = os.getpid()
         return conn
     except sqlite3.Error as e:
         logger.error(f"Database connection error: {e}")
         raise
 
+def release_connection(conn):
+    """Hand a pooled connection back after use: roll back anything left uncommitted, keep it open."""
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+def close_db_connection():
+    """Close this thread's pooled connection (e.g. on shutdown)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
 def init_db():
-    """Initialize the database by creating tables if they don't exist."""
+    """Bring the database schema up to date by applying pending migrations (see migrations.py)."""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Chats table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chats (
-            chat_id INTEGER PRIMARY KEY,
-            chat_title TEXT,
-            chat_type TEXT,
-            join_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-
-        # Messages table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS messages (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            news_id TEXT,
-            chat_id INTEGER,
-            message_id INTEGER,
-            sent_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (chat_id) REFERENCES chats (chat_id)
-        )
-        ''')
-
-        # Webhook logs table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS webhook_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            news_id TEXT,
-            content TEXT,
-            received_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-
-        # Market Prices table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS market_prices (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            coin TEXT UNIQUE,
-            price REAL,
-            change REAL,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-
-        # Market Summary table
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS market_summary (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            total_market_cap REAL,
-            total_volume REAL,
-            btc_dominance REAL,
-            eth_dominance REAL,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-
-        conn.commit()
-        logger.info("Database initialized successfully")
+        version = migrations.migrate(conn)
+        logger.info(f"Database initialized successfully (schema version {version})")
     except sqlite3.Error as e:
         logger.error(f"Database initialization error: {e}")
         raise
     finally:
-        conn.close()
+        release_connection(conn)
 
 # --------- Chats Functions ---------
 def add_chat(chat_id, chat_title, chat_type):
@@ -94,13 +81,14 @@ def add_chat(chat_id, chat_title, chat_type):
             (chat_id, chat_title, chat_type)
         )
         conn.commit()
+        chat_registry.add(chat_id, chat_title, chat_type)
         logger.info(f"Added chat: {chat_id} ({chat_title})")
         return True
     except sqlite3.Error as e:
         logger.error(f"Error adding chat: {e}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def remove_chat(chat_id):
     """Remove a chat from the database."""
@@ -109,13 +97,14 @@ def remove_chat(chat_id):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM chats WHERE chat_id = ?", (chat_id,))
         conn.commit()
+        chat_registry.remove(chat_id)
         logger.info(f"Removed chat: {chat_id}")
         return True
     except sqlite3.Error as e:
         logger.error(f"Error removing chat: {e}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_all_chats():
     """Fetch all chats from the database."""
@@ -129,17 +118,31 @@ def get_all_chats():
         logger.error(f"Error getting chats: {e}")
         return []
     finally:
-        conn.close()
+        release_connection(conn)
 
 # --------- Webhook / Messages Logging ---------
+def _pack_webhook(news_id, content):
+    """Row values for webhook_logs: (news_id, compressed payload, content hash)."""
+    try:
+        content_hash = content_fingerprint(json.loads(content))
+    except (TypeError, ValueError):
+        content_hash = None
+    return news_id, zlib.compress(content.encode()), content_hash
+
+def unpack_webhook(row):
+    """Return the JSON text of a webhook_logs row (compressed or legacy)."""
+    if row['payload'] is not None:
+        return zlib.decompress(row['payload']).decode()
+    return row['content']
+
 def log_webhook(news_id, content):
     """Log webhook data into the database."""
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO webhook_logs (news_id, content) VALUES (?, ?)",
-            (news_id, content)
+            "INSERT INTO webhook_logs (news_id, payload, content_hash) VALUES (?, ?, ?)",
+            _pack_webhook(news_id, content)
         )
         conn.commit()
         logger.info(f"Logged webhook: {news_id}")
@@ -148,7 +151,65 @@ def log_webhook(news_id, content):
         logger.error(f"Error logging webhook: {e}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
+
+def log_webhooks(rows):
+    """Log many webhook payloads in one transaction; rows are (news_id, content)."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO webhook_logs (news_id, payload, content_hash) VALUES (?, ?, ?)",
+            [_pack_webhook(news_id, content) for news_id, content in rows]
+        )
+        conn.commit()
+        logger.info(f"Logged {len(rows)} webhooks")
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Error logging webhooks: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def get_recent_webhooks(max_age_seconds):
+    """Fetch (news_id, content_hash, age_seconds) for broadcast webhooks received within `max_age_seconds`."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(queries.RECENT_WEBHOOKS, (f"-{int(max_age_seconds)} seconds",))
+        return [(row['news_id'], row['content_hash'], row['age']) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error fetching recent webhooks: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+def get_webhook_logs_before(max_age_days, limit):
+    """Fetch up to `limit` of the oldest webhook_logs rows older than `max_age_days`, oldest first."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(queries.WEBHOOK_LOGS_BEFORE, (f"-{int(max_age_days)} days", limit))
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Error fetching old webhook logs: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+def delete_webhook_logs(ids):
+    """Delete webhook_logs rows by id; returns the number removed."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.executemany("DELETE FROM webhook_logs WHERE id = ?", [(row_id,) for row_id in ids])
+        conn.commit()
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Error deleting webhook logs: {e}")
+        return 0
+    finally:
+        release_connection(conn)
 
 def log_message(news_id, chat_id, message_id):
     """Log a sent message into the database."""
@@ -156,7 +217,7 @@ def log_message(news_id, chat_id, message_id):
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO messages (news_id, chat_id, message_id) VALUES (?, ?, ?)",
+            "INSERT OR IGNORE INTO messages (news_id, chat_id, message_id) VALUES (?, ?, ?)",
             (news_id, chat_id, message_id)
         )
         conn.commit()
@@ -165,7 +226,73 @@ def log_message(news_id, chat_id, message_id):
         logger.error(f"Error logging message: {e}")
         return False
     finally:
-        conn.close()
+        release_connection(conn)
+
+def log_messages(rows):
+    """Log many sent messages in one transaction; rows are (news_id, chat_id, message_id)."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR IGNORE INTO messages (news_id, chat_id, message_id) VALUES (?, ?, ?)",
+            rows
+        )
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Error logging messages: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def get_delivered_chat_ids(news_id, chat_ids=None):
+    """Return the set of chat IDs that already received a story.
+
+    Uses the unique (news_id, chat_id) index; with `chat_ids`, only those chats
+    are checked, in batches rather than one query per chat.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        if chat_ids is None:
+            cursor.execute(queries.DELIVERED_CHAT_IDS, (news_id,))
+            return {row['chat_id'] for row in cursor.fetchall()}
+
+        delivered = set()
+        chat_ids = list(chat_ids)
+        for start in range(0, len(chat_ids), 500):
+            batch = chat_ids[start:start + 500]
+            cursor.execute(
+                f"SELECT chat_id FROM messages WHERE news_id = ? AND chat_id IN ({','.join('?' * len(batch))})",
+                [news_id, *batch]
+            )
+            delivered.update(row['chat_id'] for row in cursor.fetchall())
+        return delivered
+    except sqlite3.Error as e:
+        logger.error(f"Error fetching delivered chats: {e}")
+        return set()
+    finally:
+        release_connection(conn)
+
+def get_sent_messages(news_id, chat_id=None):
+    """Fetch (chat_id, message_id, chat_type) for every logged delivery of a story.
+
+    Looks up the (news_id, chat_id) index, so it stays cheap however large
+    the messages table grows.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        if chat_id is None:
+            cursor.execute(queries.SENT_MESSAGES, (news_id,))
+        else:
+            cursor.execute(queries.SENT_MESSAGES_TO_CHAT, (news_id, chat_id))
+        return [(row['chat_id'], row['message_id'], row['chat_type']) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error fetching sent messages: {e}")
+        return []
+    finally:
+        release_connection(conn)
 
 # --------- Market Data Update Functions ---------
 def update_market_price(coin, price, change):
@@ -185,7 +312,7 @@ def update_market_price(coin, price, change):
     except sqlite3.Error as e:
         logger.error(f"Error updating market price: {e}")
     finally:
-        conn.close()
+        release_connection(conn)
 
 def update_market_summary(total_market_cap, total_volume, btc_dominance, eth_dominance):
     """Insert the latest market summary (keep latest only)."""
@@ -201,7 +328,7 @@ def update_market_summary(total_market_cap, total_volume, btc_dominance, eth_dom
     except sqlite3.Error as e:
         logger.error(f"Error updating market summary: {e}")
     finally:
-        conn.close()
+        release_connection(conn)
 
 # --------- Market Data Fetch Functions ---------
 def get_market_prices():
@@ -216,7 +343,7 @@ def get_market_prices():
         logger.error(f"Error fetching market prices: {e}")
         return {}
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_market_summary():
     """Fetch the latest market summary from the database."""
@@ -237,4 +364,466 @@ def get_market_summary():
         logger.error(f"Error fetching market summary: {e}")
         return None
     finally:
-        conn.close()
\ No newline at end of file
+        release_connection(conn)
+
+# --------- Price History Functions ---------
+def log_price_ticks(rows):
+    """Append price ticks; rows are (coin, price, ts) with ts in unix seconds."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.executemany("INSERT INTO price_ticks (coin, price, ts) VALUES (?, ?, ?)", rows)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Error logging price ticks: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def get_price_ticks_since(since):
+    """Fetch (coin, price, ts) for every tick at or after `since`, oldest first."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(queries.PRICE_TICKS_SINCE, (since,))
+        return [(row['coin'], row['price'], row['ts']) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error fetching price ticks: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+def get_candles_since(resolution, since):
+    """Fetch (coin, bucket, open, high, low, close, ticks) for every candle of one resolution from `since` on."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(queries.CANDLES_SINCE, (resolution, since))
+        return [tuple(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error fetching price candles: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+def upsert_price_candles(resolution, rows):
+    """Insert or replace candles; rows are (coin, bucket, open, high, low, close, ticks)."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO price_candles (coin, resolution, bucket, open, high, low, close, ticks)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(coin, resolution, bucket) DO UPDATE SET
+                open=excluded.open, high=excluded.high, low=excluded.low,
+                close=excluded.close, ticks=excluded.ticks
+        ''', [(coin, resolution, bucket, *ohlc) for coin, bucket, *ohlc in rows])
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Error storing price candles: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def prune_price_ticks(before):
+    """Delete ticks older than `before`; returns the number removed."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM price_ticks WHERE ts < ?", (before,))
+        conn.commit()
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Error pruning price ticks: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+def prune_price_candles(resolution, before):
+    """Delete candles of one resolution that start before `before`; returns the number removed."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM price_candles WHERE resolution = ? AND bucket < ?", (resolution, before))
+        conn.commit()
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Error pruning price candles: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+def get_price_candles(coin, resolution, start, end):
+    """Fetch (bucket, open, high, low, close, ticks) candles of one coin with start <= bucket < end."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(queries.PRICE_CANDLES, (coin, resolution, start, end))
+        return [tuple(row) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error fetching price candles: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+# --------- Delivery Outbox Functions ---------
+OUTBOX_PENDING = 'pending'
+OUTBOX_SENDING = 'sending'
+OUTBOX_SENT = 'sent'
+OUTBOX_FAILED = 'failed'
+
+def create_broadcast(news_id, content, chat_ids):
+    """Create the delivery outbox for a story in one transaction; returns the number of new rows."""
+    return create_broadcasts([(news_id, content, chat_ids)])
+
+def create_broadcasts(stories):
+    """Create the delivery outboxes for several (news_id, content, chat_ids) stories in one transaction.
+
+    Returns the total number of new outbox rows.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        total = 0
+        for news_id, content, chat_ids in stories:
+            cursor.execute(
+                "INSERT OR IGNORE INTO broadcasts (news_id, content) VALUES (?, ?)",
+                (news_id, content)
+            )
+            before = conn.total_changes
+            cursor.executemany(
+                "INSERT OR IGNORE INTO outbox (news_id, chat_id) VALUES (?, ?)",
+                ((news_id, chat_id) for chat_id in chat_ids)
+            )
+            created = conn.total_changes - before
+            if created:
+                # Re-open a finished broadcast when chats were added since
+                cursor.execute(
+                    "UPDATE broadcasts SET status = 'pending', completed_date = NULL WHERE news_id = ? AND status = 'done'",
+                    (news_id,)
+                )
+            logger.info(f"Outbox for {news_id}: {created} new deliveries queued")
+            total += created
+        conn.commit()
+        return total
+    except sqlite3.Error as e:
+        logger.error(f"Error creating broadcast outbox: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+def claim_outbox_batch(news_id, limit, shard=None):
+    """Claim up to `limit` pending deliveries for a story; returns (outbox_id, chat_id, chat_type) rows.
+
+    `shard` is an optional (index, count) pair restricting the claim to chats
+    with abs(chat_id) % count == index. Claimed rows are leased to WORKER_ID
+    for OUTBOX_LEASE_SECONDS (see release_outbox_inflight).
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        shard_filter, params = "", [news_id, OUTBOX_PENDING]
+        if shard is not None:
+            shard_filter = "AND abs(o.chat_id) % ? = ?"
+            params += [shard[1], shard[0]]
+        cursor.execute(f'''
+            SELECT o.id, o.chat_id, c.chat_type FROM outbox o
+            LEFT JOIN chats c ON c.chat_id = o.chat_id
+            WHERE o.news_id = ? AND o.state = ? {shard_filter}
+            ORDER BY o.id LIMIT ?
+        ''', params + [limit])
+        rows = [(row['id'], row['chat_id'], row['chat_type']) for row in cursor.fetchall()]
+        lease_until = time.time() + OUTBOX_LEASE_SECONDS
+        cursor.executemany(
+            "UPDATE outbox SET state = ?, attempts = attempts + 1, claimed_by = ?, lease_until = ?, "
+            "updated_date = CURRENT_TIMESTAMP WHERE id = ? AND state = ?",
+            ((OUTBOX_SENDING, WORKER_ID, lease_until, row[0], OUTBOX_PENDING) for row in rows)
+        )
+        conn.commit()
+        return rows
+    except sqlite3.Error as e:
+        logger.error(f"Error claiming outbox batch: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+def skip_delivered_outbox(news_id):
+    """Mark pending deliveries whose message is already logged as sent; returns how many were skipped."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(queries.SKIP_DELIVERED_OUTBOX, (OUTBOX_SENT, news_id, OUTBOX_PENDING, news_id))
+        conn.commit()
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Error skipping delivered outbox rows: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+def get_broadcast(news_id):
+    """Fetch (content, status, version) of a story's broadcast, or None if it was never planned."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT content, status, version FROM broadcasts WHERE news_id = ?", (news_id,))
+        row = cursor.fetchone()
+        return (row['content'], row['status'], row['version']) if row else None
+    except sqlite3.Error as e:
+        logger.error(f"Error fetching broadcast: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+def update_broadcast_content(news_id, content):
+    """Replace the stored story and bump its version, so pending deliveries and running drains pick it up."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE broadcasts SET content = ?, version = version + 1 WHERE news_id = ?", (content, news_id))
+        conn.commit()
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        logger.error(f"Error updating broadcast content: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def retract_broadcast(news_id, reason):
+    """Mark a story's broadcast retracted (bumping its version) and fail its pending deliveries.
+
+    Both happen in one transaction; returns how many deliveries were cancelled.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE broadcasts SET status = 'retracted', version = version + 1, completed_date = CURRENT_TIMESTAMP "
+            "WHERE news_id = ?",
+            (news_id,)
+        )
+        cursor.execute(
+            "UPDATE outbox SET state = ?, last_error = ?, updated_date = CURRENT_TIMESTAMP "
+            "WHERE news_id = ? AND state = ?",
+            (OUTBOX_FAILED, reason, news_id, OUTBOX_PENDING)
+        )
+        conn.commit()
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Error retracting broadcast: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+def count_pending_outbox(news_id):
+    """Count the deliveries still pending for a story."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM outbox WHERE news_id = ? AND state = ?", (news_id, OUTBOX_PENDING))
+        return cursor.fetchone()[0]
+    except sqlite3.Error as e:
+        logger.error(f"Error counting pending deliveries: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+def release_outbox_inflight():
+    """Return deliveries claimed by a previous run to the pending state; call once at startup.
+
+    Only claims made by this worker (WORKER_ID) or whose lease has expired are
+    released, so rows another live worker is still sending are left alone.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE outbox SET state = ?, claimed_by = NULL, lease_until = NULL, updated_date = CURRENT_TIMESTAMP
+            WHERE state = ? AND (claimed_by IS NULL OR claimed_by = ? OR lease_until < ?)
+        ''', (OUTBOX_PENDING, OUTBOX_SENDING, WORKER_ID, time.time()))
+        conn.commit()
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Error releasing in-flight deliveries: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+def get_pending_broadcasts():
+    """Fetch (news_id, content) for every broadcast that still has deliveries to make."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT news_id, content FROM broadcasts WHERE status = 'pending' ORDER BY created_date")
+        return [(row['news_id'], row['content']) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error fetching pending broadcasts: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+def complete_broadcast(news_id):
+    """Mark a broadcast as done once no deliveries are pending or in flight."""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE broadcasts SET status = 'done', completed_date = CURRENT_TIMESTAMP
+            WHERE news_id = ? AND status = 'pending' AND NOT EXISTS (
+                SELECT 1 FROM outbox WHERE news_id = ? AND state IN (?, ?)
+            )
+        ''', (news_id, news_id, OUTBOX_PENDING, OUTBOX_SENDING))
+        conn.commit()
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        logger.error(f"Error completing broadcast: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def write_message_log(messages, sent, failed):
+    """Write buffered message log rows and outbox states in one transaction; returns False on error.
+
+    `messages` are (news_id, chat_id, message_id), `sent` (message_id, outbox_id)
+    and `failed` (error, outbox_id) rows.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR IGNORE INTO messages (news_id, chat_id, message_id) VALUES (?, ?, ?)",
+            messages
+        )
+        cursor.executemany(
+            f"UPDATE outbox SET state = '{OUTBOX_SENT}', message_id = ?, updated_date = CURRENT_TIMESTAMP WHERE id = ?",
+            sent
+        )
+        cursor.executemany(
+            f"UPDATE outbox SET state = '{OUTBOX_FAILED}', last_error = ?, updated_date = CURRENT_TIMESTAMP WHERE id = ?",
+            failed
+        )
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Error flushing message log buffer, will retry: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+# --------- Buffered Message Log Writer ---------
+class MessageLogBuffer:
+    """Write-behind buffer for message log rows and outbox delivery states.
+
+    Broadcast workers call `log_message` / `mark_failed`, which only append to
+    in-memory lists. A background thread writes everything with
+    `write_message_log` in one transaction once `max_rows` rows are buffered or every
+    `interval` seconds; `flush()` forces a write (end of broadcast) and
+    `close()` flushes on shutdown.
+
+    Message rows and outbox states go out in the same transaction, so they
+    never disagree, but a process killed between flushes loses what is
+    buffered: those outbox rows stay claimed and their chats get the story
+    again on restart. That is bounded by the sends of the last `interval`
+    seconds, at most about `max_rows` rows, plus the sends in flight.
+    """
+
+    def __init__(self, max_rows=MESSAGE_LOG_FLUSH_ROWS, interval=MESSAGE_LOG_FLUSH_INTERVAL):
+        self.max_rows = max_rows
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._messages = []  # (news_id, chat_id, message_id)
+        self._sent = []      # (message_id, outbox_id)
+        self._failed = []    # (error, outbox_id)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._messages) + len(self._failed)
+
+    def _start(self):
+        # Caller holds the lock
+        if self._thread is None or not self._thread.is_alive():
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="message-log-writer", daemon=True)
+            self._thread.start()
+
+    def _added(self):
+        # Caller holds the lock
+        self._start()
+        if len(self._messages) + len(self._failed) >= self.max_rows:
+            self._wakeup.set()
+
+    def log_message(self, news_id, chat_id, message_id, outbox_id=None):
+        """Buffer a sent message (and mark its outbox row as sent, if any)."""
+        with self._lock:
+            self._messages.append((news_id, chat_id, message_id))
+            if outbox_id is not None:
+                self._sent.append((message_id, outbox_id))
+            self._added()
+
+    def mark_failed(self, outbox_id, error):
+        """Buffer a permanently failed outbox delivery."""
+        with self._lock:
+            self._failed.append((str(error), outbox_id))
+            self._added()
+
+    def flush(self):
+        """Write every buffered row in one transaction; returns the number of rows written.
+
+        The write itself always happens on the database writer thread (inline
+        when called from there), so concurrent flushes are ordered by the
+        writer's queue rather than a lock, and a flush returns only after every
+        row buffered before it was written.
+        """
+        from async_db import db
+        return db.call(self._write_buffered)
+
+    def _write_buffered(self):
+        # Runs on the writer thread only
+        with self._lock:
+            messages, sent, failed = self._messages, self._sent, self._failed
+            self._messages, self._sent, self._failed = [], [], []
+        if not messages and not failed:
+            return 0
+
+        if write_message_log(messages, sent, failed):
+            return len(messages) + len(failed)
+
+        # Put the rows back so the next flush retries them
+        with self._lock:
+            self._messages[:0] = messages
+            self._sent[:0] = sent
+            self._failed[:0] = failed
+        return 0
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """Stop the writer thread and flush whatever is still buffered."""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        # Skipped when empty: at interpreter exit the writer module may not even be importable
+        if len(self):
+            self.flush()
+
+# ✅ Shared buffer; flushed on interpreter exit so no rows are lost on shutdown
+message_log = MessageLogBuffer()
+atexit.register(message_log.close)
+
+# --------- Backend Selection ---------
+# With DATABASE_URL set, every function above is replaced by its PostgreSQL
+# counterpart; callers keep using database.<function> either way.
+if DATABASE_URL:
+    import pg_database
+    for _name in pg_database.__all__:
+        globals()[_name] = getattr(pg_database, _name)
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from config import NEWS_DEDUP_TTL, NEWS_DEDUP_SIZE, NEWS_DEDUP_BY_CONTENT
+import database
+from models import content_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+class DedupCache:
+    """A thread-safe LRU set whose entries expire `ttl` seconds after they were added."""
+
+    def __init__(self, maxsize=NEWS_DEDUP_SIZE, ttl=NEWS_DEDUP_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> monotonic expiry
+        self._lock = threading.Lock()
+
+    def find(self, keys):
+        """Return the first of `keys` that is remembered and not expired, or None."""
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                expires = self._entries.get(key)
+                if expires is None:
+                    continue
+                if expires <= now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return key
+            self.misses += 1
+            return None
+
+    def add(self, keys, ttl=None):
+        """Remember `keys` for `ttl` seconds (default: the cache TTL)."""
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            for key in keys:
+                self._entries[key] = expires
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                    "maxsize": self.maxsize, "ttl": self.ttl}
+
+
+def news_keys(news_id, item=None, target_chat_id=None, content_hash=None):
+    """Dedup keys for a publish request: its news_id and, optionally, a hash of its text.
+
+    The content hash ignores the id so the same story re-sent under a new id
+    is caught too; pass `content_hash` when it is already known. Targeted
+    sends get their own keys so a story can still be sent to several chats one
+    by one.
+    """
+    suffix = f"@{target_chat_id}" if target_chat_id else ""
+    keys = [f"id:{news_id}{suffix}"] if news_id else []
+    if NEWS_DEDUP_BY_CONTENT:
+        content_hash = content_hash or content_fingerprint(item)
+        if content_hash:
+            keys.append(f"hash:{content_hash}{suffix}")
+    return keys
+
+
+def warm_from_database(cache=None):
+    """Seed the cache from broadcast webhooks logged within the TTL, so retries after a restart are caught."""
+    if cache is None:
+        cache = news_dedup
+    warmed = 0
+    # The stored content hash is the same fingerprint, so payloads need not be decompressed
+    for news_id, content_hash, age in database.get_recent_webhooks(cache.ttl):
+        cache.add(news_keys(news_id, content_hash=content_hash), ttl=max(cache.ttl - age, 0))
+        warmed += 1
+    logger.info(f"✅ News dedup cache warmed with {warmed} recent webhooks")
+    return warmed
+
+
+# ✅ Shared front-door dedup cache for published news
+news_dedup = DedupCache()
@@ -58,7 +58,7 @@ def send_direct_message_to_user(chat_id=None):
         )
         
         # Format the message
-        formatted_message = test_news.format_telegram_message()
+        formatted_message = test_news.render()
         
         print(f"\nAttempting to send test message to chat ID: {chat_id}")
         
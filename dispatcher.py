@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import threading
+from config import DISPATCH_QUEUE_SIZE, DISPATCH_CONCURRENCY, DISPATCH_RETRY_AFTER
+
+logger = logging.getLogger(__name__)
+
+
+class Dispatcher:
+    """Runs broadcast jobs on one long-lived event loop, fed by a bounded in-process queue.
+
+    Webhook handlers (which run in Flask's threads) call `submit()` with a
+    coroutine function; at most `concurrency` jobs run at once and at most
+    `max_queue` are accepted, so memory and sockets stay flat under bursts.
+    """
+
+    def __init__(self, max_queue=DISPATCH_QUEUE_SIZE, concurrency=DISPATCH_CONCURRENCY):
+        self.max_queue = max_queue
+        self.concurrency = concurrency
+        self.loop = None
+        self._queue = None
+        self._workers = []
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def start(self, loop=None):
+        """Attach to `loop` (the bot's loop) or, if none is given, run a dedicated loop thread."""
+        with self._lock:
+            if self.loop is not None:
+                return
+            if loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="broadcast-dispatcher", daemon=True).start()
+            self.loop = loop
+            # Runs before any job queued by submit(): call_soon_threadsafe callbacks are FIFO
+            loop.call_soon_threadsafe(self._start_workers)
+        logger.info(f"✅ Broadcast dispatcher started (queue: {self.max_queue}, concurrency: {self.concurrency})")
+
+    def _start_workers(self):
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def _worker(self):
+        while True:
+            name, job = await self._queue.get()
+            with self._lock:
+                self._running += 1
+            try:
+                await job()
+            except Exception as e:
+                logger.exception(f"Dispatcher job {name} failed: {e}")
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    self._running -= 1
+                    self.completed += 1
+                self._queue.task_done()
+
+    def is_full(self):
+        with self._lock:
+            return self._pending >= self.max_queue
+
+    def reserve(self):
+        """Claim a queue slot ahead of `submit(..., reserved=True)`; returns False if the queue is full.
+
+        Lets a handler make sure its job will be accepted before it writes
+        anything durable for it. Give the slot back with `release()` if the
+        job is not submitted after all.
+        """
+        with self._lock:
+            if self._pending >= self.max_queue:
+                return False
+            self._pending += 1
+            return True
+
+    def release(self):
+        """Return a slot claimed by `reserve()` without submitting a job."""
+        with self._lock:
+            self._pending -= 1
+
+    def submit(self, job, name="", reserved=False):
+        """Queue `job` (a coroutine function) from any thread; returns False if the queue is full.
+
+        With `reserved=True` the job takes the slot claimed by `reserve()` and is always accepted.
+        """
+        if self.loop is None:
+            self.start()
+        if not reserved and not self.reserve():
+            return False
+        self.loop.call_soon_threadsafe(self._enqueue, name, job)
+        return True
+
+    def _enqueue(self, name, job):
+        self._queue.put_nowait((name, job))
+
+    def reject(self):
+        """Count a job turned away because the queue was full."""
+        with self._lock:
+            self.rejected += 1
+
+    def retry_after(self):
+        """Seconds a rejected producer should wait before retrying."""
+        return DISPATCH_RETRY_AFTER
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": self._pending - self._running,
+                "running": self._running,
+                "max_queue": self.max_queue,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    async def stop(self):
+        """Cancel the workers; call from the dispatcher's own loop."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+# ✅ Shared dispatcher; main.py attaches it to the bot's event loop
+dispatcher = Dispatcher()
@@ -3,25 +3,45 @@ import logging
 import asyncio
 import threading
 import signal
+import multiprocessing
 from flask import Flask, jsonify
-from config import HOST, PORT, DEBUG
+from config import HOST, PORT, DEBUG, SERVER_MODE
 import database
+from async_db import db
 from webhook import webhook_bp
-from bot import setup_bot, get_bot_username
+from bot import setup_bot, get_bot_username, resume_broadcasts
 from werkzeug.serving import make_server
 from market import start_market_fetcher
+from retention import start_retention_job
+from price_history import start_price_rollup
+from dispatcher import dispatcher
+from dedup import warm_from_database
+from chat_registry import chat_registry
 
 # ✅ Configure Flask App
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET")
 app.register_blueprint(webhook_bp)
 
-# ✅ Initialize Database
-database.init_db()
+def initialize():
+    """Open the database and load the in-memory state the webhooks and broadcasts rely on."""
+    # ✅ Initialize Database
+    database.init_db()
+
+    # ✅ Remember recently published news so producer retries after a restart are not re-broadcast
+    warm_from_database()
+
+    # ✅ Keep the broadcast audience in memory; add_chat / remove_chat keep it in sync
+    chat_registry.load(database.get_all_chats())
+
+# ✅ Spawned broadcast shard processes re-import this module; only the serving process initializes
+if multiprocessing.parent_process() is None:
+    initialize()
 
 # ✅ Global State
 application = None
 flask_thread = None
+asgi_server = None
 shutting_down = False
 
 # ✅ Configure Logging
@@ -71,6 +91,9 @@ async def run_bot():
         await application.start()
         logging.info("✅ Bot started successfully.")
 
+        # ✅ Finish any broadcast interrupted by a previous crash or restart
+        dispatcher.submit(resume_broadcasts, name="resume")
+
         # ✅ Keep the bot running
         while True:
             await asyncio.sleep(1)
@@ -102,11 +125,21 @@ async def shutdown():
 
     if flask_thread:
         flask_thread.shutdown()
+    if asgi_server:
+        asgi_server.should_exit = True
+
+    # ✅ Write out buffered message log rows (through the writer thread), then let queued database calls finish
+    database.message_log.close()
+    db.shutdown()
+    database.close_db_connection()
 
     logging.info("✅ Application shutdown complete.")
 
+def is_shutting_down():
+    return shutting_down
+
 async def main():
-    global flask_thread
+    global flask_thread, asgi_server
 
     # ✅ Signal handling for graceful shutdown
     loop = asyncio.get_running_loop()
@@ -116,15 +149,33 @@ async def main():
     # ✅ Start market fetcher (AFTER loop is ready)
     start_market_fetcher()
 
-    # ✅ Start Flask in a background thread
-    flask_thread = FlaskServerThread(app)
-    flask_thread.start()
+    # ✅ Move old webhook logs to compressed archives so the live table stays small
+    start_retention_job()
+
+    # ✅ Roll market price ticks up into 1m / 1h / 1d candles and prune old ticks
+    start_price_rollup()
+
+    # ✅ Run every broadcast on this loop, shared with the bot Application
+    dispatcher.start(loop)
+
+    if SERVER_MODE == 'asgi':
+        # ✅ Serve the webhooks with uvicorn on this loop, shared with the bot Application
+        from asgi import create_server
+        asgi_server = create_server(app, HOST, PORT, is_shutting_down)
+        server_task = asyncio.create_task(asgi_server.serve())
+        logging.info("✅ ASGI server starting...")
+        server_running = lambda: not server_task.done()
+    else:
+        # ✅ Start Flask in a background thread
+        flask_thread = FlaskServerThread(app)
+        flask_thread.start()
+        server_running = flask_thread.is_alive
 
     # ✅ Start the bot
     bot_task = asyncio.create_task(run_bot())
 
     try:
-        while flask_thread.is_alive():
+        while server_running():
             await asyncio.sleep(1)
     except asyncio.CancelledError:
         logging.info("Main async task cancelled.")
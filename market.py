@@ -1,6 +1,7 @@
 import asyncio
 import logging
-import database
+import time
+from async_db import db
 from pycoingecko import CoinGeckoAPI
 
 logger = logging.getLogger(__name__)
@@ -25,11 +26,16 @@ async def fetch_market_once():
             "BNB": "binancecoin",
             "ADA": "cardano"
         }
+        fetched_at = time.time()
+        ticks = []
         for symbol, coin_id in coins.items():
             price = prices_data[coin_id]['usd']
             change = prices_data[coin_id]['usd_24h_change']
-            database.update_market_price(symbol, price, change)
+            await db.update_market_price(symbol, price, change)
+            ticks.append((symbol, price, fetched_at))
 
+        # Append to the price history; price_history rolls ticks up into candles
+        await db.log_price_ticks(ticks)
         logger.info("✅ Market prices stored successfully.")
 
         # Fetch global market summary
@@ -40,7 +46,7 @@ async def fetch_market_once():
         eth_dominance = global_data['market_cap_percentage']['eth']
 
         # Store summary
-        database.update_market_summary(total_market_cap, total_volume, btc_dominance, eth_dominance)
+        await db.update_market_summary(total_market_cap, total_volume, btc_dominance, eth_dominance)
         logger.info("✅ Market summary stored successfully.")
 
     except Exception as e:
@@ -0,0 +1,436 @@
+import logging
+import queries
+
+logger = logging.getLogger(__name__)
+
+# Every schema change is a numbered migration, applied once and recorded in
+# schema_version. Never edit a migration that has shipped; append a new one.
+# Migrations 1 and 2 are idempotent because databases created before the
+# runner existed already have some or all of their tables and columns.
+
+
+def _initial_schema(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS chats (
+        chat_id INTEGER PRIMARY KEY,
+        chat_title TEXT,
+        chat_type TEXT,
+        join_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        news_id TEXT,
+        chat_id INTEGER,
+        message_id INTEGER,
+        sent_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chat_id) REFERENCES chats (chat_id)
+    )
+    ''')
+
+    # One delivery per (news_id, chat_id); drop duplicates logged before the index existed
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_messages_news_chat'")
+    if not cursor.fetchone():
+        cursor.execute('''
+        DELETE FROM messages WHERE id NOT IN (
+            SELECT MIN(id) FROM messages GROUP BY news_id, chat_id
+        )
+        ''')
+        cursor.execute('CREATE UNIQUE INDEX idx_messages_news_chat ON messages (news_id, chat_id)')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS webhook_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        news_id TEXT,
+        content TEXT,
+        received_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS market_prices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        coin TEXT UNIQUE,
+        price REAL,
+        change REAL,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS market_summary (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        total_market_cap REAL,
+        total_volume REAL,
+        btc_dominance REAL,
+        eth_dominance REAL,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # One row per story that has a delivery outbox
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        news_id TEXT PRIMARY KEY,
+        content TEXT,
+        status TEXT DEFAULT 'pending',
+        created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_date TIMESTAMP
+    )
+    ''')
+
+    # Delivery outbox (one row per news_id/chat_id pair)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        news_id TEXT NOT NULL,
+        chat_id INTEGER NOT NULL,
+        state TEXT DEFAULT 'pending',
+        attempts INTEGER DEFAULT 0,
+        message_id INTEGER,
+        last_error TEXT,
+        updated_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (news_id, chat_id)
+    )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_outbox_state ON outbox (news_id, state)')
+
+
+def _compressed_webhook_payloads(cursor):
+    # payload is zlib-compressed JSON; content is only set on legacy rows
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(webhook_logs)")}
+    if 'payload' not in columns:
+        cursor.execute("ALTER TABLE webhook_logs ADD COLUMN payload BLOB")
+    if 'content_hash' not in columns:
+        cursor.execute("ALTER TABLE webhook_logs ADD COLUMN content_hash TEXT")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_webhook_logs_hash ON webhook_logs (content_hash)')
+
+
+def _hot_path_indexes(cursor):
+    # messages(news_id) lookups are served by the leading column of idx_messages_news_chat
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages (chat_id, sent_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_webhook_logs_news ON webhook_logs (news_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_webhook_logs_received ON webhook_logs (received_date)')
+
+
+def _price_history(cursor):
+    # Append-only ticks (ts is unix seconds), pruned once rolled up
+    cursor.execute('''
+    CREATE TABLE price_ticks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        coin TEXT NOT NULL,
+        price REAL NOT NULL,
+        ts REAL NOT NULL
+    )
+    ''')
+    cursor.execute('CREATE INDEX idx_price_ticks_ts ON price_ticks (ts)')
+
+    # OHLC candles; resolution is the bucket size in seconds, bucket its start time
+    cursor.execute('''
+    CREATE TABLE price_candles (
+        coin TEXT NOT NULL,
+        resolution INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        ticks INTEGER,
+        PRIMARY KEY (coin, resolution, bucket)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX idx_price_candles_resolution ON price_candles (resolution, bucket)')
+
+
+def _broadcast_versions(cursor):
+    # Bumped by every correction or retraction, so a running drain can tell
+    # which of its deliveries went out with an outdated version
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(broadcasts)")}
+    if 'version' not in columns:
+        cursor.execute("ALTER TABLE broadcasts ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+def _outbox_leases(cursor):
+    # Which worker claimed a delivery, and until when (unix seconds) no other worker may release it
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(outbox)")}
+    if 'claimed_by' not in columns:
+        cursor.execute("ALTER TABLE outbox ADD COLUMN claimed_by TEXT")
+    if 'lease_until' not in columns:
+        cursor.execute("ALTER TABLE outbox ADD COLUMN lease_until REAL")
+
+
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema),
+    (2, "compressed webhook payloads", _compressed_webhook_payloads),
+    (3, "hot-path indexes on messages and webhook_logs", _hot_path_indexes),
+    (4, "price ticks and OHLC candles", _price_history),
+    (5, "broadcast content versions", _broadcast_versions),
+    (6, "outbox claim leases", _outbox_leases),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    """The highest migration applied to `conn` (0 for a database the runner has never seen)."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction; returns the resulting version.
+
+    BEGIN IMMEDIATE takes the write lock before the version is read, so two
+    processes starting at once cannot apply the same migration twice.
+    """
+    version = schema_version(conn)
+    if version > LATEST_VERSION:
+        logger.warning(f"⚠️ Database schema version {version} is newer than this code ({LATEST_VERSION})")
+        return version
+
+    for number, description, apply in MIGRATIONS:
+        if number <= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= number:
+                conn.rollback()
+                continue
+            apply(conn.cursor())
+            conn.execute("INSERT INTO schema_version (version, description) VALUES (?, ?)", (number, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(f"✅ Applied database migration {number}: {description}")
+        version = number
+
+    # Refresh planner statistics where they are stale (cheap when nothing changed)
+    conn.execute("PRAGMA optimize")
+    return version
+
+
+# --------- PostgreSQL ---------
+# Numbered independently of the SQLite migrations: PostgreSQL databases start
+# from the schema SQLite reached at version 3, indexes included.
+POSTGRES_MIGRATIONS = [
+    (1, "initial schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS chats (
+            chat_id BIGINT PRIMARY KEY,
+            chat_title TEXT,
+            chat_type TEXT,
+            join_date TIMESTAMPTZ DEFAULT now()
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS messages (
+            id BIGSERIAL PRIMARY KEY,
+            news_id TEXT,
+            chat_id BIGINT,
+            message_id BIGINT,
+            sent_date TIMESTAMPTZ DEFAULT now(),
+            UNIQUE (news_id, chat_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages (chat_id, sent_date)',
+        '''
+        CREATE TABLE IF NOT EXISTS webhook_logs (
+            id BIGSERIAL PRIMARY KEY,
+            news_id TEXT,
+            content TEXT,
+            received_date TIMESTAMPTZ DEFAULT now(),
+            payload BYTEA,
+            content_hash TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_webhook_logs_news ON webhook_logs (news_id)',
+        'CREATE INDEX IF NOT EXISTS idx_webhook_logs_received ON webhook_logs (received_date)',
+        'CREATE INDEX IF NOT EXISTS idx_webhook_logs_hash ON webhook_logs (content_hash)',
+        '''
+        CREATE TABLE IF NOT EXISTS market_prices (
+            id SERIAL PRIMARY KEY,
+            coin TEXT UNIQUE,
+            price DOUBLE PRECISION,
+            change DOUBLE PRECISION,
+            last_updated TIMESTAMPTZ DEFAULT now()
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS market_summary (
+            id SERIAL PRIMARY KEY,
+            total_market_cap DOUBLE PRECISION,
+            total_volume DOUBLE PRECISION,
+            btc_dominance DOUBLE PRECISION,
+            eth_dominance DOUBLE PRECISION,
+            last_updated TIMESTAMPTZ DEFAULT now()
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS broadcasts (
+            news_id TEXT PRIMARY KEY,
+            content TEXT,
+            status TEXT DEFAULT 'pending',
+            created_date TIMESTAMPTZ DEFAULT now(),
+            completed_date TIMESTAMPTZ
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id BIGSERIAL PRIMARY KEY,
+            news_id TEXT NOT NULL,
+            chat_id BIGINT NOT NULL,
+            state TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            message_id BIGINT,
+            last_error TEXT,
+            updated_date TIMESTAMPTZ DEFAULT now(),
+            UNIQUE (news_id, chat_id)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_outbox_state ON outbox (news_id, state)',
+    ]),
+    (2, "price ticks and OHLC candles", [
+        '''
+        CREATE TABLE price_ticks (
+            id BIGSERIAL PRIMARY KEY,
+            coin TEXT NOT NULL,
+            price DOUBLE PRECISION NOT NULL,
+            ts DOUBLE PRECISION NOT NULL
+        )
+        ''',
+        'CREATE INDEX idx_price_ticks_ts ON price_ticks (ts)',
+        '''
+        CREATE TABLE price_candles (
+            coin TEXT NOT NULL,
+            resolution INTEGER NOT NULL,
+            bucket BIGINT NOT NULL,
+            open DOUBLE PRECISION,
+            high DOUBLE PRECISION,
+            low DOUBLE PRECISION,
+            close DOUBLE PRECISION,
+            ticks INTEGER,
+            PRIMARY KEY (coin, resolution, bucket)
+        )
+        ''',
+        'CREATE INDEX idx_price_candles_resolution ON price_candles (resolution, bucket)',
+    ]),
+    (3, "broadcast content versions", [
+        'ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 0',
+    ]),
+    (4, "outbox claim leases", [
+        'ALTER TABLE outbox ADD COLUMN IF NOT EXISTS claimed_by TEXT',
+        'ALTER TABLE outbox ADD COLUMN IF NOT EXISTS lease_until DOUBLE PRECISION',
+    ]),
+]
+POSTGRES_LATEST_VERSION = POSTGRES_MIGRATIONS[-1][0]
+
+# Arbitrary key for pg_advisory_xact_lock, shared by every process migrating the same database
+POSTGRES_MIGRATION_LOCK = 7_245_001
+
+
+def migrate_postgres(conn):
+    """Apply pending PostgreSQL migrations in one transaction; returns the resulting version.
+
+    DDL is transactional in PostgreSQL, and the advisory lock makes workers
+    starting at once wait for the first one instead of migrating twice.
+    """
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_date TIMESTAMPTZ DEFAULT now()
+            )
+            ''')
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (POSTGRES_MIGRATION_LOCK,))
+            cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            version = cursor.fetchone()[0]
+            if version > POSTGRES_LATEST_VERSION:
+                logger.warning(f"⚠️ Database schema version {version} is newer than this code ({POSTGRES_LATEST_VERSION})")
+
+            for number, description, statements in POSTGRES_MIGRATIONS:
+                if number <= version:
+                    continue
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)", (number, description))
+                logger.info(f"✅ Applied database migration {number}: {description}")
+                version = number
+        conn.commit()
+        return version
+    except Exception:
+        conn.rollback()
+        raise
+
+
+# --------- Query plan checks ---------
+# Hot-path queries exactly as database.py issues them against SQLite, and the index each must search.
+QUERY_PLAN_CHECKS = [
+    ("dedup warm-up (get_recent_webhooks)", queries.RECENT_WEBHOOKS, ("-3600 seconds",), "idx_webhook_logs_received"),
+    ("retention (get_webhook_logs_before)", queries.WEBHOOK_LOGS_BEFORE, ("-30 days", 1000),
+     "idx_webhook_logs_received"),
+    ("idempotent delivery (get_delivered_chat_ids)", queries.DELIVERED_CHAT_IDS, ("news-1",), "idx_messages_news_chat"),
+    ("corrections (get_sent_messages)", queries.SENT_MESSAGES, ("news-1",), "idx_messages_news_chat"),
+    ("retraction in one chat (get_sent_messages)", queries.SENT_MESSAGES_TO_CHAT, ("news-1", 42),
+     "idx_messages_news_chat"),
+    ("skip delivered (skip_delivered_outbox)", queries.SKIP_DELIVERED_OUTBOX, ("sent", "news-1", "pending", "news-1"),
+     "idx_messages_news_chat"),
+    ("price rollup input (get_price_ticks_since)", queries.PRICE_TICKS_SINCE, (0,), "idx_price_ticks_ts"),
+    ("price rollup input (get_candles_since)", queries.CANDLES_SINCE, (60, 0), "idx_price_candles_resolution"),
+    ("price chart range (get_price_candles)", queries.PRICE_CANDLES, ("BTC", 3600, 0, 86400), "PRIMARY KEY"),
+    # Not issued by the bot; keeps the indexes behind ad-hoc lookups by story and by chat usable
+    ("webhook history of a story", '''
+        SELECT id, received_date, content_hash FROM webhook_logs WHERE news_id = ?
+    ''', ("news-1",), "idx_webhook_logs_news"),
+    ("deliveries to a chat", '''
+        SELECT news_id, sent_date FROM messages
+        WHERE chat_id = ? AND sent_date >= datetime('now', '-7 days')
+        ORDER BY sent_date
+    ''', (42,), "idx_messages_chat"),
+]
+
+def explain(conn, sql, params=()):
+    """The EXPLAIN QUERY PLAN detail lines for one query."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def check_query_plans(conn):
+    """Run every QUERY_PLAN_CHECKS query through EXPLAIN QUERY PLAN.
+
+    Returns (name, plan) for each query whose plan does not use its index.
+    """
+    failures = []
+    for name, sql, params, index in QUERY_PLAN_CHECKS:
+        plan = explain(conn, sql, params)
+        if not any(index in detail for detail in plan):
+            failures.append((name, plan))
+    return failures
+
+
+if __name__ == "__main__":
+    # python migrations.py [database file]: migrate and verify the hot-path query plans
+    import sqlite3
+    import sys
+    import tempfile
+
+    logging.basicConfig(level=logging.INFO)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = sys.argv[1] if len(sys.argv) > 1 else f"{tmp}/check.db"
+        conn = sqlite3.connect(path)
+        print(f"Schema version: {migrate(conn)}")
+        failures = check_query_plans(conn)
+        for name, sql, params, index in QUERY_PLAN_CHECKS:
+            print(f"{'❌' if any(name == failed for failed, _ in failures) else '✅'} {name}: {index}")
+        for name, plan in failures:
+            print(f"   {name} plan: {' | '.join(plan)}")
+        conn.close()
+    sys.exit(1 if failures else 0)
@@ -1,4 +1,57 @@
 import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+CRYPTO_KEYWORDS = ("bitcoin", "ethereum", "بيتكوين", "إيثريوم", "كريبتو", "عملات رقمية", "crypto")
+RENDER_CACHE_SIZE = 256
+
+class RenderCache:
+    """A bounded LRU cache of rendered Telegram messages shared by every send path."""
+    
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_or_render(self, key, render):
+        """Return the cached payload for `key`, calling `render()` only on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        
+        payload = render()
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return payload
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+    
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+# Shared by the webhook, broadcasts and helper scripts
+render_cache = RenderCache()
+
+def content_fingerprint(item):
+    """Hash of a news item's text that ignores its id, or None if it has no text."""
+    if not isinstance(item, dict) or not (item.get('title') or item.get('content')):
+        return None
+    text = "\x1f".join(str(item.get(field, '')) for field in ('title', 'content', 'source', 'url'))
+    return hashlib.md5(text.encode()).hexdigest()
 
 class News:
     """A class to represent and format news content."""
@@ -11,6 +64,7 @@ class News:
         self.url = url
         self.image_url = image_url
         self.tags = tags or []
+        self._content_hash = None
     
     @classmethod
     def from_json(cls, json_data):
@@ -33,16 +87,31 @@ class News:
         except (json.JSONDecodeError, KeyError) as e:
             raise ValueError(f"Invalid news format: {e}")
     
+    def content_hash(self):
+        """Hash of every field that affects the rendered message, computed once (a News is never modified)."""
+        if self._content_hash is None:
+            parts = (self.news_id, self.title, self.content, self.source, self.url, self.image_url, *self.tags)
+            self._content_hash = hashlib.md5("\x1f".join(str(part) for part in parts).encode()).hexdigest()
+        return self._content_hash
+    
+    def render(self):
+        """Return the Telegram message text, rendered once per story and shared through the render cache.
+
+        The text is plain (no Markdown) and has a single locale, so the content
+        hash alone identifies it, whichever parse mode the sender passes along.
+        """
+        return render_cache.get_or_render(self.content_hash(), self.format_telegram_message)
+    
     def format_telegram_message(self):
         """Format the news for posting on Telegram."""
         # Determine appropriate emoji based on content
         title_emoji = "📰"
         
         # Check for cryptocurrency-specific content
-        crypto_keywords = ["bitcoin", "ethereum", "بيتكوين", "إيثريوم", "كريبتو", "عملات رقمية", "crypto"]
         combined_text = (self.title + " " + self.content).lower()
+        is_crypto = any(keyword in combined_text for keyword in CRYPTO_KEYWORDS)
         
-        if any(keyword in combined_text for keyword in crypto_keywords):
+        if is_crypto:
             if "bitcoin" in combined_text or "بيتكوين" in combined_text:
                 title_emoji = "₿"
             elif "ethereum" in combined_text or "إيثريوم" in combined_text:
@@ -71,9 +140,8 @@ class News:
             message += f"\n{crypto_tags}\n"
         
         # Add market indicators for crypto news
-        if any(keyword in combined_text for keyword in crypto_keywords):
+        if is_crypto:
             # Add market sentiment indicator
-            import hashlib
             # Use a hash of the news_id to create a pseudo-random market trend
             hash_value = int(hashlib.md5(self.news_id.encode()).hexdigest(), 16)
             market_trend = "🟢 السوق: صاعد" if hash_value % 2 == 0 else "🔴 السوق: هابط"
@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+import httpx
+from telegram.error import RetryAfter, NetworkError, BadRequest, TimedOut
+from config import BROADCAST_WORKERS, OUTBOUND_LANE_WEIGHTS, OUTBOUND_MAX_LANE_WAIT
+from ratelimit import limiter as default_limiter, is_group_chat
+
+logger = logging.getLogger(__name__)
+
+# Outbound priority lanes, highest priority first
+LANE_INTERACTIVE = "interactive"  # command replies
+LANE_BREAKING = "breaking"        # news from /news-webhook
+LANE_BULK = "bulk"                # resumed and re-run broadcasts
+LANE_PRICE = "price"              # scheduled price posts
+LANES = (LANE_INTERACTIVE, LANE_BREAKING, LANE_BULK, LANE_PRICE)
+
+
+def parse_lane_weights(spec):
+    """Parse 'lane:weight,...' into a dict; lanes left out keep weight 1."""
+    weights = {lane: 1 for lane in LANES}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        lane, _, weight = item.partition(':')
+        if lane.strip() not in weights:
+            raise ValueError(f"Unknown outbound lane in weights: {lane}")
+        weights[lane.strip()] = max(1, int(weight))
+    return weights
+
+
+LANE_WEIGHTS = parse_lane_weights(OUTBOUND_LANE_WEIGHTS)
+
+
+class Deferred(Exception):
+    """Raised instead of waiting when the target chat is parked by flood control."""
+
+    def __init__(self, chat_id, delay):
+        super().__init__(f"Chat {chat_id} is parked for {delay:.1f}s")
+        self.chat_id = chat_id
+        self.delay = delay
+
+
+def retry_after_seconds(error):
+    """Return RetryAfter.retry_after in seconds (an int, or a timedelta on newer versions)."""
+    value = error.retry_after
+    if hasattr(value, 'total_seconds'):
+        return value.total_seconds()
+    return float(value)
+
+
+def may_have_been_sent(error):
+    """Whether a failed request may still have reached Telegram and taken effect.
+
+    Connect and pool timeouts fail before the request goes out; any other
+    timeout may have hit after Telegram received it.
+    """
+    if not isinstance(error, TimedOut):
+        return False
+    return not isinstance(error.__cause__, (httpx.ConnectTimeout, httpx.PoolTimeout))
+
+
+class OutboundScheduler:
+    """Runs every outbound Telegram call under one shared policy.
+
+    * waits for the shared token-bucket rate limiter;
+    * on a 429 RetryAfter, parks only the affected chat (or, when several
+      chats are hit at once, the global lane) for `retry_after` seconds and
+      retries the call instead of dropping it;
+    * tunes the number of concurrent calls with AIMD: each 429 halves the
+      window, each success grows it by roughly one slot per window.
+
+    When the window is full, waiting calls queue in priority lanes
+    (interactive replies, breaking news, bulk broadcasts, price posts). Free
+    slots go to lanes by smooth weighted round-robin, and a call that has
+    waited longer than `max_lane_wait` is served next whatever its lane.
+
+    Slots are granted through futures woken with `call_soon_threadsafe`, so a
+    single scheduler can serve several event loops and threads.
+    """
+
+    GLOBAL_FLOOD_CHATS = 3       # distinct chats flooded within the window => park everyone
+    GLOBAL_FLOOD_WINDOW = 2.0
+    DECREASE_FACTOR = 0.5
+    DECREASE_COOLDOWN = 1.0      # one multiplicative decrease per flood burst
+    MAX_NETWORK_RETRIES = 3
+    NETWORK_RETRY_DELAY = 1.0    # doubled per attempt: 2s, 4s, 8s
+
+    def __init__(self, limiter=None, min_concurrency=1, max_concurrency=BROADCAST_WORKERS,
+                 weights=None, max_lane_wait=OUTBOUND_MAX_LANE_WAIT):
+        self.limiter = limiter or default_limiter
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self.weights = dict(weights or LANE_WEIGHTS)
+        self.max_lane_wait = max_lane_wait
+        self._lanes = {lane: deque() for lane in self.weights}
+        self._credits = {lane: 0 for lane in self.weights}
+        self._parked_chats = {}
+        self._global_parked_until = 0.0
+        self._recent_floods = deque()
+        self._last_decrease = 0.0
+        self.sent = 0
+        self.floods = 0
+        self.retries = 0
+
+    # --------- Concurrency window (AIMD) and priority lanes ---------
+    async def _enter(self, lane):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiting() and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            waiter = loop.create_future()
+            self._lanes[lane].append((time.monotonic(), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                for entry in self._lanes[lane]:
+                    if entry[1] is waiter:
+                        self._lanes[lane].remove(entry)
+                        waiter = None
+                        break
+            if waiter is not None and waiter.done() and not waiter.cancelled():
+                self._leave()
+            raise
+
+    def _grant(self, waiter):
+        if waiter.cancelled():
+            self._leave()
+        else:
+            waiter.set_result(None)
+
+    def _waiting(self):
+        # Caller holds the lock
+        return sum(len(queue) for queue in self._lanes.values())
+
+    def _next_lane(self):
+        # Caller holds the lock. Starving lanes first (oldest waiter beyond
+        # max_lane_wait), otherwise smooth weighted round-robin.
+        busy = [lane for lane, queue in self._lanes.items() if queue]
+        if not busy:
+            return None
+
+        now = time.monotonic()
+        oldest = min(busy, key=lambda lane: self._lanes[lane][0][0])
+        if now - self._lanes[oldest][0][0] >= self.max_lane_wait:
+            return oldest
+
+        total = 0
+        for lane in busy:
+            self._credits[lane] += self.weights[lane]
+            total += self.weights[lane]
+        chosen = max(busy, key=lambda lane: self._credits[lane])
+        self._credits[chosen] -= total
+        return chosen
+
+    def _wake(self):
+        # Caller holds the lock
+        while self.in_flight < int(self.limit):
+            lane = self._next_lane()
+            if lane is None:
+                return
+            _, waiter = self._lanes[lane].popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.get_loop().call_soon_threadsafe(self._grant, waiter)
+
+    def _leave(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def _on_success(self):
+        with self._lock:
+            self.sent += 1
+            self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            self._wake()
+
+    # --------- Flood control parking ---------
+    def _on_flood(self, chat_id, retry_after):
+        now = time.monotonic()
+        until = now + retry_after
+        with self._lock:
+            self.floods += 1
+            self.retries += 1
+            self._parked_chats[chat_id] = max(self._parked_chats.get(chat_id, 0.0), until)
+
+            self._recent_floods.append((now, chat_id))
+            while self._recent_floods and now - self._recent_floods[0][0] > self.GLOBAL_FLOOD_WINDOW:
+                self._recent_floods.popleft()
+            flooded_chats = {flooded_chat for _, flooded_chat in self._recent_floods}
+            if len(flooded_chats) >= self.GLOBAL_FLOOD_CHATS:
+                self._global_parked_until = max(self._global_parked_until, until)
+
+            if now - self._last_decrease >= self.DECREASE_COOLDOWN:
+                self._last_decrease = now
+                self.limit = max(self.min_concurrency, self.limit * self.DECREASE_FACTOR)
+        logger.warning(f"⏳ Flood control for chat {chat_id}: retrying in {retry_after:.0f}s "
+                       f"(concurrency window now {int(self.limit)})")
+
+    def _parked_delay(self, chat_id):
+        now = time.monotonic()
+        with self._lock:
+            chat_until = self._parked_chats.get(chat_id, 0.0)
+            if chat_until and chat_until <= now:
+                del self._parked_chats[chat_id]
+            return max(chat_until - now, 0.0), max(self._global_parked_until - now, 0.0)
+
+    # --------- Public API ---------
+    async def send(self, chat_id, call, chat_type=None, defer=False, lane=LANE_BREAKING, idempotent=False):
+        """Run `call()` — a coroutine factory making one Telegram request to `chat_id`.
+
+        Flood-control errors never surface: the call is retried once the park
+        expires. With `defer=True`, a parked chat raises `Deferred` instead of
+        waiting, so fan-out workers can requeue it and move on.
+
+        Network errors are retried with backoff, except a timeout that may have
+        reached Telegram: retrying a send_message then could deliver it twice,
+        so it is raised unless the call is `idempotent` (edits, deletes).
+        """
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown outbound lane: {lane}")
+        is_group = is_group_chat(chat_id, chat_type)
+        network_failures = 0
+        while True:
+            chat_delay, global_delay = self._parked_delay(chat_id)
+            if chat_delay > 0 and defer:
+                raise Deferred(chat_id, chat_delay)
+            if chat_delay > 0 or global_delay > 0:
+                await asyncio.sleep(max(chat_delay, global_delay))
+                continue
+
+            await self._enter(lane)
+            try:
+                await self.limiter.acquire(chat_id, is_group)
+                result = await call()
+            except RetryAfter as e:
+                self._leave()
+                self._on_flood(chat_id, retry_after_seconds(e))
+                continue
+            except NetworkError as e:
+                self._leave()
+                # BadRequest is a NetworkError subclass but retrying it cannot help
+                network_failures += 1
+                if (isinstance(e, BadRequest) or network_failures > self.MAX_NETWORK_RETRIES
+                        or (not idempotent and may_have_been_sent(e))):
+                    raise
+                with self._lock:
+                    self.retries += 1
+                logger.warning(f"Network error sending to chat {chat_id}, retrying: {e}")
+                await asyncio.sleep(self.NETWORK_RETRY_DELAY * 2 ** network_failures)
+                continue
+            except BaseException:
+                self._leave()
+                raise
+
+            self._leave()
+            self._on_success()
+            return result
+
+    def stats(self):
+        """Snapshot of scheduler counters."""
+        with self._lock:
+            return {
+                "concurrency_limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "waiting": {lane: len(queue) for lane, queue in self._lanes.items()},
+                "parked_chats": len(self._parked_chats),
+                "global_parked_for": max(self._global_parked_until - time.monotonic(), 0.0),
+                "sent": self.sent,
+                "flood_waits": self.floods,
+                "retries": self.retries,
+            }
+
+
+# ✅ Shared scheduler for every outbound Telegram call in the process
+scheduler = OutboundScheduler()
@@ -0,0 +1,674 @@
+"""PostgreSQL implementation of the database.py API, selected by DATABASE_URL.
+
+database.py re-binds every name in __all__ to the function here, so callers
+keep using `database.add_chat(...)` whichever backend is configured. Several
+bot processes can share one PostgreSQL database: outbox claims use
+FOR UPDATE SKIP LOCKED, so two workers never claim the same delivery.
+
+psycopg2 is an optional dependency, only needed when DATABASE_URL is set.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from config import DATABASE_URL, DB_POOL_MIN, DB_POOL_MAX, WORKER_ID, OUTBOX_LEASE_SECONDS
+from models import content_fingerprint
+from chat_registry import chat_registry
+import migrations
+
+try:
+    import psycopg2
+    from psycopg2 import extensions, extras, pool
+except ImportError as e:
+    raise RuntimeError("DATABASE_URL requires psycopg2 (pip install psycopg2-binary)") from e
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "get_db_connection", "release_connection", "close_db_connection", "init_db",
+    "add_chat", "remove_chat", "get_all_chats",
+    "log_webhook", "log_webhooks", "get_recent_webhooks", "get_webhook_logs_before", "delete_webhook_logs",
+    "log_message", "log_messages", "get_delivered_chat_ids", "get_sent_messages",
+    "update_market_price", "update_market_summary", "get_market_prices", "get_market_summary",
+    "log_price_ticks", "get_price_ticks_since", "get_candles_since", "upsert_price_candles",
+    "prune_price_ticks", "prune_price_candles", "get_price_candles",
+    "create_broadcasts", "claim_outbox_batch", "skip_delivered_outbox", "get_broadcast",
+    "update_broadcast_content", "retract_broadcast", "count_pending_outbox",
+    "release_outbox_inflight", "get_pending_broadcasts", "complete_broadcast", "write_message_log",
+]
+
+# Same delivery states as database.py
+OUTBOX_PENDING = 'pending'
+OUTBOX_SENDING = 'sending'
+OUTBOX_SENT = 'sent'
+OUTBOX_FAILED = 'failed'
+
+# Rows per multi-row INSERT / UPDATE statement
+PAGE_SIZE = 1000
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    """The process-wide connection pool, created on first use (and again in a forked child)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = pool.ThreadedConnectionPool(
+                DB_POOL_MIN, DB_POOL_MAX, DATABASE_URL, cursor_factory=extras.DictCursor
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+def get_db_connection():
+    """Borrow a connection from the pool; hand it back with release_connection()."""
+    try:
+        return _get_pool().getconn()
+    except psycopg2.Error as e:
+        logger.error(f"Database connection error: {e}")
+        raise
+
+def release_connection(conn):
+    """Return a connection to the pool, rolling back anything left uncommitted."""
+    if conn is None or _pool is None:
+        return
+    if not conn.closed and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    _pool.putconn(conn, close=bool(conn.closed))
+
+def close_db_connection():
+    """Close every pooled connection (e.g. on shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+def init_db():
+    """Bring the database schema up to date by applying pending migrations (see migrations.py)."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        version = migrations.migrate_postgres(conn)
+        logger.info(f"Database initialized successfully (PostgreSQL, schema version {version})")
+    except psycopg2.Error as e:
+        logger.error(f"Database initialization error: {e}")
+        raise
+    finally:
+        release_connection(conn)
+
+# --------- Chats Functions ---------
+def add_chat(chat_id, chat_title, chat_type):
+    """Add or update a chat in the database."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                INSERT INTO chats (chat_id, chat_title, chat_type) VALUES (%s, %s, %s)
+                ON CONFLICT (chat_id) DO UPDATE SET
+                    chat_title = EXCLUDED.chat_title,
+                    chat_type = EXCLUDED.chat_type
+            ''', (chat_id, chat_title, chat_type))
+        conn.commit()
+        chat_registry.add(chat_id, chat_title, chat_type)
+        logger.info(f"Added chat: {chat_id} ({chat_title})")
+        return True
+    except psycopg2.Error as e:
+        logger.error(f"Error adding chat: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def remove_chat(chat_id):
+    """Remove a chat from the database."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM chats WHERE chat_id = %s", (chat_id,))
+        conn.commit()
+        chat_registry.remove(chat_id)
+        logger.info(f"Removed chat: {chat_id}")
+        return True
+    except psycopg2.Error as e:
+        logger.error(f"Error removing chat: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def get_all_chats():
+    """Fetch all chats from the database."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT chat_id, chat_title, chat_type, join_date FROM chats")
+            return cursor.fetchall()
+    except psycopg2.Error as e:
+        logger.error(f"Error getting chats: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+# --------- Webhook / Messages Logging ---------
+def _pack_webhook(news_id, content):
+    """Row values for webhook_logs: (news_id, compressed payload, content hash)."""
+    try:
+        content_hash = content_fingerprint(json.loads(content))
+    except (TypeError, ValueError):
+        content_hash = None
+    return news_id, psycopg2.Binary(zlib.compress(content.encode())), content_hash
+
+def log_webhook(news_id, content):
+    """Log webhook data into the database."""
+    return log_webhooks([(news_id, content)])
+
+def log_webhooks(rows):
+    """Log many webhook payloads with multi-row INSERTs in one transaction; rows are (news_id, content)."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            extras.execute_values(
+                cursor,
+                "INSERT INTO webhook_logs (news_id, payload, content_hash) VALUES %s",
+                [_pack_webhook(news_id, content) for news_id, content in rows],
+                page_size=PAGE_SIZE
+            )
+        conn.commit()
+        logger.info(f"Logged {len(rows)} webhooks")
+        return True
+    except psycopg2.Error as e:
+        logger.error(f"Error logging webhooks: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def get_recent_webhooks(max_age_seconds):
+    """Fetch (news_id, content_hash, age_seconds) for broadcast webhooks received within `max_age_seconds`."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT news_id, content_hash, EXTRACT(EPOCH FROM now() - received_date) AS age
+                FROM webhook_logs
+                WHERE received_date >= now() - make_interval(secs => %s)
+                  AND news_id IN (SELECT news_id FROM broadcasts)
+                ORDER BY received_date
+            ''', (int(max_age_seconds),))
+            return [(row['news_id'], row['content_hash'], float(row['age'])) for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        logger.error(f"Error fetching recent webhooks: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+def get_webhook_logs_before(max_age_days, limit):
+    """Fetch up to `limit` of the oldest webhook_logs rows older than `max_age_days`, oldest first."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            # received_date as text, as SQLite returns it, so archive records serialise the same way
+            cursor.execute('''
+                SELECT id, news_id, content, payload, content_hash,
+                       to_char(received_date AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS') AS received_date
+                FROM webhook_logs
+                WHERE received_date < now() - make_interval(days => %s)
+                ORDER BY webhook_logs.received_date, id
+                LIMIT %s
+            ''', (int(max_age_days), limit))
+            return cursor.fetchall()
+    except psycopg2.Error as e:
+        logger.error(f"Error fetching old webhook logs: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+def delete_webhook_logs(ids):
+    """Delete webhook_logs rows by id; returns the number removed."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM webhook_logs WHERE id = ANY(%s)", (list(ids),))
+            deleted = cursor.rowcount
+        conn.commit()
+        return deleted
+    except psycopg2.Error as e:
+        logger.error(f"Error deleting webhook logs: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+def log_message(news_id, chat_id, message_id):
+    """Log a sent message into the database."""
+    return log_messages([(news_id, chat_id, message_id)])
+
+def log_messages(rows):
+    """Log many sent messages with multi-row INSERTs in one transaction; rows are (news_id, chat_id, message_id)."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            extras.execute_values(
+                cursor,
+                "INSERT INTO messages (news_id, chat_id, message_id) VALUES %s ON CONFLICT (news_id, chat_id) DO NOTHING",
+                rows,
+                page_size=PAGE_SIZE
+            )
+        conn.commit()
+        return True
+    except psycopg2.Error as e:
+        logger.error(f"Error logging messages: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def get_delivered_chat_ids(news_id, chat_ids=None):
+    """Return the set of chat IDs that already received a story (optionally only among `chat_ids`)."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            if chat_ids is None:
+                cursor.execute("SELECT chat_id FROM messages WHERE news_id = %s", (news_id,))
+            else:
+                cursor.execute(
+                    "SELECT chat_id FROM messages WHERE news_id = %s AND chat_id = ANY(%s)",
+                    (news_id, list(chat_ids))
+                )
+            return {row['chat_id'] for row in cursor.fetchall()}
+    except psycopg2.Error as e:
+        logger.error(f"Error fetching delivered chats: {e}")
+        return set()
+    finally:
+        release_connection(conn)
+
+def get_sent_messages(news_id, chat_id=None):
+    """Fetch (chat_id, message_id, chat_type) for every logged delivery of a story."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            query = '''
+                SELECT m.chat_id, m.message_id, c.chat_type FROM messages m
+                LEFT JOIN chats c ON c.chat_id = m.chat_id
+                WHERE m.news_id = %s AND m.message_id IS NOT NULL
+            '''
+            params = [news_id]
+            if chat_id is not None:
+                query += " AND m.chat_id = %s"
+                params.append(chat_id)
+            cursor.execute(query, params)
+            return [(row['chat_id'], row['message_id'], row['chat_type']) for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        logger.error(f"Error fetching sent messages: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+# --------- Market Data Functions ---------
+def update_market_price(coin, price, change):
+    """Insert or update a coin price."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute('''
+                INSERT INTO market_prices (coin, price, change, last_updated)
+                VALUES (%s, %s, %s, now())
+                ON CONFLICT (coin) DO UPDATE SET
+                    price = EXCLUDED.price,
+                    change = EXCLUDED.change,
+                    last_updated = now()
+            ''', (coin, price, change))
+        conn.commit()
+    except psycopg2.Error as e:
+        logger.error(f"Error updating market price: {e}")
+    finally:
+        release_connection(conn)
+
+def update_market_summary(total_market_cap, total_volume, btc_dominance, eth_dominance):
+    """Insert the latest market summary (keep latest only)."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute('DELETE FROM market_summary')  # Keep latest only
+            cursor.execute('''
+                INSERT INTO market_summary (total_market_cap, total_volume, btc_dominance, eth_dominance)
+                VALUES (%s, %s, %s, %s)
+            ''', (total_market_cap, total_volume, btc_dominance, eth_dominance))
+        conn.commit()
+    except psycopg2.Error as e:
+        logger.error(f"Error updating market summary: {e}")
+    finally:
+        release_connection(conn)
+
+def get_market_prices():
+    """Fetch the latest prices from the database."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT coin, price, change FROM market_prices')
+            return {row['coin']: {"price": row['price'], "change": row['change']} for row in cursor.fetchall()}
+    except psycopg2.Error as e:
+        logger.error(f"Error fetching market prices: {e}")
+        return {}
+    finally:
+        release_connection(conn)
+
+def get_market_summary():
+    """Fetch the latest market summary from the database."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT total_market_cap, total_volume, btc_dominance, eth_dominance FROM market_summary ORDER BY id DESC LIMIT 1')
+            row = cursor.fetchone()
+        if row:
+            return {
+                "total_market_cap": row["total_market_cap"],
+                "total_volume": row["total_volume"],
+                "btc_dominance": row["btc_dominance"],
+                "eth_dominance": row["eth_dominance"]
+            }
+        return None
+    except psycopg2.Error as e:
+        logger.error(f"Error fetching market summary: {e}")
+        return None
+    finally:
+        release_connection(conn)
+
+# --------- Price History Functions ---------
+def log_price_ticks(rows):
+    """Append price ticks with a multi-row INSERT; rows are (coin, price, ts) with ts in unix seconds."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            extras.execute_values(cursor, "INSERT INTO price_ticks (coin, price, ts) VALUES %s", rows, page_size=PAGE_SIZE)
+        conn.commit()
+        return True
+    except psycopg2.Error as e:
+        logger.error(f"Error logging price ticks: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def _fetch(sql, params, action):
+    """Run one SELECT; returns its rows as tuples ([] on error)."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [tuple(row) for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        logger.error(f"Error {action}: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+def get_price_ticks_since(since):
+    """Fetch (coin, price, ts) for every tick at or after `since`, oldest first."""
+    return _fetch("SELECT coin, price, ts FROM price_ticks WHERE ts >= %s ORDER BY ts",
+                  (since,), "fetching price ticks")
+
+def get_candles_since(resolution, since):
+    """Fetch (coin, bucket, open, high, low, close, ticks) for every candle of one resolution from `since` on."""
+    return _fetch('''
+        SELECT coin, bucket, open, high, low, close, ticks FROM price_candles
+        WHERE resolution = %s AND bucket >= %s ORDER BY bucket
+    ''', (resolution, since), "fetching price candles")
+
+def upsert_price_candles(resolution, rows):
+    """Insert or replace candles with multi-row upserts; rows are (coin, bucket, open, high, low, close, ticks)."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            extras.execute_values(cursor, '''
+                INSERT INTO price_candles (coin, resolution, bucket, open, high, low, close, ticks)
+                VALUES %s
+                ON CONFLICT (coin, resolution, bucket) DO UPDATE SET
+                    open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+                    close = EXCLUDED.close, ticks = EXCLUDED.ticks
+            ''', [(coin, resolution, bucket, *ohlc) for coin, bucket, *ohlc in rows], page_size=PAGE_SIZE)
+        conn.commit()
+        return True
+    except psycopg2.Error as e:
+        logger.error(f"Error storing price candles: {e}")
+        return False
+    finally:
+        release_connection(conn)
+
+def prune_price_ticks(before):
+    """Delete ticks older than `before`; returns the number removed."""
+    return _update("DELETE FROM price_ticks WHERE ts < %s", (before,), "pruning price ticks")
+
+def prune_price_candles(resolution, before):
+    """Delete candles of one resolution that start before `before`; returns the number removed."""
+    return _update("DELETE FROM price_candles WHERE resolution = %s AND bucket < %s",
+                   (resolution, before), "pruning price candles")
+
+def get_price_candles(coin, resolution, start, end):
+    """Fetch (bucket, open, high, low, close, ticks) candles of one coin with start <= bucket < end."""
+    return _fetch('''
+        SELECT bucket, open, high, low, close, ticks FROM price_candles
+        WHERE coin = %s AND resolution = %s AND bucket >= %s AND bucket < %s
+        ORDER BY bucket
+    ''', (coin, resolution, start, end), "fetching price candles")
+
+# --------- Delivery Outbox Functions ---------
+def create_broadcasts(stories):
+    """Create the delivery outboxes for several (news_id, content, chat_ids) stories in one transaction.
+
+    Returns the total number of new outbox rows.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        total = 0
+        with conn.cursor() as cursor:
+            for news_id, content, chat_ids in stories:
+                cursor.execute(
+                    "INSERT INTO broadcasts (news_id, content) VALUES (%s, %s) ON CONFLICT (news_id) DO NOTHING",
+                    (news_id, content)
+                )
+                # One statement for the whole audience, whatever its size
+                cursor.execute('''
+                    INSERT INTO outbox (news_id, chat_id)
+                    SELECT %s, unnest(%s::bigint[])
+                    ON CONFLICT (news_id, chat_id) DO NOTHING
+                ''', (news_id, list(chat_ids)))
+                created = cursor.rowcount
+                if created:
+                    # Re-open a finished broadcast when chats were added since
+                    cursor.execute(
+                        "UPDATE broadcasts SET status = 'pending', completed_date = NULL "
+                        "WHERE news_id = %s AND status = 'done'",
+                        (news_id,)
+                    )
+                logger.info(f"Outbox for {news_id}: {created} new deliveries queued")
+                total += created
+        conn.commit()
+        return total
+    except psycopg2.Error as e:
+        logger.error(f"Error creating broadcast outbox: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+def claim_outbox_batch(news_id, limit, shard=None):
+    """Claim up to `limit` pending deliveries for a story; returns (outbox_id, chat_id, chat_type) rows.
+
+    SKIP LOCKED lets several processes claim from the same outbox without
+    waiting on or double-claiming each other's rows. Claimed rows are leased
+    to WORKER_ID for OUTBOX_LEASE_SECONDS (see release_outbox_inflight).
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        lease_until = time.time() + OUTBOX_LEASE_SECONDS
+        shard_filter, params = "", [OUTBOX_SENDING, WORKER_ID, lease_until, news_id, OUTBOX_PENDING]
+        if shard is not None:
+            shard_filter = "AND abs(chat_id) %% %s = %s"
+            params += [shard[1], shard[0]]
+        with conn.cursor() as cursor:
+            cursor.execute(f'''
+                UPDATE outbox o SET state = %s, attempts = o.attempts + 1, claimed_by = %s, lease_until = %s,
+                    updated_date = now()
+                FROM (
+                    SELECT id FROM outbox
+                    WHERE news_id = %s AND state = %s {shard_filter}
+                    ORDER BY id LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ) claimed
+                WHERE o.id = claimed.id
+                RETURNING o.id, o.chat_id, (SELECT chat_type FROM chats c WHERE c.chat_id = o.chat_id) AS chat_type
+            ''', params + [limit])
+            rows = sorted((row['id'], row['chat_id'], row['chat_type']) for row in cursor.fetchall())
+        conn.commit()
+        return rows
+    except psycopg2.Error as e:
+        logger.error(f"Error claiming outbox batch: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+def _update(sql, params, action):
+    """Run one UPDATE or DELETE and commit; returns the affected row count (0 on error)."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            count = cursor.rowcount
+        conn.commit()
+        return count
+    except psycopg2.Error as e:
+        logger.error(f"Error {action}: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+def skip_delivered_outbox(news_id):
+    """Mark pending deliveries whose message is already logged as sent; returns how many were skipped."""
+    return _update('''
+        UPDATE outbox SET state = %s, updated_date = now()
+        WHERE news_id = %s AND state = %s
+          AND chat_id IN (SELECT chat_id FROM messages WHERE news_id = %s)
+    ''', (OUTBOX_SENT, news_id, OUTBOX_PENDING, news_id), "skipping delivered outbox rows")
+
+def get_broadcast(news_id):
+    """Fetch (content, status, version) of a story's broadcast, or None if it was never planned."""
+    rows = _fetch("SELECT content, status, version FROM broadcasts WHERE news_id = %s", (news_id,), "fetching broadcast")
+    return rows[0] if rows else None
+
+def update_broadcast_content(news_id, content):
+    """Replace the stored story and bump its version, so pending deliveries and running drains pick it up."""
+    return _update(
+        "UPDATE broadcasts SET content = %s, version = version + 1 WHERE news_id = %s",
+        (content, news_id), "updating broadcast content"
+    ) > 0
+
+def retract_broadcast(news_id, reason):
+    """Mark a story's broadcast retracted (bumping its version) and fail its pending deliveries.
+
+    Both happen in one statement; returns how many deliveries were cancelled.
+    """
+    return _update("""
+        WITH retracted AS (
+            UPDATE broadcasts SET status = 'retracted', version = version + 1, completed_date = now()
+            WHERE news_id = %s
+        )
+        UPDATE outbox SET state = %s, last_error = %s, updated_date = now() WHERE news_id = %s AND state = %s
+    """, (news_id, OUTBOX_FAILED, reason, news_id, OUTBOX_PENDING), "retracting broadcast")
+
+def count_pending_outbox(news_id):
+    """Count the deliveries still pending for a story."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM outbox WHERE news_id = %s AND state = %s", (news_id, OUTBOX_PENDING))
+            return cursor.fetchone()[0]
+    except psycopg2.Error as e:
+        logger.error(f"Error counting pending deliveries: {e}")
+        return 0
+    finally:
+        release_connection(conn)
+
+def release_outbox_inflight():
+    """Return deliveries claimed by a previous run to the pending state; call once at startup.
+
+    Only claims made by this worker (WORKER_ID) or whose lease has expired are
+    released, so rows another live worker is still sending are left alone.
+    """
+    return _update('''
+        UPDATE outbox SET state = %s, claimed_by = NULL, lease_until = NULL, updated_date = now()
+        WHERE state = %s AND (claimed_by IS NULL OR claimed_by = %s OR lease_until < %s)
+    ''', (OUTBOX_PENDING, OUTBOX_SENDING, WORKER_ID, time.time()), "releasing in-flight deliveries")
+
+def get_pending_broadcasts():
+    """Fetch (news_id, content) for every broadcast that still has deliveries to make."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT news_id, content FROM broadcasts WHERE status = 'pending' ORDER BY created_date")
+            return [(row['news_id'], row['content']) for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        logger.error(f"Error fetching pending broadcasts: {e}")
+        return []
+    finally:
+        release_connection(conn)
+
+def complete_broadcast(news_id):
+    """Mark a broadcast as done once no deliveries are pending or in flight."""
+    return _update('''
+        UPDATE broadcasts SET status = 'done', completed_date = now()
+        WHERE news_id = %s AND status = 'pending' AND NOT EXISTS (
+            SELECT 1 FROM outbox WHERE news_id = %s AND state IN (%s, %s)
+        )
+    ''', (news_id, news_id, OUTBOX_PENDING, OUTBOX_SENDING), "completing broadcast") > 0
+
+def write_message_log(messages, sent, failed):
+    """Write buffered message log rows and outbox states in one transaction; returns False on error.
+
+    Messages go in with multi-row INSERTs and outbox states with one
+    UPDATE ... FROM (VALUES ...) per page, instead of a statement per row.
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cursor:
+            extras.execute_values(
+                cursor,
+                "INSERT INTO messages (news_id, chat_id, message_id) VALUES %s ON CONFLICT (news_id, chat_id) DO NOTHING",
+                messages,
+                page_size=PAGE_SIZE
+            )
+            extras.execute_values(cursor, f'''
+                UPDATE outbox o SET state = '{OUTBOX_SENT}', message_id = v.message_id, updated_date = now()
+                FROM (VALUES %s) AS v(message_id, id) WHERE o.id = v.id
+            ''', sent, template="(%s::bigint, %s::bigint)", page_size=PAGE_SIZE)
+            extras.execute_values(cursor, f'''
+                UPDATE outbox o SET state = '{OUTBOX_FAILED}', last_error = v.error, updated_date = now()
+                FROM (VALUES %s) AS v(error, id) WHERE o.id = v.id
+            ''', failed, template="(%s::text, %s::bigint)", page_size=PAGE_SIZE)
+        conn.commit()
+        return True
+    except psycopg2.Error as e:
+        logger.error(f"Error flushing message log buffer, will retry: {e}")
+        return False
+    finally:
+        release_connection(conn)
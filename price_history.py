@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+import database
+from async_db import db
+from config import (PRICE_TICK_RETENTION_HOURS, PRICE_MINUTE_RETENTION_DAYS, PRICE_ROLLUP_INTERVAL,
+                    PRICE_CHART_POINTS)
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+RESOLUTIONS = (MINUTE, HOUR, DAY)  # finest first; each rolls up from the one before it
+
+# Buckets are recomputed from a little before the last run, so ticks written
+# while a run was in progress still land in their minute
+ROLLUP_OVERLAP = 60
+
+
+def bucket_start(ts, resolution):
+    """Start (unix seconds) of the `resolution` bucket containing `ts`."""
+    return int(ts // resolution) * resolution
+
+
+def aggregate_ticks(ticks, resolution):
+    """Fold (coin, price, ts) ticks, oldest first, into (coin, bucket, open, high, low, close, ticks) candles."""
+    candles = {}
+    for coin, price, ts in ticks:
+        key = (coin, bucket_start(ts, resolution))
+        candle = candles.get(key)
+        if candle is None:
+            candles[key] = [price, price, price, price, 1]
+        else:
+            candle[1] = max(candle[1], price)
+            candle[2] = min(candle[2], price)
+            candle[3] = price
+            candle[4] += 1
+    return [(coin, bucket, *candle) for (coin, bucket), candle in candles.items()]
+
+
+def aggregate_candles(children, resolution):
+    """Fold finer candles, oldest first, into candles of a coarser `resolution`."""
+    candles = {}
+    for coin, bucket, open_, high, low, close, ticks in children:
+        key = (coin, bucket_start(bucket, resolution))
+        candle = candles.get(key)
+        if candle is None:
+            candles[key] = [open_, high, low, close, ticks]
+        else:
+            candle[1] = max(candle[1], high)
+            candle[2] = min(candle[2], low)
+            candle[3] = close
+            candle[4] += ticks
+    return [(coin, bucket, *candle) for (coin, bucket), candle in candles.items()]
+
+
+class PriceRollup:
+    """Rolls price ticks up into 1m candles, 1m into 1h and 1h into 1d, then prunes old data.
+
+    Each run recomputes only the buckets touched since the previous run, from
+    their complete set of children, so running it again (or from several
+    processes sharing one database) is harmless.
+    """
+
+    def __init__(self, tick_retention=PRICE_TICK_RETENTION_HOURS * HOUR,
+                 minute_retention=PRICE_MINUTE_RETENTION_DAYS * DAY):
+        self.tick_retention = tick_retention
+        self.minute_retention = minute_retention
+        self.since = None
+
+    def run(self, now=None):
+        """One rollup pass; returns the number of candles written per resolution."""
+        now = time.time() if now is None else now
+        # After a restart, rebuild everything the retained ticks can still tell us
+        since = self.since if self.since is not None else now - self.tick_retention
+
+        written = {}
+        candles = aggregate_ticks(database.get_price_ticks_since(bucket_start(since, MINUTE)), MINUTE)
+        for finer, resolution in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+            if candles and not database.upsert_price_candles(finer, candles):
+                # Keep the watermark so the next run retries these buckets
+                return written
+            written[finer] = len(candles)
+            children = database.get_candles_since(finer, bucket_start(since, resolution))
+            candles = aggregate_candles(children, resolution)
+        if candles and not database.upsert_price_candles(RESOLUTIONS[-1], candles):
+            return written
+        written[RESOLUTIONS[-1]] = len(candles)
+
+        database.prune_price_ticks(now - self.tick_retention)
+        database.prune_price_candles(MINUTE, bucket_start(now - self.minute_retention, MINUTE))
+        self.since = now - ROLLUP_OVERLAP
+        return written
+
+    def resolution_for(self, start, end, now=None, min_points=PRICE_CHART_POINTS):
+        """The coarsest resolution giving at least `min_points` candles over [start, end) that is still retained."""
+        now = time.time() if now is None else now
+        for resolution in reversed(RESOLUTIONS):
+            if (end - start) / resolution < min_points:
+                continue
+            if resolution == MINUTE and start < now - self.minute_retention:
+                continue
+            return resolution
+        # Short ranges: minutes if still kept, hours otherwise
+        return MINUTE if start >= now - self.minute_retention else HOUR
+
+
+# ✅ Shared price rollup, run by the background job and used for range queries
+price_rollup = PriceRollup()
+
+
+def get_price_history(coin, start, end=None, min_points=PRICE_CHART_POINTS):
+    """Candles for a chart of `coin` over [start, end), read at the coarsest fitting resolution.
+
+    Returns (resolution, [(bucket, open, high, low, close, ticks), ...]).
+    """
+    end = time.time() if end is None else end
+    resolution = price_rollup.resolution_for(start, end, min_points=min_points)
+    return resolution, database.get_price_candles(coin, resolution, bucket_start(start, resolution), end)
+
+
+def price_change(candles):
+    """Change from the first candle's open to the last one's close; None without candles."""
+    if not candles:
+        return None
+    open_, close = candles[0][1], candles[-1][4]
+    return {
+        "since": candles[0][0],
+        "open": open_,
+        "close": close,
+        "change": (close - open_) / open_ * 100 if open_ else 0.0,
+    }
+
+
+def get_price_change(coin, period):
+    """Price change of `coin` over the last `period` seconds, read from candles."""
+    return price_change(get_price_history(coin, time.time() - period)[1])
+
+
+async def run_price_rollup():
+    while True:
+        try:
+            # Writes candles, so it queues on the database writer thread
+            await db.run(price_rollup.run)
+        except Exception as e:
+            logger.error(f"❌ Error rolling up price history: {e}")
+        await asyncio.sleep(PRICE_ROLLUP_INTERVAL)
+
+
+def start_price_rollup():
+    loop = asyncio.get_event_loop()
+    loop.create_task(run_price_rollup())
+    logger.info("✅ Price history rollup started.")
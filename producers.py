@@ -0,0 +1,161 @@
+import hashlib
+import hmac
+import threading
+import time
+from datetime import datetime, timezone, timedelta
+from config import WEBHOOK_SECRET, WEBHOOK_PRODUCERS, PRODUCER_RATE, PRODUCER_BURST, PRODUCER_DAILY_QUOTA
+from ratelimit import TokenBucket
+
+DEFAULT_PRODUCER = "default"
+
+# Admission outcomes
+ADMIT_OK = "ok"
+ADMIT_UNKNOWN = "unknown"
+ADMIT_RATE_LIMITED = "rate_limited"
+ADMIT_QUOTA_EXCEEDED = "quota_exceeded"
+
+
+def _digest(secret):
+    return hashlib.sha256(secret.encode()).digest()
+
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+
+def _seconds_until_midnight():
+    now = datetime.now(timezone.utc)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return (midnight - now).total_seconds()
+
+
+class Producer:
+    """One news source: its secret, request rate limit, daily item quota and usage counters."""
+
+    def __init__(self, name, secret, rate=PRODUCER_RATE, burst=PRODUCER_BURST, daily_quota=PRODUCER_DAILY_QUOTA):
+        self.name = name
+        self.digest = _digest(secret)
+        self.rate = rate
+        self.burst = burst
+        self.daily_quota = daily_quota
+        self.bucket = TokenBucket(rate, burst)
+        self.day = _today()
+        self.used_today = 0
+        self.requests = 0
+        self.accepted = 0
+        self.rate_limited = 0
+        self.quota_exceeded = 0
+        self.last_seen = None
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "daily_quota": self.daily_quota,
+            "used_today": self.used_today,
+            "remaining_today": max(self.daily_quota - self.used_today, 0),
+            "requests": self.requests,
+            "accepted": self.accepted,
+            "rate_limited": self.rate_limited,
+            "quota_exceeded": self.quota_exceeded,
+            "last_seen": self.last_seen.isoformat() if self.last_seen else None,
+        }
+
+
+def parse_producers(spec, default_secret=WEBHOOK_SECRET):
+    """Parse 'name:secret[:rate[:burst[:daily_quota]]],...' into Producers.
+
+    The legacy WEBHOOK_SECRET is always accepted as the 'default' producer
+    unless the spec defines one with that name.
+    """
+    producers = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        fields = item.split(':')
+        if len(fields) < 2 or not fields[0] or not fields[1]:
+            raise ValueError(f"Invalid producer spec: {item!r} (expected name:secret[:rate[:burst[:daily_quota]]])")
+        name, secret = fields[0], fields[1]
+        rate = float(fields[2]) if len(fields) > 2 and fields[2] else PRODUCER_RATE
+        burst = float(fields[3]) if len(fields) > 3 and fields[3] else max(PRODUCER_BURST, rate)
+        daily_quota = int(fields[4]) if len(fields) > 4 and fields[4] else PRODUCER_DAILY_QUOTA
+        producers.append(Producer(name, secret, rate, burst, daily_quota))
+
+    if default_secret and DEFAULT_PRODUCER not in {producer.name for producer in producers}:
+        producers.append(Producer(DEFAULT_PRODUCER, default_secret))
+    return producers
+
+
+class ProducerRegistry:
+    """Identifies producers by secret and enforces their limits, entirely in memory.
+
+    `admit()` charges one request against the producer's token bucket and is
+    meant to run before the body is parsed; `reserve()` then charges the
+    number of news items against the daily quota before any database work,
+    and `refund()` returns items that were not accepted after all.
+    """
+
+    def __init__(self, producers):
+        self._lock = threading.Lock()
+        self._by_digest = {}
+        self._by_name = {}
+        for producer in producers:
+            if producer.name in self._by_name:
+                raise ValueError(f"Duplicate producer name: {producer.name}")
+            self._by_digest[producer.digest] = producer
+            self._by_name[producer.name] = producer
+
+    def identify(self, secret):
+        """Return the Producer owning `secret`, or None."""
+        if not secret or not isinstance(secret, str):
+            return None
+        digest = _digest(secret)
+        producer = self._by_digest.get(digest)
+        # Lookup is by digest; compare_digest keeps the final check constant-time
+        if producer is not None and hmac.compare_digest(producer.digest, digest):
+            return producer
+        return None
+
+    def admit(self, secret):
+        """Charge one request; returns (producer, outcome, retry_after_seconds)."""
+        producer = self.identify(secret)
+        if producer is None:
+            return None, ADMIT_UNKNOWN, 0
+        with self._lock:
+            now = time.monotonic()
+            producer.requests += 1
+            producer.last_seen = datetime.now(timezone.utc)
+            wait = producer.bucket.wait_time(now)
+            if wait > 0:
+                producer.rate_limited += 1
+                return producer, ADMIT_RATE_LIMITED, wait
+            producer.bucket.consume(now)
+        return producer, ADMIT_OK, 0
+
+    def reserve(self, producer, items=1):
+        """Charge `items` against today's quota; returns (outcome, retry_after_seconds)."""
+        with self._lock:
+            if producer.day != _today():
+                producer.day = _today()
+                producer.used_today = 0
+            if producer.used_today + items > producer.daily_quota:
+                producer.quota_exceeded += 1
+                return ADMIT_QUOTA_EXCEEDED, _seconds_until_midnight()
+            producer.used_today += items
+            producer.accepted += items
+        return ADMIT_OK, 0
+
+    def refund(self, producer, items=1):
+        """Give back quota for items reserved but not accepted (e.g. the dispatcher was full)."""
+        with self._lock:
+            if producer.day == _today():
+                producer.used_today = max(producer.used_today - items, 0)
+            producer.accepted = max(producer.accepted - items, 0)
+
+    def stats(self):
+        """Usage counters of every producer (never their secrets)."""
+        with self._lock:
+            return [producer.to_dict() for producer in self._by_name.values()]
+
+
+# ✅ Shared producer registry for every ingest endpoint
+producers = ProducerRegistry(parse_producers(WEBHOOK_PRODUCERS))
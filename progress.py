@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import deque, OrderedDict
+from datetime import datetime, timezone, timedelta
+
+
+class BroadcastProgress:
+    """In-memory counters for one in-flight broadcast."""
+
+    RATE_WINDOW = 10.0  # seconds of recent sends used for the current rate
+
+    def __init__(self, news_id, total):
+        self.news_id = news_id
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at = None
+        self._started = time.monotonic()
+        self._recent = deque()  # (monotonic time, completed count)
+
+    @property
+    def pending(self):
+        return max(self.total - self.sent - self.failed, 0)
+
+    def _completed(self, count, now):
+        self._recent.append((now, count))
+        while self._recent and now - self._recent[0][0] > self.RATE_WINDOW:
+            self._recent.popleft()
+
+    def rate(self, now):
+        """Messages completed per second over the recent window."""
+        while self._recent and now - self._recent[0][0] > self.RATE_WINDOW:
+            self._recent.popleft()
+        window = min(self.RATE_WINDOW, now - self._started)
+        if window <= 0:
+            return 0.0
+        return sum(count for _, count in self._recent) / window
+
+    def to_dict(self, now):
+        rate = self.rate(now) if self.finished_at is None else 0.0
+        eta_seconds = self.pending / rate if rate > 0 else None
+        return {
+            "news_id": self.news_id,
+            "status": "done" if self.finished_at else "in_progress",
+            "total": self.total,
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "pending": self.pending,
+            "rate_per_second": round(rate, 2),
+            "eta_seconds": round(eta_seconds, 1) if eta_seconds is not None else None,
+            "projected_completion": (
+                (datetime.now(timezone.utc) + timedelta(seconds=eta_seconds)).isoformat()
+                if eta_seconds is not None else None
+            ),
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class BroadcastRegistry:
+    """Thread-safe registry of broadcast progress, read by the /broadcasts endpoints.
+
+    Finished broadcasts are kept (most recent `keep_finished`) so their final
+    counts stay visible after completion.
+    """
+
+    def __init__(self, keep_finished=50):
+        self.keep_finished = keep_finished
+        self._lock = threading.Lock()
+        self._broadcasts = OrderedDict()
+
+    def start(self, news_id, total):
+        with self._lock:
+            progress = BroadcastProgress(news_id, total)
+            self._broadcasts[news_id] = progress
+            self._broadcasts.move_to_end(news_id)
+            self._trim()
+            return progress
+
+    def _trim(self):
+        # Caller holds the lock
+        finished = [news_id for news_id, progress in self._broadcasts.items() if progress.finished_at]
+        for news_id in finished[:max(len(finished) - self.keep_finished, 0)]:
+            del self._broadcasts[news_id]
+
+    def record(self, news_id, sent=0, failed=0, retried=0):
+        """Add to a broadcast's counters (unknown news_ids are ignored)."""
+        with self._lock:
+            progress = self._broadcasts.get(news_id)
+            if progress is None:
+                return
+            progress.sent += sent
+            progress.failed += failed
+            progress.retried += retried
+            if sent or failed:
+                progress._completed(sent + failed, time.monotonic())
+
+    def finish(self, news_id):
+        with self._lock:
+            progress = self._broadcasts.get(news_id)
+            if progress is not None:
+                progress.finished_at = datetime.now(timezone.utc)
+                self._trim()
+
+    def get(self, news_id):
+        """Return a JSON-ready snapshot of one broadcast, or None."""
+        with self._lock:
+            progress = self._broadcasts.get(news_id)
+            return progress.to_dict(time.monotonic()) if progress else None
+
+    def all(self):
+        """Return JSON-ready snapshots of every tracked broadcast, newest first."""
+        with self._lock:
+            now = time.monotonic()
+            return [progress.to_dict(now) for progress in reversed(self._broadcasts.values())]
+
+
+class ProgressReporter:
+    """Fan-out progress hook that records into the registry for one news_id."""
+
+    def __init__(self, registry, news_id):
+        self.registry = registry
+        self.news_id = news_id
+
+    def sent(self):
+        self.registry.record(self.news_id, sent=1)
+
+    def failed(self):
+        self.registry.record(self.news_id, failed=1)
+
+    def retried(self):
+        self.registry.record(self.news_id, retried=1)
+
+
+class QueueProgressReporter:
+    """Fan-out progress hook for shard worker processes.
+
+    Counts are batched and pushed to a multiprocessing queue as
+    (news_id, sent, failed, retried) tuples; the coordinator feeds them into
+    its registry.
+    """
+
+    FLUSH_INTERVAL = 0.5
+
+    def __init__(self, queue, news_id):
+        self.queue = queue
+        self.news_id = news_id
+        self._counts = [0, 0, 0]
+        self._last_flush = time.monotonic()
+
+    def _add(self, index):
+        self._counts[index] += 1
+        if time.monotonic() - self._last_flush >= self.FLUSH_INTERVAL:
+            self.flush()
+
+    def sent(self):
+        self._add(0)
+
+    def failed(self):
+        self._add(1)
+
+    def retried(self):
+        self._add(2)
+
+    def flush(self):
+        if any(self._counts):
+            self.queue.put((self.news_id, *self._counts))
+            self._counts = [0, 0, 0]
+        self._last_flush = time.monotonic()
+
+
+# ✅ Shared registry for every broadcast started in this process
+registry = BroadcastRegistry()
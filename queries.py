@@ -0,0 +1,53 @@
+"""SQLite statements on the hot paths, shared by database.py and the query plan checks in migrations.py.
+
+Keeping a single copy means `python migrations.py` explains exactly what the
+bot runs, so an edit that stops a query from using its index fails the check.
+"""
+
+# Dedup warm-up. Unary + keeps the planner on the received_date range instead of the news_id index
+RECENT_WEBHOOKS = '''
+    SELECT news_id, content_hash, (julianday('now') - julianday(received_date)) * 86400 AS age
+    FROM webhook_logs
+    WHERE received_date >= datetime('now', ?)
+      AND +news_id IN (SELECT news_id FROM broadcasts)
+    ORDER BY received_date
+'''
+
+# Retention: the oldest rows past the cutoff, one batch at a time
+WEBHOOK_LOGS_BEFORE = '''
+    SELECT id, news_id, content, payload, content_hash, received_date
+    FROM webhook_logs
+    WHERE received_date < datetime('now', ?)
+    ORDER BY received_date, id
+    LIMIT ?
+'''
+
+# Idempotent delivery
+DELIVERED_CHAT_IDS = "SELECT chat_id FROM messages WHERE news_id = ?"
+
+# Corrections and retractions: every logged delivery of a story, or the one to a single chat
+SENT_MESSAGES = '''
+    SELECT m.chat_id, m.message_id, c.chat_type FROM messages m
+    LEFT JOIN chats c ON c.chat_id = m.chat_id
+    WHERE m.news_id = ? AND m.message_id IS NOT NULL
+'''
+SENT_MESSAGES_TO_CHAT = SENT_MESSAGES + "  AND m.chat_id = ?\n"
+
+# Resumed broadcasts: pending deliveries whose message is already logged
+SKIP_DELIVERED_OUTBOX = '''
+    UPDATE outbox SET state = ?, updated_date = CURRENT_TIMESTAMP
+    WHERE news_id = ? AND state = ?
+      AND chat_id IN (SELECT chat_id FROM messages WHERE news_id = ?)
+'''
+
+# Price rollups and charts
+PRICE_TICKS_SINCE = "SELECT coin, price, ts FROM price_ticks WHERE ts >= ? ORDER BY ts"
+CANDLES_SINCE = '''
+    SELECT coin, bucket, open, high, low, close, ticks FROM price_candles
+    WHERE resolution = ? AND bucket >= ? ORDER BY bucket
+'''
+PRICE_CANDLES = '''
+    SELECT bucket, open, high, low, close, ticks FROM price_candles
+    WHERE coin = ? AND resolution = ? AND bucket >= ? AND bucket < ?
+    ORDER BY bucket
+'''
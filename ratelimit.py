@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+from config import TELEGRAM_GLOBAL_RATE, TELEGRAM_PER_CHAT_RATE, TELEGRAM_GROUP_PER_MINUTE
+
+GROUP_CHAT_TYPES = ("group", "supergroup")
+
+
+def is_group_chat(chat_id, chat_type=None):
+    """Return True if the chat is a (super)group; group chat IDs are negative."""
+    if chat_type:
+        return chat_type in GROUP_CHAT_TYPES
+    try:
+        return int(chat_id) < 0
+    except (TypeError, ValueError):
+        return False
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now, amount=1):
+        """Seconds until `amount` tokens are available (0 if they are available now)."""
+        self._refill(now)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, now, amount=1):
+        self._refill(now)
+        self.tokens -= amount
+
+    def reserve(self, now, amount=1):
+        """Take `amount` tokens now, going into debt if needed; returns the seconds until they are covered.
+
+        Callers that reserve one after another are served in FIFO order.
+        """
+        self.consume(now, amount)
+        return max(0.0, -self.tokens / self.rate)
+
+    def is_full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class TelegramRateLimiter:
+    """Token-bucket model of Telegram's flood limits.
+
+    A send must get a token from the global bucket, from the chat's own bucket
+    and, for groups, from the stricter per-group-per-minute bucket. The limiter
+    holds no asyncio primitives, so it can be shared by every event loop and
+    thread in the process.
+    """
+
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, global_rate=TELEGRAM_GLOBAL_RATE, per_chat_rate=TELEGRAM_PER_CHAT_RATE,
+                 group_per_minute=TELEGRAM_GROUP_PER_MINUTE):
+        self._lock = threading.Lock()
+        self._global = TokenBucket(global_rate, max(1, global_rate))
+        self._per_chat_rate = per_chat_rate
+        self._group_rate = group_per_minute / 60.0
+        self._chats = {}
+        self._last_prune = time.monotonic()
+
+    def _chat_buckets(self, chat_id, is_group):
+        buckets = self._chats.get(chat_id)
+        if buckets is None:
+            buckets = [TokenBucket(self._per_chat_rate, 1)]
+            if is_group:
+                buckets.append(TokenBucket(self._group_rate, 1))
+            self._chats[chat_id] = buckets
+        return buckets
+
+    def _prune(self, now):
+        # Drop per-chat buckets that have fully refilled, they carry no state
+        if now - self._last_prune < self.PRUNE_INTERVAL:
+            return
+        self._last_prune = now
+        idle = [chat_id for chat_id, buckets in self._chats.items() if all(b.is_full(now) for b in buckets)]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    def set_global_rate(self, rate):
+        """Change the global messages-per-second cap (e.g. to one shard's share of it)."""
+        with self._lock:
+            self._global = TokenBucket(rate, max(1, rate))
+
+    def reserve_chat(self, chat_id, is_group=False):
+        """Take the chat's own send slot if its buckets allow it, otherwise return the seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            buckets = self._chat_buckets(chat_id, is_group)
+            wait = max(bucket.wait_time(now) for bucket in buckets)
+            if wait <= 0:
+                for bucket in buckets:
+                    bucket.consume(now)
+            self._prune(now)
+            return wait
+
+    def reserve_global(self):
+        """Reserve the next global send slot; returns the seconds until it comes up."""
+        with self._lock:
+            return self._global.reserve(time.monotonic())
+
+    async def acquire(self, chat_id, is_group=False):
+        """Wait until a message may be sent to the chat without hitting flood control.
+
+        The per-chat and per-group buckets are checked first (only sends to the
+        same chat compete for them); the global slot is then reserved, which
+        serves concurrent senders in arrival order instead of letting them race.
+        """
+        while True:
+            wait = self.reserve_chat(chat_id, is_group)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+
+        wait = self.reserve_global()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+# ✅ Shared limiter: every outbound send in the process draws from the same budget
+limiter = TelegramRateLimiter()
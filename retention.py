@@ -0,0 +1,153 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timezone
+import database
+from async_db import db
+from config import (WEBHOOK_LOG_RETENTION_DAYS, WEBHOOK_ARCHIVE_DIR, WEBHOOK_ARCHIVE_KEEP,
+                    WEBHOOK_ARCHIVE_BATCH, WEBHOOK_RETENTION_INTERVAL)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PREFIX = "webhook_logs-"
+ARCHIVE_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx"  # next to each archive: its size after every fully written batch, one per line
+
+
+def _archive_path(archive_dir):
+    """Today's archive file; each run appends a new gzip member to it."""
+    day = datetime.now(timezone.utc).strftime('%Y%m%d')
+    return os.path.join(archive_dir, f"{ARCHIVE_PREFIX}{day}{ARCHIVE_SUFFIX}")
+
+
+def _archive_record(row):
+    content = database.unpack_webhook(row)
+    try:
+        news = json.loads(content) if content else None
+    except ValueError:
+        news = content
+    return {
+        "id": row['id'],
+        "news_id": row['news_id'],
+        "received_date": row['received_date'],
+        "content_hash": row['content_hash'],
+        "news": news,
+    }
+
+
+def _rotate(archive_dir, keep):
+    """Delete the oldest archive files beyond `keep`."""
+    archives = sorted(name for name in os.listdir(archive_dir)
+                      if name.startswith(ARCHIVE_PREFIX) and name.endswith(ARCHIVE_SUFFIX))
+    for name in archives[:max(len(archives) - keep, 0)]:
+        os.remove(os.path.join(archive_dir, name))
+        if os.path.exists(os.path.join(archive_dir, name + INDEX_SUFFIX)):
+            os.remove(os.path.join(archive_dir, name + INDEX_SUFFIX))
+        logger.info(f"🗑 Removed old webhook archive {name}")
+
+
+def _fsync_dir(path):
+    """Make newly created directory entries durable."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _record_size(path, size):
+    """Append `size` to the archive's index and sync it."""
+    with open(path + INDEX_SUFFIX, 'a') as index:
+        index.write(f"{size}\n")
+        index.flush()
+        os.fsync(index.fileno())
+
+
+def _committed_size(path):
+    """The archive's size after its last fully written batch, or None without an index."""
+    try:
+        with open(path + INDEX_SUFFIX) as index:
+            # A line cut short by a crash has no newline yet and is ignored
+            lines = index.read().split("\n")[:-1]
+    except FileNotFoundError:
+        return None
+    return int(lines[-1]) if lines else 0
+
+
+def _discard_torn_batch(path):
+    """Cut off a gzip member left half-written by a crash, so later batches stay readable.
+
+    Its rows were never deleted from webhook_logs, so the next batch archives them again.
+    """
+    committed = _committed_size(path)
+    if committed is None or not os.path.exists(path) or os.path.getsize(path) <= committed:
+        return
+    with open(path, 'r+b') as raw:
+        raw.truncate(committed)
+        os.fsync(raw.fileno())
+    logger.warning(f"⚠️ Discarded a partly written batch at the end of {path}")
+
+
+def archive_webhook_logs(max_age_days=WEBHOOK_LOG_RETENTION_DAYS, archive_dir=WEBHOOK_ARCHIVE_DIR,
+                         batch_size=WEBHOOK_ARCHIVE_BATCH, keep=WEBHOOK_ARCHIVE_KEEP):
+    """Move webhook_logs rows older than `max_age_days` into today's gzip JSONL archive.
+
+    Rows go in batches, each one a complete gzip member appended to the
+    archive. A batch is deleted from the table only after its member
+    (trailer included) is synced and its end recorded in the archive's
+    index, so a crash can at worst archive a batch twice, never lose it;
+    a member cut short by a crash is discarded on the next run. Returns
+    the number of rows moved.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = _archive_path(archive_dir)
+    _discard_torn_batch(path)
+    moved = 0
+    while True:
+        rows = database.get_webhook_logs_before(max_age_days, batch_size)
+        if not rows:
+            break
+        if not os.path.exists(path):
+            # The index exists before the archive, so a torn first batch is recognised too
+            _record_size(path, 0)
+            open(path, 'ab').close()
+            _fsync_dir(archive_dir)
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as archive:
+                for row in rows:
+                    archive.write((json.dumps(_archive_record(row), ensure_ascii=False) + "\n").encode())
+            # Closing the GzipFile wrote the member's CRC32/size trailer; sync only now
+            raw.flush()
+            os.fsync(raw.fileno())
+            size = raw.tell()
+        _record_size(path, size)
+        deleted = db.call(database.delete_webhook_logs, [row['id'] for row in rows])
+        if deleted == 0:
+            logger.error("❌ Archived webhook logs could not be deleted, stopping retention run")
+            break
+        moved += deleted
+        if len(rows) < batch_size:
+            break
+
+    _rotate(archive_dir, keep)
+    if moved:
+        logger.info(f"📦 Archived {moved} webhook logs to {path}")
+    return moved
+
+
+async def run_retention():
+    while True:
+        try:
+            # Reads and compresses on its own thread; the deletes go to the database writer thread
+            await asyncio.to_thread(archive_webhook_logs)
+        except Exception as e:
+            logger.error(f"❌ Error archiving webhook logs: {e}")
+        await asyncio.sleep(WEBHOOK_RETENTION_INTERVAL)
+
+
+def start_retention_job():
+    loop = asyncio.get_event_loop()
+    loop.create_task(run_retention())
+    logger.info("✅ Webhook log retention job started.")
@@ -36,7 +36,6 @@ def reset_database():
     cursor = conn.cursor()
     cursor.execute("DELETE FROM chats")
     conn.commit()
-    conn.close()
     logger.info("تم مسح جميع المحادثات من قاعدة البيانات")
 
 
@@ -40,7 +40,7 @@ async def test_broadcast():
     )
     
     # Show what would be sent
-    formatted_message = news.format_telegram_message()
+    formatted_message = news.render()
     logger.info(f"Formatted message that would be sent:\n{formatted_message}")
     
     logger.info("Note: The actual message won't be delivered since this is a simulation with a fake chat ID")
@@ -0,0 +1,106 @@
+"""Native ASGI /news-webhook/stream: items are accepted while the body is still arriving.
+
+Drives the ASGI app directly (no server or network) against a throwaway
+SQLite database:
+
+    python test_asgi_stream.py
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_asgi_stream.db')
+os.environ['DATABASE_URL'] = ''
+
+from flask import Flask
+import database
+from asgi import WebhookASGI
+from config import WEBHOOK_SECRET
+from dispatcher import dispatcher
+
+
+def _item(n):
+    return (json.dumps({"id": f"asgi-stream-{n}", "title": f"Story {n}", "content": "Body"}) + "\n").encode()
+
+
+async def _stream(app, first, rest):
+    """POST `first`, then hold `rest` back until the first ack has been sent; returns the ack lines."""
+    first_ack = asyncio.Event()
+    chunks = [first, rest]
+    acks, status = [], []
+
+    async def receive():
+        if len(chunks) == 2:
+            return {'type': 'http.request', 'body': chunks.pop(0), 'more_body': True}
+        if chunks:
+            await first_ack.wait()
+            return {'type': 'http.request', 'body': chunks.pop(0), 'more_body': False}
+        await asyncio.Event().wait()  # nothing more until the response is done
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif message.get('body'):
+            acks.extend(json.loads(line) for line in message['body'].splitlines())
+            # The rest of the body only arrives once something has been acked
+            first_ack.set()
+
+    scope = {
+        'type': 'http', 'method': 'POST', 'path': '/news-webhook/stream',
+        'headers': [(b'content-type', b'application/x-ndjson'), (b'x-webhook-secret', WEBHOOK_SECRET.encode())],
+    }
+    await asyncio.wait_for(app(scope, receive, send), timeout=10)
+    return status, acks
+
+
+def _wait_for_broadcasts(timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = dispatcher.stats()
+        if not stats['queued'] and not stats['running']:
+            return
+        time.sleep(0.05)
+    raise AssertionError("queued broadcasts did not finish")
+
+
+def test_items_are_acked_before_the_body_is_complete():
+    database.init_db()
+    app = WebhookASGI(Flask(__name__))
+
+    # The second item is split across the two chunks, so it also has to be reassembled
+    second = _item(2)
+    status, acks = asyncio.run(_stream(app, _item(1) + second[:10], second[10:] + _item(3)))
+
+    assert status == [200]
+    assert [(ack.get('line'), ack['status']) for ack in acks] == [
+        (1, 'accepted'), (2, 'accepted'), (3, 'accepted'), (None, 'done'),
+    ]
+    assert acks[-1]['accepted'] == 3
+    _wait_for_broadcasts()
+
+
+def test_stream_rejects_other_content_types():
+    app = WebhookASGI(Flask(__name__))
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http', 'method': 'POST', 'path': '/news-webhook/stream',
+        'headers': [(b'content-type', b'application/json'), (b'x-webhook-secret', WEBHOOK_SECRET.encode())],
+    }
+    asyncio.run(app(scope, receive, send))
+    assert sent[0]['status'] == 415
+
+
+if __name__ == "__main__":
+    test_items_are_acked_before_the_body_is_complete()
+    test_stream_rejects_other_content_types()
+    print("✅ Streamed news items are accepted while the body is still arriving")
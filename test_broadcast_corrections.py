@@ -0,0 +1,112 @@
+"""Corrections and retractions sent while a broadcast is still running.
+
+Runs against a throwaway SQLite database and an in-memory stand-in for the
+Bot API, so no token or network is needed:
+
+    python test_broadcast_corrections.py
+"""
+import asyncio
+import itertools
+import os
+import tempfile
+from types import SimpleNamespace
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_broadcast_corrections.db')
+os.environ['TELEGRAM_GLOBAL_RATE'] = '100'
+os.environ['DATABASE_URL'] = ''
+
+from telegram.error import BadRequest
+import bot
+import database
+from models import News
+
+CHATS = 200
+
+
+class FakeBot:
+    """Keeps the text of every message still visible in each chat."""
+
+    def __init__(self, latency=0.01):
+        self.latency = latency
+        self.visible = {}  # (chat_id, message_id) -> text
+        self._message_ids = itertools.count(1)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await asyncio.sleep(self.latency)
+        message_id = next(self._message_ids)
+        self.visible[(chat_id, message_id)] = text
+        return SimpleNamespace(message_id=message_id)
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        await asyncio.sleep(self.latency)
+        key = (chat_id, message_id)
+        if key not in self.visible:
+            raise BadRequest("Message to edit not found")
+        if self.visible[key] == text:
+            raise BadRequest("Message is not modified")
+        self.visible[key] = text
+        return True
+
+    async def delete_message(self, chat_id, message_id):
+        await asyncio.sleep(self.latency)
+        if self.visible.pop((chat_id, message_id), None) is None:
+            raise BadRequest("Message to delete not found")
+        return True
+
+
+def setup(news_id):
+    database.init_db()
+    for chat_id in range(1, CHATS + 1):
+        database.add_chat(chat_id, f"Chat {chat_id}", 'private')
+    fake = FakeBot()
+    bot.bot = fake
+    news = News(news_id, "Original title", "Original text")
+    bot.plan_broadcast(news)
+    return fake, news
+
+
+def _remove_chats():
+    # Other test modules plan broadcasts to every chat in the shared database
+    for chat_id in range(1, CHATS + 1):
+        database.remove_chat(chat_id)
+
+
+async def _while_broadcasting(news, action, delay=0.4):
+    broadcast = asyncio.create_task(bot.drain_outbox(news))
+    await asyncio.sleep(delay)
+    assert not broadcast.done(), "broadcast finished before the correction; raise CHATS"
+    await action()
+    await broadcast
+
+
+def test_correction_during_broadcast():
+    fake, news = setup("correction-during-broadcast")
+    corrected = News(news.news_id, "Corrected title", "Corrected text")
+
+    try:
+        asyncio.run(_while_broadcasting(news, lambda: bot.update_news(corrected)))
+    finally:
+        _remove_chats()
+
+    assert len(fake.visible) == CHATS
+    stale = [key for key, text in fake.visible.items() if text != corrected.render()]
+    assert not stale, f"{len(stale)} chats still show the uncorrected story"
+
+
+def test_retraction_during_broadcast():
+    fake, news = setup("retraction-during-broadcast")
+
+    try:
+        asyncio.run(_while_broadcasting(news, lambda: bot.retract_news(news.news_id)))
+    finally:
+        _remove_chats()
+
+    assert not fake.visible, f"{len(fake.visible)} retracted copies are still visible"
+    assert database.count_pending_outbox(news.news_id) == 0
+
+
+if __name__ == "__main__":
+    test_correction_during_broadcast()
+    test_retraction_during_broadcast()
+    print("✅ Corrections and retractions reach every chat of a running broadcast")
@@ -0,0 +1,75 @@
+"""Chat registry: the compact in-memory chat list and its write-through from database.py.
+
+    python test_chat_registry.py
+"""
+import os
+import tempfile
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_chat_registry.db')
+os.environ['DATABASE_URL'] = ''
+
+import database
+from chat_registry import ChatRegistry, chat_registry
+
+FIRST_CHAT = 34_000  # clear of chats other test modules add to the shared database
+
+
+def test_add_update_and_remove():
+    registry = ChatRegistry()
+    registry.load([
+        {"chat_id": 1, "chat_title": "One", "chat_type": "private"},
+        {"chat_id": -2, "chat_title": "Two", "chat_type": "group"},
+        {"chat_id": -3, "chat_title": "Three", "chat_type": "supergroup"},
+    ])
+    assert registry.loaded and len(registry) == 3
+
+    registry.add(-2, "Two renamed", "supergroup")
+    assert len(registry) == 3
+    assert registry.get(-2) == ("Two renamed", "supergroup")
+
+    # Removing from the middle moves the last chat into the freed slot
+    assert registry.remove(1)
+    assert not registry.remove(1)
+    assert 1 not in registry and -3 in registry
+    assert sorted(registry.targets()) == [(-3, "supergroup"), (-2, "supergroup")]
+    assert registry.get(-3) == ("Three", "supergroup")
+    assert sorted(registry.chat_ids()) == [-3, -2]
+
+    # Unknown chat types get their own code
+    registry.add(4, "Four", "forum")
+    assert registry.get(4) == ("Four", "forum")
+
+
+def test_memory_is_accounted_per_chat():
+    registry = ChatRegistry()
+    registry.load({"chat_id": chat_id, "chat_title": f"Chat {chat_id}", "chat_type": "private"}
+                  for chat_id in range(10_000))
+    loaded = registry.memory_usage()
+    for chat_id in range(5_000):
+        registry.remove(chat_id)
+    assert registry.memory_usage() < loaded
+    stats = registry.stats()
+    assert stats["chats"] == 5_000
+    # Two parallel arrays, a title and a dict slot per chat: far below a dict row per chat
+    assert stats["bytes_per_chat"] < 400
+
+
+def test_database_writes_through_to_the_shared_registry():
+    database.init_db()
+    chat_id = FIRST_CHAT
+    assert database.add_chat(chat_id, "Registry chat", 'group')
+    assert chat_registry.get(chat_id) == ("Registry chat", 'group')
+    assert database.add_chat(chat_id, "Registry chat", 'supergroup')
+    assert chat_registry.get(chat_id) == ("Registry chat", 'supergroup')
+
+    assert database.remove_chat(chat_id)
+    assert chat_id not in chat_registry
+    assert chat_id not in {row['chat_id'] for row in database.get_all_chats()}
+
+
+if __name__ == "__main__":
+    test_add_update_and_remove()
+    test_memory_is_accounted_per_chat()
+    test_database_writes_through_to_the_shared_registry()
+    print("✅ Chat registry mirrors the chats table in compact arrays")
@@ -0,0 +1,63 @@
+"""Pooled SQLite connections: one WAL connection per thread, reused across calls.
+
+    python test_connection_pool.py
+"""
+import os
+import tempfile
+import threading
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_connection_pool.db')
+os.environ['DATABASE_URL'] = ''
+
+import database
+from config import DB_BUSY_TIMEOUT_MS
+
+
+def test_each_thread_reuses_its_own_connection():
+    database.init_db()
+    conn = database.get_db_connection()
+    database.release_connection(conn)
+    assert database.get_db_connection() is conn
+
+    others = []
+    thread = threading.Thread(target=lambda: others.append(database.get_db_connection()))
+    thread.start()
+    thread.join()
+    assert others[0] is not conn
+
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == DB_BUSY_TIMEOUT_MS
+
+
+def test_release_rolls_back_what_was_left_uncommitted():
+    database.init_db()
+    conn = database.get_db_connection()
+    conn.execute("INSERT INTO chats (chat_id, chat_title, chat_type) VALUES (37000, 'Uncommitted', 'private')")
+    assert conn.in_transaction
+    database.release_connection(conn)
+    assert not conn.in_transaction
+    assert 37000 not in {row['chat_id'] for row in database.get_all_chats()}
+
+
+def test_new_connection_after_close_or_fork():
+    database.init_db()
+    conn = database.get_db_connection()
+    database.close_db_connection()
+    reopened = database.get_db_connection()
+    assert reopened is not conn
+    assert database.add_chat(37001, "After reopening", 'private')
+    assert database.remove_chat(37001)
+
+    # A forked child sees its parent's thread-local connection but must not use it
+    database._local.pid = -1
+    assert database.get_db_connection() is not reopened
+    reopened.close()
+
+
+if __name__ == "__main__":
+    test_each_thread_reuses_its_own_connection()
+    test_release_rolls_back_what_was_left_uncommitted()
+    test_new_connection_after_close_or_fork()
+    print("✅ Database connections are pooled per thread")
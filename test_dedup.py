@@ -0,0 +1,116 @@
+"""News dedup: the TTL/LRU cache, content-hash keys, retried webhooks and warming after a restart.
+
+Drives the Flask blueprint with its test client against a throwaway SQLite
+database; the drain itself is replaced by a recorder, so nothing is sent:
+
+    python test_dedup.py
+"""
+import json
+import os
+import tempfile
+import time
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_dedup.db')
+os.environ['DATABASE_URL'] = ''
+
+from flask import Flask
+import database
+import webhook
+from dedup import DedupCache, news_keys, warm_from_database
+from producers import Producer, ProducerRegistry
+
+SECRET = "test-dedup-secret"
+CHAT_ID = 32_000  # clear of chats other test modules add to the shared database
+
+
+def _item(news_id, content="Story"):
+    return {"id": news_id, "title": "Dedup", "content": content}
+
+
+def test_cache_expires_and_evicts_least_recently_used():
+    cache = DedupCache(maxsize=2, ttl=60)
+    cache.add(["a"])
+    cache.add(["b"], ttl=0.05)
+    assert cache.find(["x", "a"]) == "a"
+    assert cache.find(["x"]) is None
+    time.sleep(0.06)
+    assert cache.find(["b"]) is None
+
+    cache.add(["b"])
+    assert cache.find(["a"]) == "a"  # now the most recently used
+    cache.add(["c"])
+    assert cache.find(["b"]) is None and cache.find(["a"]) == "a"
+    stats = cache.stats()
+    assert (stats["hits"], stats["size"]) == (3, 2)
+
+
+def test_keys_catch_the_same_story_under_a_new_id():
+    first, second = news_keys("dedup-1", _item("dedup-1")), news_keys("dedup-2", _item("dedup-2"))
+    assert first[0] == "id:dedup-1" and second[0] == "id:dedup-2"
+    assert first[1] == second[1] and first[1].startswith("hash:")
+    assert news_keys("dedup-3", _item("dedup-3", "Other story"))[1] != first[1]
+    # Targeted sends are keyed per chat
+    assert news_keys("dedup-1", _item("dedup-1"), 42) == [key + "@42" for key in first]
+
+
+def test_retried_webhooks_are_answered_from_memory():
+    database.init_db()
+    database.add_chat(CHAT_ID, "Dedup chat", 'private')
+    producer = Producer("test-dedup", SECRET, rate=1000, burst=1000)
+    drained = []
+
+    async def drain(news, *args, **kwargs):
+        drained.append(news.news_id)
+        return 0, 0
+
+    app = Flask(__name__)
+    app.register_blueprint(webhook.webhook_bp)
+    client = app.test_client()
+    saved = webhook.news_dedup, webhook.producers, webhook.drain_outbox
+    webhook.news_dedup, webhook.producers, webhook.drain_outbox = DedupCache(), ProducerRegistry([producer]), drain
+    try:
+        first = client.post('/news-webhook', json={"secret": SECRET, "news": _item("dedup-webhook", "Retried")})
+        retry = client.post('/news-webhook', json={"secret": SECRET, "news": _item("dedup-webhook", "Retried")})
+        renamed = client.post('/news-webhook', json={"secret": SECRET, "news": _item("dedup-renamed", "Retried")})
+        update = client.post('/news-webhook', json={
+            "secret": SECRET, "action": "update", "news": _item("dedup-webhook", "Retried"),
+        })
+    finally:
+        webhook.news_dedup, webhook.producers, webhook.drain_outbox = saved
+    database.retract_broadcast("dedup-webhook", "test finished")
+    # Other test modules plan broadcasts to every chat in the shared database
+    database.remove_chat(CHAT_ID)
+
+    assert first.get_json()["status"] == "success"
+    assert (retry.get_json()["status"], retry.get_json()["matched"]) == ("duplicate", "id")
+    assert (renamed.get_json()["status"], renamed.get_json()["matched"]) == ("duplicate", "hash")
+    # Updates are never deduplicated
+    assert update.get_json()["status"] == "success"
+    # Duplicates were neither charged, logged nor planned
+    assert producer.used_today == 2
+    assert database.get_broadcast("dedup-renamed") is None
+
+
+def test_cache_is_warmed_from_broadcast_webhooks():
+    database.init_db()
+    item = _item("dedup-warm", "Logged before a restart")
+    database.log_webhook("dedup-warm", json.dumps(item))
+    database.create_broadcasts([("dedup-warm", json.dumps(item), [CHAT_ID])])
+    database.log_webhook("dedup-never-broadcast", json.dumps(_item("dedup-never-broadcast", "Rejected")))
+    database.retract_broadcast("dedup-warm", "test finished")
+
+    cache = DedupCache()
+    assert warm_from_database(cache) >= 1
+    assert cache.find(news_keys("dedup-warm", item)) == "id:dedup-warm"
+    assert cache.find(news_keys("dedup-warm-renamed", item)) is not None
+    # Logged webhooks that were never planned (e.g. turned away with 429) are not duplicates
+    assert cache.find(news_keys("dedup-never-broadcast", _item("dedup-never-broadcast", "Rejected"))) is None
+
+
+if __name__ == "__main__":
+    test_cache_expires_and_evicts_least_recently_used()
+    test_keys_catch_the_same_story_under_a_new_id()
+    test_retried_webhooks_are_answered_from_memory()
+    test_cache_is_warmed_from_broadcast_webhooks()
+    print("✅ Retried and re-sent news is answered as a duplicate")
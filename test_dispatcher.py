@@ -0,0 +1,112 @@
+"""Broadcast dispatcher: one long-lived loop, a bounded queue, and 429s that leave nothing behind.
+
+    python test_dispatcher.py
+"""
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_dispatcher.db')
+os.environ['DATABASE_URL'] = ''
+
+from flask import Flask
+import database
+import webhook
+from config import DISPATCH_RETRY_AFTER
+from dispatcher import Dispatcher
+from producers import Producer, ProducerRegistry
+
+SECRET = "test-dispatcher-secret"
+
+
+def _wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return
+        time.sleep(0.01)
+    raise AssertionError("timed out waiting for the dispatcher")
+
+
+def _stop(dispatcher):
+    asyncio.run_coroutine_threadsafe(dispatcher.stop(), dispatcher.loop).result(5)
+    dispatcher.loop.call_soon_threadsafe(dispatcher.loop.stop)
+
+
+def test_jobs_share_one_loop_and_survive_failures():
+    dispatcher = Dispatcher(max_queue=10, concurrency=2)
+    loops = []
+
+    async def job():
+        loops.append(asyncio.get_running_loop())
+
+    async def failing():
+        raise RuntimeError("broadcast failed")
+
+    assert dispatcher.submit(failing, name="failing")
+    for n in range(5):
+        assert dispatcher.submit(job, name=f"job-{n}")
+    _wait_until(lambda: dispatcher.stats()["completed"] == 6)
+
+    assert len(loops) == 5 and all(loop is dispatcher.loop for loop in loops)
+    assert dispatcher.stats()["queued"] == dispatcher.stats()["running"] == 0
+    _stop(dispatcher)
+
+
+def test_queue_is_bounded():
+    dispatcher = Dispatcher(max_queue=2, concurrency=1)
+    started, unblock = threading.Event(), threading.Event()
+
+    async def blocking():
+        started.set()
+        await asyncio.to_thread(unblock.wait)
+
+    assert dispatcher.submit(blocking)
+    started.wait(5)
+    assert dispatcher.submit(blocking)
+    # Full: further jobs and reservations are refused
+    assert not dispatcher.submit(blocking)
+    assert not dispatcher.reserve()
+    stats = dispatcher.stats()
+    assert (stats["queued"], stats["running"]) == (1, 1)
+
+    unblock.set()
+    _wait_until(lambda: dispatcher.stats()["completed"] == 2)
+    assert dispatcher.reserve()
+    dispatcher.release()
+    assert dispatcher.stats()["queued"] == 0
+    _stop(dispatcher)
+
+
+def test_full_queue_answers_429_before_logging_anything():
+    database.init_db()
+    app = Flask(__name__)
+    app.register_blueprint(webhook.webhook_bp)
+    producer = Producer("test-dispatcher", SECRET, rate=1000, burst=1000)
+    saved = webhook.dispatcher, webhook.producers
+    webhook.dispatcher, webhook.producers = Dispatcher(max_queue=0), ProducerRegistry([producer])
+    try:
+        response = app.test_client().post('/news-webhook', json={
+            "secret": SECRET, "news": {"id": "dispatcher-full", "title": "Title", "content": "Text"},
+        })
+        rejected = webhook.dispatcher.stats()["rejected"]
+    finally:
+        webhook.dispatcher, webhook.producers = saved
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == str(DISPATCH_RETRY_AFTER)
+    assert rejected == 1
+    # The producer was not charged and no outbox was planned, so its retry is not a duplicate
+    assert producer.used_today == 0
+    assert database.get_broadcast("dispatcher-full") is None
+    assert webhook.check_duplicate({"news": {"id": "dispatcher-full", "title": "Title", "content": "Text"}}) is None
+
+
+if __name__ == "__main__":
+    test_jobs_share_one_loop_and_survive_failures()
+    test_queue_is_bounded()
+    test_full_queue_answers_429_before_logging_anything()
+    print("✅ Dispatcher runs jobs on one loop and turns away work it cannot queue")
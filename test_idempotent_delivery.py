@@ -0,0 +1,86 @@
+"""Idempotent delivery: a story reaches each chat once, however often it is planned or drained.
+
+Runs against a throwaway SQLite database and an in-memory stand-in for the
+Bot API:
+
+    python test_idempotent_delivery.py
+"""
+import asyncio
+import itertools
+import json
+import os
+import tempfile
+from collections import Counter
+from types import SimpleNamespace
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_idempotent_delivery.db')
+os.environ['DATABASE_URL'] = ''
+
+import bot
+import database
+from models import News
+
+FIRST_CHAT = 36_000  # clear of chats other test modules add to the shared database
+CHATS = 10
+
+
+class CountingBot:
+    """Counts the messages each chat receives."""
+
+    def __init__(self):
+        self.received = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.received[chat_id] += 1
+        return SimpleNamespace(message_id=next(self._message_ids))
+
+
+def test_messages_are_unique_per_story_and_chat():
+    database.init_db()
+    news_id = "idempotent-unique"
+    assert database.log_message(news_id, FIRST_CHAT, 1)
+    assert database.log_message(news_id, FIRST_CHAT, 2)
+    assert database.log_messages([(news_id, FIRST_CHAT, 3), (news_id, FIRST_CHAT + 1, 4)])
+    assert database.get_sent_messages(news_id, FIRST_CHAT) == [(FIRST_CHAT, 1, None)]
+
+    # Lookups for many chats are batched, and only report chats that got the story
+    candidates = list(range(FIRST_CHAT - 1000, FIRST_CHAT + 1000))
+    assert database.get_delivered_chat_ids(news_id, candidates) == {FIRST_CHAT, FIRST_CHAT + 1}
+    assert database.get_delivered_chat_ids(news_id) == {FIRST_CHAT, FIRST_CHAT + 1}
+
+
+def test_rebroadcast_only_reaches_missed_chats():
+    database.init_db()
+    chats = list(range(FIRST_CHAT, FIRST_CHAT + CHATS))
+    for chat_id in chats:
+        database.add_chat(chat_id, f"Chat {chat_id}", 'private')
+    news = News("idempotent-rebroadcast", "Title", "Text")
+    # Four chats got the story before the outbox was (re)planned, e.g. by an older run
+    database.log_messages([(news.news_id, chat_id, 100 + chat_id) for chat_id in chats[:4]])
+    assert database.create_broadcasts([(news.news_id, json.dumps(news.to_dict()), chats)]) == CHATS
+
+    fake = CountingBot()
+    saved, bot.bot = bot.bot, fake
+    try:
+        assert asyncio.run(bot.drain_outbox(news)) == (CHATS - 4, 0)
+        # Planning and draining again finds nothing left to send
+        assert database.create_broadcasts([(news.news_id, json.dumps(news.to_dict()), chats)]) == 0
+        assert asyncio.run(bot.drain_outbox(news)) == (0, 0)
+    finally:
+        bot.bot = saved
+        # Other test modules plan broadcasts to every chat in the shared database
+        for chat_id in chats:
+            database.remove_chat(chat_id)
+
+    assert set(fake.received) == set(chats[4:])
+    assert max(fake.received.values()) == 1
+    assert database.get_delivered_chat_ids(news.news_id, chats) == set(chats)
+    assert database.get_broadcast(news.news_id)[1] == 'done'
+
+
+if __name__ == "__main__":
+    test_messages_are_unique_per_story_and_chat()
+    test_rebroadcast_only_reaches_missed_chats()
+    print("✅ Each chat receives a story at most once")
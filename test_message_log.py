@@ -0,0 +1,55 @@
+"""Write-behind message log buffer flushed from several threads at once.
+
+Runs against a throwaway SQLite database:
+
+    python test_message_log.py
+"""
+import asyncio
+import os
+import tempfile
+import threading
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_message_log.db')
+os.environ['DATABASE_URL'] = ''
+
+import database
+from async_db import db
+
+ROWS = 3000
+
+
+def test_concurrent_flushes_do_not_deadlock():
+    database.init_db()
+    # Tiny thresholds keep the background thread flushing while the others do too
+    buffer = database.MessageLogBuffer(max_rows=5, interval=0.001)
+    news_id = "concurrent-flushes"
+
+    def log_and_flush(start):
+        for chat_id in range(start, start + ROWS // 3):
+            buffer.log_message(news_id, chat_id, chat_id)
+            if chat_id % 50 == 0:
+                buffer.flush()
+
+    async def flush_from_loop():
+        # The way the broadcast code flushes: a function queued on the writer thread
+        for _ in range(200):
+            await db.run(buffer.flush)
+            await asyncio.sleep(0)
+
+    threads = [threading.Thread(target=log_and_flush, args=(n * ROWS // 3 + 1,)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+    asyncio.run(asyncio.wait_for(flush_from_loop(), timeout=30))
+    for thread in threads:
+        thread.join(timeout=30)
+        assert not thread.is_alive(), "flush deadlocked"
+    buffer.close()
+
+    assert len(buffer) == 0
+    assert len(database.get_sent_messages(news_id)) == ROWS
+
+
+if __name__ == "__main__":
+    test_concurrent_flushes_do_not_deadlock()
+    print("✅ Concurrent message log flushes finish and write every row")
@@ -0,0 +1,118 @@
+"""OutboundScheduler retries: flood control, network errors and timeouts that may have been delivered.
+
+    python test_outbound.py
+"""
+import asyncio
+
+import httpx
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+
+from outbound import Deferred, OutboundScheduler
+from ratelimit import TelegramRateLimiter
+
+
+def _scheduler(**kwargs):
+    scheduler = OutboundScheduler(limiter=TelegramRateLimiter(10000, 10000, 10000), **kwargs)
+    scheduler.NETWORK_RETRY_DELAY = 0.001
+    return scheduler
+
+
+def _failing(*errors, result="sent"):
+    """A call factory raising `errors` one per attempt, then returning `result`; counts attempts."""
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) <= len(errors):
+            raise errors[len(attempts) - 1]
+        return result
+    return call, attempts
+
+
+def _timeout(cause):
+    try:
+        raise TimedOut() from cause
+    except TimedOut as e:
+        return e
+
+
+def test_timed_out_send_is_not_retried():
+    scheduler = _scheduler()
+    call, attempts = _failing(_timeout(httpx.ReadTimeout("read timed out")))
+    try:
+        asyncio.run(scheduler.send(1, call))
+        raise AssertionError("TimedOut was swallowed")
+    except TimedOut:
+        pass
+    assert len(attempts) == 1
+    assert scheduler.stats()["retries"] == 0
+
+
+def test_timeouts_before_sending_are_retried():
+    scheduler = _scheduler()
+    call, attempts = _failing(_timeout(httpx.ConnectTimeout("connect timed out")),
+                              _timeout(httpx.PoolTimeout("pool timed out")))
+    assert asyncio.run(scheduler.send(1, call)) == "sent"
+    assert len(attempts) == 3
+    assert scheduler.stats()["retries"] == 2
+
+
+def test_idempotent_calls_retry_timeouts():
+    scheduler = _scheduler()
+    call, attempts = _failing(_timeout(httpx.ReadTimeout("read timed out")), result=True)
+    assert asyncio.run(scheduler.send(1, call, idempotent=True)) is True
+    assert len(attempts) == 2
+
+
+def test_network_errors_retry_a_bounded_number_of_times():
+    scheduler = _scheduler()
+    call, attempts = _failing(*[NetworkError("connection reset")] * 10)
+    try:
+        asyncio.run(scheduler.send(1, call))
+        raise AssertionError("NetworkError was swallowed")
+    except NetworkError:
+        pass
+    assert len(attempts) == OutboundScheduler.MAX_NETWORK_RETRIES + 1
+
+    call, attempts = _failing(BadRequest("Chat not found"))
+    try:
+        asyncio.run(scheduler.send(1, call))
+        raise AssertionError("BadRequest was swallowed")
+    except BadRequest:
+        pass
+    assert len(attempts) == 1
+
+
+def test_flood_control_parks_the_chat_and_shrinks_the_window():
+    scheduler = _scheduler(max_concurrency=8)
+    call, attempts = _failing(RetryAfter(1))
+
+    async def send_while_parked():
+        send = asyncio.create_task(scheduler.send(1, call))
+        await asyncio.sleep(0.2)
+        # Parked: the retry has not gone out yet, and deferred senders are told so at once
+        assert len(attempts) == 1
+        other, _ = _failing()
+        try:
+            await scheduler.send(1, other, defer=True)
+            raise AssertionError("parked chat was not deferred")
+        except Deferred:
+            pass
+        # Other chats are unaffected by one chat's flood wait
+        assert await scheduler.send(2, _failing()[0]) == "sent"
+        return await send
+
+    assert asyncio.run(send_while_parked()) == "sent"
+    assert len(attempts) == 2
+    stats = scheduler.stats()
+    assert stats["flood_waits"] == 1
+    assert stats["concurrency_limit"] == 4
+
+
+if __name__ == "__main__":
+    test_timed_out_send_is_not_retried()
+    test_timeouts_before_sending_are_retried()
+    test_idempotent_calls_retry_timeouts()
+    test_network_errors_retry_a_bounded_number_of_times()
+    test_flood_control_parks_the_chat_and_shrinks_the_window()
+    print("✅ Outbound retries never resend a call that may have been delivered")
@@ -0,0 +1,82 @@
+"""OutboundScheduler lanes: weighted round-robin between lanes and starvation protection.
+
+    python test_outbound_lanes.py
+"""
+import asyncio
+
+from outbound import LANE_BREAKING, LANE_BULK, LANE_INTERACTIVE, LANE_PRICE, OutboundScheduler
+from ratelimit import TelegramRateLimiter
+
+WEIGHTS = {LANE_INTERACTIVE: 8, LANE_BREAKING: 3, LANE_BULK: 2, LANE_PRICE: 1}
+
+
+def _scheduler(**kwargs):
+    # One slot at a time, so the lanes decide the order calls go out in
+    return OutboundScheduler(limiter=TelegramRateLimiter(10000, 10000, 10000), max_concurrency=1,
+                             weights=WEIGHTS, **kwargs)
+
+
+async def _run_queued(scheduler, queued, pause=0.0):
+    """Hold the only slot, queue `(lane, chat_id)` sends behind it and return the order they ran in.
+
+    With `pause`, the first queued send waits that long before the rest join it.
+    """
+    release, order = asyncio.Event(), []
+
+    async def hold():
+        await release.wait()
+
+    def call(lane):
+        async def record():
+            order.append(lane)
+        return record
+
+    holder = asyncio.create_task(scheduler.send(0, hold))
+    await asyncio.sleep(0)
+    tasks = []
+    for lane, chat_id in queued:
+        tasks.append(asyncio.create_task(scheduler.send(chat_id, call(lane), lane=lane)))
+        await asyncio.sleep(0)
+        if pause and len(tasks) == 1:
+            await asyncio.sleep(pause)
+    assert sum(scheduler.stats()["waiting"].values()) == len(queued)
+
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    return order
+
+
+def test_breaking_news_overtakes_a_queued_price_blast():
+    scheduler = _scheduler()
+    queued = [(LANE_PRICE, chat_id) for chat_id in range(1, 21)]
+    queued += [(LANE_BREAKING, chat_id) for chat_id in range(21, 27)]
+    order = asyncio.run(_run_queued(scheduler, queued))
+
+    # Breaking news queued behind 20 price posts still gets 3 of every 4 slots
+    assert order[:8].count(LANE_BREAKING) == 6
+    assert order.index(LANE_BREAKING) == 0
+    assert order.count(LANE_PRICE) == 20
+
+
+def test_lanes_share_slots_by_weight():
+    scheduler = _scheduler()
+    queued = [(lane, 100 + n) for n in range(16) for lane in (LANE_BULK, LANE_INTERACTIVE)]
+    order = asyncio.run(_run_queued(scheduler, queued))
+    # 8:2 while both lanes have work
+    assert order[:10].count(LANE_INTERACTIVE) == 8
+    assert order[:10].count(LANE_BULK) == 2
+
+
+def test_a_lane_waiting_too_long_is_served_next():
+    scheduler = _scheduler(max_lane_wait=0.2)
+    # One price post waits past max_lane_wait before the interactive replies arrive
+    queued = [(LANE_PRICE, 200)] + [(LANE_INTERACTIVE, 201 + n) for n in range(10)]
+    order = asyncio.run(_run_queued(scheduler, queued, pause=0.3))
+    assert order[0] == LANE_PRICE
+
+
+if __name__ == "__main__":
+    test_breaking_news_overtakes_a_queued_price_blast()
+    test_lanes_share_slots_by_weight()
+    test_a_lane_waiting_too_long_is_served_next()
+    print("✅ Outbound lanes share slots by weight and never starve")
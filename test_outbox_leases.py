@@ -0,0 +1,54 @@
+"""Outbox claims are leased, so a restarting worker leaves other live workers' claims alone.
+
+Runs against a throwaway SQLite database:
+
+    python test_outbox_leases.py
+"""
+import os
+import tempfile
+import time
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_outbox_leases.db')
+os.environ['DATABASE_URL'] = ''
+
+import database
+
+FIRST_CHAT = 38_000  # clear of chats other test modules add to the shared database
+
+
+def _states(news_id):
+    rows = database.get_db_connection().execute(
+        "SELECT state, COUNT(*) FROM outbox WHERE news_id = ? GROUP BY state", (news_id,)
+    ).fetchall()
+    return {state: count for state, count in rows}
+
+
+def test_release_leaves_live_leases_of_other_workers():
+    database.init_db()
+    news_id = "leases"
+    database.create_broadcasts([(news_id, '{}', list(range(FIRST_CHAT, FIRST_CHAT + 40)))])
+    ids = [outbox_id for outbox_id, _, _ in database.claim_outbox_batch(news_id, 30)]
+
+    conn = database.get_db_connection()
+    owners = {row[0] for row in conn.execute(
+        "SELECT claimed_by FROM outbox WHERE news_id = ? AND state = 'sending'", (news_id,)
+    )}
+    assert owners == {database.WORKER_ID}
+
+    # Ten rows belong to a worker that is still running, ten to one whose lease ran out
+    conn.executemany("UPDATE outbox SET claimed_by = 'other-worker', lease_until = ? WHERE id = ?",
+                     [(time.time() + 600, outbox_id) for outbox_id in ids[:10]])
+    conn.executemany("UPDATE outbox SET claimed_by = 'crashed-worker', lease_until = ? WHERE id = ?",
+                     [(time.time() - 1, outbox_id) for outbox_id in ids[10:20]])
+    conn.commit()
+
+    assert database.release_outbox_inflight() >= 20
+    assert _states(news_id) == {'sending': 10, 'pending': 30}
+    # Leave nothing pending for other modules that resume broadcasts from the shared database
+    database.retract_broadcast(news_id, "test finished")
+
+
+if __name__ == "__main__":
+    test_release_leaves_live_leases_of_other_workers()
+    print("✅ Restarts release only their own and expired outbox claims")
@@ -0,0 +1,95 @@
+"""Price history: ticks roll up into 1m/1h/1d candles incrementally, idempotently, and are pruned.
+
+Runs against a throwaway SQLite database:
+
+    python test_price_rollup.py
+"""
+import os
+import tempfile
+import time
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_price_rollup.db')
+os.environ['DATABASE_URL'] = ''
+
+import database
+from price_history import DAY, HOUR, MINUTE, PriceRollup, bucket_start, price_change
+
+COIN = "test-rollup-coin"  # other test modules may write prices of their own to the shared database
+NOW = bucket_start(time.time(), HOUR) + 5
+START = NOW - 5 - 3 * HOUR  # three whole hours of ticks
+
+
+def _candles(resolution, coin=COIN):
+    return database.get_price_candles(coin, resolution, 0, NOW + DAY)
+
+
+def test_ticks_roll_up_into_candles():
+    database.init_db()
+    # One tick a minute rising from 100, plus a spike in minute 30
+    ticks = [(COIN, 100.0 + i, START + i * MINUTE + 10) for i in range(180)]
+    ticks.append((COIN, 500.0, START + 30 * MINUTE + 20))
+    database.log_price_ticks(sorted(ticks, key=lambda tick: tick[2]))
+
+    rollup = PriceRollup(tick_retention=6 * HOUR, minute_retention=DAY)
+    written = rollup.run(now=NOW)
+    assert set(written) == {MINUTE, HOUR, DAY}
+
+    minutes = _candles(MINUTE)
+    assert len(minutes) == 180
+    assert minutes[30] == (START + 30 * MINUTE, 130.0, 500.0, 130.0, 500.0, 2)
+
+    hours = _candles(HOUR)
+    assert [bucket for bucket, *_ in hours] == [START, START + HOUR, START + 2 * HOUR]
+    assert hours[0] == (START, 100.0, 500.0, 100.0, 159.0, 61)
+    assert hours[2] == (START + 2 * HOUR, 220.0, 279.0, 220.0, 279.0, 60)
+
+    days = _candles(DAY)
+    assert sum(candle[5] for candle in days) == 181
+    assert days[0][1] == 100.0 and days[-1][4] == 279.0
+    assert max(candle[2] for candle in days) == 500.0
+
+    assert price_change(hours) == {"since": START, "open": 100.0, "close": 279.0, "change": 179.0}
+
+
+def test_late_ticks_are_folded_in_and_reruns_change_nothing():
+    rollup = PriceRollup(tick_retention=6 * HOUR, minute_retention=DAY)
+    rollup.run(now=NOW)
+    # A tick for the last minute is written after that minute was rolled up
+    database.log_price_ticks([(COIN, 50.0, START + 179 * MINUTE + 40)])
+    rollup.run(now=NOW + 30)
+
+    assert _candles(MINUTE)[-1] == (START + 179 * MINUTE, 279.0, 279.0, 50.0, 50.0, 2)
+    assert _candles(HOUR)[-1] == (START + 2 * HOUR, 220.0, 279.0, 50.0, 50.0, 61)
+    assert min(candle[3] for candle in _candles(DAY)) == 50.0
+
+    before = [_candles(resolution) for resolution in (MINUTE, HOUR, DAY)]
+    rollup.run(now=NOW + 60)
+    PriceRollup(tick_retention=6 * HOUR, minute_retention=DAY).run(now=NOW + 60)
+    assert [_candles(resolution) for resolution in (MINUTE, HOUR, DAY)] == before
+
+
+def test_old_ticks_and_minutes_are_pruned_but_hours_kept():
+    coin = "test-rollup-prune"
+    database.log_price_ticks([(coin, 10.0 + i, START + i * MINUTE) for i in range(180)])
+    PriceRollup(tick_retention=6 * HOUR, minute_retention=DAY).run(now=NOW)
+    # Restarted with shorter retention: the next run prunes what has been rolled up
+    rollup = PriceRollup(tick_retention=HOUR, minute_retention=HOUR)
+    rollup.run(now=NOW)
+
+    assert all(ts >= NOW - HOUR for found, _, ts in database.get_price_ticks_since(0) if found == coin)
+    assert all(bucket >= NOW - HOUR - MINUTE for bucket, *_ in _candles(MINUTE, coin))
+    # The first hour is beyond both retentions now, but its hourly candle stays
+    assert _candles(HOUR, coin)[0] == (START, 10.0, 69.0, 10.0, 69.0, 60)
+
+    # Charts over a pruned range fall back to hours; recent or long ranges use the coarsest fitting resolution
+    assert rollup.resolution_for(START, NOW, now=NOW, min_points=10) == HOUR
+    assert rollup.resolution_for(NOW - 30 * MINUTE, NOW, now=NOW, min_points=10) == MINUTE
+    assert rollup.resolution_for(NOW - 30 * DAY, NOW, now=NOW, min_points=10) == DAY
+
+
+if __name__ == "__main__":
+    test_ticks_roll_up_into_candles()
+    test_late_ticks_are_folded_in_and_reruns_change_nothing()
+    test_old_ticks_and_minutes_are_pruned_but_hours_kept()
+    print("✅ Price ticks roll up into candles and old detail is pruned")
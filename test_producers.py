@@ -0,0 +1,108 @@
+"""Per-producer ingest limits: secrets, request rate, daily quota and the 403/429 answers.
+
+Drives the Flask blueprint with its test client against a throwaway SQLite
+database; the drain itself is replaced by a recorder, so nothing is sent:
+
+    python test_producers.py
+"""
+import os
+import tempfile
+from datetime import timedelta
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_producers.db')
+os.environ['DATABASE_URL'] = ''
+
+import pytest
+from flask import Flask
+import database
+import webhook
+from producers import (ADMIT_OK, ADMIT_QUOTA_EXCEEDED, ADMIT_RATE_LIMITED, ADMIT_UNKNOWN, DEFAULT_PRODUCER,
+                       Producer, ProducerRegistry, parse_producers)
+
+CHAT_ID = 33_000  # clear of chats other test modules add to the shared database
+
+
+def test_parse_producers():
+    parsed = {producer.name: producer for producer in parse_producers("wire:s1:2:4:10, desk:s2", "legacy")}
+    assert set(parsed) == {"wire", "desk", DEFAULT_PRODUCER}
+    assert (parsed["wire"].rate, parsed["wire"].burst, parsed["wire"].daily_quota) == (2.0, 4.0, 10)
+    assert [producer.name for producer in parse_producers(f"{DEFAULT_PRODUCER}:s1", "legacy")] == [DEFAULT_PRODUCER]
+    with pytest.raises(ValueError):
+        parse_producers("no-secret")
+    with pytest.raises(ValueError):
+        ProducerRegistry(parse_producers("wire:s1,wire:s2", None))
+
+
+def test_requests_are_rate_limited_per_producer():
+    registry = ProducerRegistry([Producer("wire", "s1", rate=1, burst=2), Producer("desk", "s2", rate=1, burst=2)])
+    assert registry.admit("wrong") == (None, ADMIT_UNKNOWN, 0)
+    assert registry.admit(None)[1] == ADMIT_UNKNOWN
+
+    outcomes = [registry.admit("s1")[1:] for _ in range(3)]
+    assert outcomes[:2] == [(ADMIT_OK, 0), (ADMIT_OK, 0)]
+    assert outcomes[2][0] == ADMIT_RATE_LIMITED and 0 < outcomes[2][1] <= 1
+    # One producer's burst does not touch another's
+    assert registry.admit("s2")[1] == ADMIT_OK
+
+
+def test_daily_quota_is_reserved_refunded_and_reset():
+    producer = Producer("wire", "s1", daily_quota=3)
+    registry = ProducerRegistry([producer])
+    assert registry.reserve(producer, 2) == (ADMIT_OK, 0)
+    outcome, retry_after = registry.reserve(producer, 2)
+    assert outcome == ADMIT_QUOTA_EXCEEDED and 0 < retry_after <= 86400
+    registry.refund(producer)
+    assert registry.reserve(producer, 2) == (ADMIT_OK, 0)
+    assert producer.used_today == 3
+
+    # A new UTC day starts from zero
+    producer.day -= timedelta(days=1)
+    assert registry.reserve(producer, 3) == (ADMIT_OK, 0)
+    assert producer.used_today == 3
+
+
+def test_endpoints_answer_403_and_429():
+    database.init_db()
+    database.add_chat(CHAT_ID, "Producers chat", 'private')
+    producer = Producer("test-producers", "producer-secret", rate=0.01, burst=1, daily_quota=10)
+    drained = []
+
+    async def drain(news, *args, **kwargs):
+        drained.append(news.news_id)
+        return 0, 0
+
+    app = Flask(__name__)
+    app.register_blueprint(webhook.webhook_bp)
+    client = app.test_client()
+    news = {"id": "producers-1", "title": "Producers", "content": "Rate limited"}
+    saved = webhook.producers, webhook.drain_outbox
+    webhook.producers, webhook.drain_outbox = ProducerRegistry([producer]), drain
+    try:
+        unknown = client.post('/news-webhook', json={"news": news}, headers={'X-Webhook-Secret': "wrong"})
+        accepted = client.post('/news-webhook', json={"news": news}, headers={'X-Webhook-Secret': "producer-secret"})
+        limited = client.post('/news-webhook', json={"secret": "producer-secret", "news": news | {"id": "producers-2"}})
+        stats = client.get('/producers').get_json()
+    finally:
+        webhook.producers, webhook.drain_outbox = saved
+    database.retract_broadcast("producers-1", "test finished")
+    # Other test modules plan broadcasts to every chat in the shared database
+    database.remove_chat(CHAT_ID)
+
+    assert unknown.status_code == 403
+    assert accepted.status_code == 200 and accepted.get_json()["producer"] == "test-producers"
+    assert limited.status_code == 429 and int(limited.headers['Retry-After']) >= 1
+    assert limited.get_json()["producer"] == "test-producers"
+    assert database.get_broadcast("producers-2") is None
+
+    assert "producer-secret" not in str(stats)
+    usage = stats["producers"][0]
+    assert (usage["requests"], usage["accepted"], usage["rate_limited"], usage["used_today"]) == (2, 1, 1, 1)
+
+
+if __name__ == "__main__":
+    test_parse_producers()
+    test_requests_are_rate_limited_per_producer()
+    test_daily_quota_is_reserved_refunded_and_reset()
+    test_endpoints_answer_403_and_429()
+    print("✅ Producers are held to their own rate limits and quotas")
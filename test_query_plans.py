@@ -0,0 +1,31 @@
+"""The hot-path queries database.py runs search their indexes on a freshly migrated database.
+
+    python test_query_plans.py
+"""
+import os
+import sqlite3
+import tempfile
+
+import migrations
+import queries
+
+
+def test_hot_path_queries_use_their_indexes():
+    conn = sqlite3.connect(os.path.join(tempfile.mkdtemp(), 'test_query_plans.db'))
+    try:
+        assert migrations.migrate(conn) == migrations.LATEST_VERSION
+        assert migrations.check_query_plans(conn) == []
+    finally:
+        conn.close()
+
+
+def test_every_shared_query_is_checked():
+    shared = {value for name, value in vars(queries).items() if name.isupper()}
+    checked = {sql for _, sql, _, _ in migrations.QUERY_PLAN_CHECKS}
+    assert shared <= checked
+
+
+if __name__ == "__main__":
+    test_hot_path_queries_use_their_indexes()
+    test_every_shared_query_is_checked()
+    print("✅ Every hot-path query uses its index")
@@ -0,0 +1,89 @@
+"""Token-bucket limiter: global, per-chat and per-group caps, and FIFO global slots.
+
+    python test_ratelimit.py
+"""
+import asyncio
+import time
+
+from ratelimit import TelegramRateLimiter, TokenBucket, is_group_chat
+
+
+def test_bucket_bursts_to_capacity_then_refills_at_rate():
+    bucket = TokenBucket(rate=10, capacity=5)
+    now = bucket.updated
+    for _ in range(5):
+        assert bucket.wait_time(now) == 0
+        bucket.consume(now)
+    assert abs(bucket.wait_time(now) - 0.1) < 1e-9
+    assert bucket.wait_time(now + 0.1) == 0
+    # Refills never go past capacity
+    assert bucket.is_full(now + 60) and bucket.tokens == 5
+
+
+def test_reservations_are_served_in_order():
+    bucket = TokenBucket(rate=10, capacity=2)
+    now = bucket.updated
+    waits = [bucket.reserve(now) for _ in range(5)]
+    assert waits[:2] == [0.0, 0.0]
+    assert [round(wait, 6) for wait in waits[2:]] == [0.1, 0.2, 0.3]
+
+
+def test_chat_caps_apply_per_chat():
+    limiter = TelegramRateLimiter(global_rate=1000, per_chat_rate=1, group_per_minute=20)
+    assert limiter.reserve_chat(1) == 0
+    # A second message into the same private chat waits about a second, other chats are free
+    assert 0.9 < limiter.reserve_chat(1) <= 1.0
+    assert limiter.reserve_chat(2) == 0
+
+    # Groups are held to the stricter per-minute cap
+    assert limiter.reserve_chat(-100, is_group=True) == 0
+    assert 2.9 < limiter.reserve_chat(-100, is_group=True) <= 3.0
+
+
+def test_group_detection():
+    assert is_group_chat(-100123)
+    assert not is_group_chat(42)
+    assert is_group_chat(42, "supergroup")
+    assert not is_group_chat(-100123, "private")
+    assert not is_group_chat("not-a-chat")
+
+
+def test_acquire_holds_concurrent_senders_to_the_global_rate():
+    rate, chats = 50, 100
+    limiter = TelegramRateLimiter(global_rate=rate, per_chat_rate=1, group_per_minute=20)
+    finished = []
+
+    async def send(chat_id):
+        await limiter.acquire(chat_id)
+        finished.append((time.monotonic(), chat_id))
+
+    async def fan_out():
+        started = time.monotonic()
+        await asyncio.gather(*(send(chat_id) for chat_id in range(chats)))
+        return started
+
+    started = asyncio.run(fan_out())
+    elapsed = finished[-1][0] - started
+    # The first `rate` sends burst, the rest are paced at `rate` per second
+    assert (chats - rate) / rate * 0.9 <= elapsed < (chats - rate) / rate + 0.5
+    # Slots go out in arrival order
+    assert [chat_id for _, chat_id in finished] == list(range(chats))
+
+
+def test_global_rate_can_be_lowered_and_restored():
+    limiter = TelegramRateLimiter(global_rate=10, per_chat_rate=1, group_per_minute=20)
+    limiter.set_global_rate(2)
+    waits = [limiter.reserve_global() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0] and waits[3] > waits[2] > 0.4
+    limiter.set_global_rate(10)
+    assert limiter.reserve_global() == 0
+
+
+if __name__ == "__main__":
+    test_bucket_bursts_to_capacity_then_refills_at_rate()
+    test_reservations_are_served_in_order()
+    test_chat_caps_apply_per_chat()
+    test_group_detection()
+    test_acquire_holds_concurrent_senders_to_the_global_rate()
+    test_global_rate_can_be_lowered_and_restored()
+    print("✅ Rate limiter holds sends to Telegram's global, chat and group limits")
@@ -0,0 +1,73 @@
+"""Shared render cache: one render and one content hash per story, however many chats it goes to.
+
+    python test_render_cache.py
+"""
+import hashlib
+import timeit
+
+from models import News, RENDER_CACHE_SIZE, render_cache
+
+SENDS = 1000
+
+
+def _story(news_id="render-cache"):
+    return News(news_id, "Central bank holds rates", "Markets were flat. " * 100,
+                source="Wire", url="https://example.com/story", tags=["markets", "rates"])
+
+
+def test_one_render_per_story():
+    render_cache.clear()
+    rendered = []
+    news = _story()
+    original = news.format_telegram_message
+    news.format_telegram_message = lambda: rendered.append(1) or original()
+
+    # The broadcast fan-out and a targeted send of the same story share one entry
+    texts = {news.render() for _ in range(SENDS)}
+    texts.add(News.from_json(news.to_dict()).render())
+
+    assert len(texts) == 1
+    assert len(rendered) == 1
+    assert render_cache.stats() == {"hits": SENDS, "misses": 1, "size": 1, "maxsize": RENDER_CACHE_SIZE}
+
+
+def test_content_hash_is_computed_once():
+    calls = []
+    md5 = hashlib.md5
+
+    def counting_md5(*args):
+        calls.append(1)
+        return md5(*args)
+
+    news = _story("content-hash-once")
+    hashlib.md5 = counting_md5
+    try:
+        for _ in range(SENDS):
+            news.render()
+    finally:
+        hashlib.md5 = md5
+    assert len(calls) == 1
+
+
+def test_changed_story_renders_again():
+    render_cache.clear()
+    before = _story("changed-story")
+    after = News(before.news_id, "Central bank cuts rates", before.content, before.source, before.url)
+    assert before.render() != after.render()
+    assert render_cache.stats()["misses"] == 2
+
+
+def measure():
+    """Per-send cost of rendering every time vs. going through the cache."""
+    news = _story("measure")
+    uncached = timeit.timeit(news.format_telegram_message, number=SENDS * 10) / (SENDS * 10)
+    cached = timeit.timeit(news.render, number=SENDS * 10) / (SENDS * 10)
+    return uncached, cached
+
+
+if __name__ == "__main__":
+    test_one_render_per_story()
+    test_content_hash_is_computed_once()
+    test_changed_story_renders_again()
+    uncached, cached = measure()
+    print(f"✅ One render per story: {uncached * 1e6:.1f} µs per send uncached, {cached * 1e6:.2f} µs cached")
@@ -0,0 +1,69 @@
+"""Webhook log archives built from several appended batches read back whole.
+
+Runs against a throwaway SQLite database and archive directory:
+
+    python test_retention_archive.py
+"""
+import gzip
+import json
+import os
+import tempfile
+
+# Must be set before config.py is imported
+TMP = tempfile.mkdtemp()
+os.environ['DATABASE_FILE'] = os.path.join(TMP, 'test_retention_archive.db')
+os.environ['DATABASE_URL'] = ''
+
+import database
+from retention import archive_webhook_logs, _archive_path
+
+ARCHIVE_DIR = os.path.join(TMP, 'archive')
+
+
+def log_old_webhooks(first, count):
+    database.log_webhooks([(f"news-{i}", json.dumps({"id": f"news-{i}", "title": f"Story {i}"}))
+                           for i in range(first, first + count)])
+    news_ids = [f"news-{i}" for i in range(first, first + count)]
+    conn = database.get_db_connection()
+    # Only these rows: under pytest every test module shares the first module's database
+    conn.executemany("UPDATE webhook_logs SET received_date = datetime('now', '-40 days') WHERE news_id = ?",
+                     [(news_id,) for news_id in news_ids])
+    conn.commit()
+    database.release_connection(conn)
+
+
+def read_archive():
+    with gzip.open(_archive_path(ARCHIVE_DIR), 'rt', encoding='utf-8') as archive:
+        return [json.loads(line)["news_id"] for line in archive]
+
+
+def test_appended_batches_read_back():
+    database.init_db()
+    log_old_webhooks(0, 10)
+    # Two runs, several batches each, all appended to today's file
+    assert archive_webhook_logs(max_age_days=30, archive_dir=ARCHIVE_DIR, batch_size=3) == 10
+    log_old_webhooks(10, 5)
+    assert archive_webhook_logs(max_age_days=30, archive_dir=ARCHIVE_DIR, batch_size=3) == 5
+
+    assert read_archive() == [f"news-{i}" for i in range(15)]
+    assert database.get_webhook_logs_before(30, 100) == []
+
+
+def test_torn_batch_is_discarded():
+    path = _archive_path(ARCHIVE_DIR)
+    before = read_archive()
+
+    # A crash halfway through writing a batch leaves a member without its trailer
+    member = gzip.compress(b'{"news_id": "lost"}\n' * 50)
+    with open(path, 'ab') as raw:
+        raw.write(member[:len(member) // 2])
+
+    log_old_webhooks(15, 4)
+    assert archive_webhook_logs(max_age_days=30, archive_dir=ARCHIVE_DIR, batch_size=3) == 4
+    assert read_archive() == before + [f"news-{i}" for i in range(15, 19)]
+
+
+if __name__ == "__main__":
+    test_appended_batches_read_back()
+    test_torn_batch_is_discarded()
+    print("✅ Webhook log archives read back across appended and torn batches")
@@ -0,0 +1,60 @@
+"""Sharded broadcasts: shard processes and the main process together stay under the global rate.
+
+Runs the sharded drain with threads standing in for the worker processes,
+against a throwaway SQLite database:
+
+    python test_shard_rates.py
+"""
+import asyncio
+import os
+import queue
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_shard_rates.db')
+os.environ['DATABASE_URL'] = ''
+
+import bot
+import database
+from config import TELEGRAM_GLOBAL_RATE
+from models import News
+
+SHARDS = 4
+
+
+def test_rates_add_up_to_the_global_rate():
+    main_rate, shard_rate = bot.shard_rates(SHARDS)
+    assert main_rate > 0 and shard_rate > 0
+    assert abs(main_rate + SHARDS * shard_rate - TELEGRAM_GLOBAL_RATE) < 1e-9
+
+
+def test_main_process_gives_up_the_shards_share_while_they_run():
+    database.init_db()
+    seen = []
+
+    def run_shard(news_data, lane, index, count, rate, progress_queue):
+        # What this shard was given, and what the main process allows itself meanwhile
+        seen.append((rate, bot.rate_limiter._global.rate))
+        return 1, 0
+
+    saved = bot._run_shard, bot._get_shard_pool, bot.BROADCAST_SHARDS, bot._shard_progress_queue
+    bot._run_shard, bot.BROADCAST_SHARDS, bot._shard_progress_queue = run_shard, SHARDS, queue.Queue()
+    with ThreadPoolExecutor(SHARDS) as pool:
+        bot._get_shard_pool = lambda: pool
+        try:
+            result = asyncio.run(bot._drain_sharded(News("shard-rates", "Title", "Text"), bot.LANE_BULK))
+        finally:
+            bot._run_shard, bot._get_shard_pool, bot.BROADCAST_SHARDS, bot._shard_progress_queue = saved
+
+    main_rate, shard_rate = bot.shard_rates(SHARDS)
+    assert result == (SHARDS, 0)
+    assert seen == [(shard_rate, main_rate)] * SHARDS
+    # The full rate is back once no sharded broadcast runs
+    assert bot.rate_limiter._global.rate == TELEGRAM_GLOBAL_RATE
+
+
+if __name__ == "__main__":
+    test_rates_add_up_to_the_global_rate()
+    test_main_process_gives_up_the_shards_share_while_they_run()
+    print("✅ Shards and the main process share the global rate")
@@ -0,0 +1,90 @@
+"""ChatOrderedUpdateProcessor: in order within a chat, concurrent across chats.
+
+    python test_update_ordering.py
+"""
+import asyncio
+import itertools
+
+from telegram import Update
+
+from update_processor import ChatOrderedUpdateProcessor
+
+_update_ids = itertools.count(1)
+
+
+def _update(chat_id):
+    update_id = next(_update_ids)
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 0, "text": "/price",
+                    "chat": {"id": chat_id, "type": "private"}},
+    }, None)
+
+
+async def _run(processor, updates):
+    """Process `(chat_id, seconds)` updates as PTB hands them over; returns (chat_id, n, event) records."""
+    log = []
+    running = {}
+
+    async def handler(chat_id, n, seconds):
+        running[chat_id] = running.get(chat_id, 0) + 1
+        assert running[chat_id] == 1, f"two updates of chat {chat_id} ran at once"
+        log.append((chat_id, n, "start"))
+        await asyncio.sleep(seconds)
+        log.append((chat_id, n, "end"))
+        running[chat_id] -= 1
+
+    tasks = []
+    for n, (chat_id, seconds) in enumerate(updates):
+        tasks.append(asyncio.create_task(processor.process_update(_update(chat_id), handler(chat_id, n, seconds))))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+    return log
+
+
+def test_updates_of_one_chat_run_in_order():
+    processor = ChatOrderedUpdateProcessor(concurrency=4, max_pending=100)
+    # Later updates are quicker, so any overlap would finish them first
+    log = asyncio.run(_run(processor, [(1, 0.05 - n * 0.01) for n in range(5)]))
+    assert [(n, event) for _, n, event in log] == [(n, event) for n in range(5) for event in ("start", "end")]
+    assert processor.stats()["active_lanes"] == 0
+    assert processor.stats()["processed"] == 5
+
+
+def test_a_busy_chat_does_not_delay_other_chats():
+    processor = ChatOrderedUpdateProcessor(concurrency=2, max_pending=100)
+    # Chat 1 has a backlog of slow updates; chat 2's single reply arrives last
+    log = asyncio.run(_run(processor, [(1, 0.1)] * 4 + [(2, 0.01)]))
+    finished = [chat_id for chat_id, _, event in log if event == "end"]
+    assert finished.index(2) == 0
+
+
+def test_a_failing_update_does_not_block_its_chat():
+    processor = ChatOrderedUpdateProcessor(concurrency=2, max_pending=100)
+    handled = []
+
+    async def failing():
+        raise RuntimeError("handler failed")
+
+    async def handler():
+        handled.append(True)
+
+    async def run():
+        first = asyncio.create_task(processor.process_update(_update(3), failing()))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(processor.process_update(_update(3), handler()))
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert isinstance(results[0], RuntimeError)
+    assert handled == [True]
+    assert processor.stats() == {
+        "concurrency": 2, "running": 0, "pending": 0, "active_lanes": 0, "processed": 2,
+    }
+
+
+if __name__ == "__main__":
+    test_updates_of_one_chat_run_in_order()
+    test_a_busy_chat_does_not_delay_other_chats()
+    test_a_failing_update_does_not_block_its_chat()
+    print("✅ Updates run in order within a chat and concurrently across chats")
@@ -0,0 +1,133 @@
+"""POST /news-webhook/batch: per-item validation, one logged and planned batch, one dispatcher job.
+
+Drives the Flask blueprint with its test client against a throwaway SQLite
+database; the drain itself is replaced by a recorder, so nothing is sent:
+
+    python test_webhook_batch.py
+"""
+import os
+import tempfile
+import time
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_webhook_batch.db')
+os.environ['DATABASE_URL'] = ''
+
+from flask import Flask
+import database
+import webhook
+from producers import Producer, ProducerRegistry
+
+SECRET = "test-webhook-batch-secret"
+CHAT_ID = 30_000  # clear of chats other test modules add to the shared database
+
+
+def _item(news_id, title="Title"):
+    return {"id": news_id, "title": title, "content": f"Story {news_id}"}
+
+
+class BatchClient:
+    """Test client for the blueprint with its own producer and a drain that only records the stories it gets."""
+
+    def __init__(self, daily_quota=100):
+        self.producer = Producer("test-batch", SECRET, rate=1000, burst=1000, daily_quota=daily_quota)
+        self.drained = []
+        app = Flask(__name__)
+        app.register_blueprint(webhook.webhook_bp)
+        self.client = app.test_client()
+
+    async def _drain(self, news, *args, **kwargs):
+        self.drained.append(news.news_id)
+        return 0, 0
+
+    def __enter__(self):
+        self._saved = webhook.producers, webhook.drain_outbox
+        webhook.producers, webhook.drain_outbox = ProducerRegistry([self.producer]), self._drain
+        return self
+
+    def __exit__(self, *exc):
+        webhook.producers, webhook.drain_outbox = self._saved
+
+    def post(self, items, **kwargs):
+        return self.client.post('/news-webhook/batch', json={"news": items},
+                                headers={'X-Webhook-Secret': SECRET}, **kwargs)
+
+    def wait_for_drains(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while len(self.drained) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(self.drained) == count, f"{len(self.drained)} of {count} stories were drained"
+
+
+def _retract(*news_ids):
+    # Leave nothing pending for other modules that resume broadcasts from the shared database
+    for news_id in news_ids:
+        database.retract_broadcast(news_id, "test finished")
+
+
+def test_batch_accepts_valid_items_and_reports_the_rest():
+    database.init_db()
+    database.add_chat(CHAT_ID, "Batch chat", 'private')
+    items = [_item("batch-1"), {"id": "batch-2"}, _item("batch-1", "Same id"), _item("batch-3"), "not an item"]
+
+    with BatchClient() as batch:
+        response = batch.post(items)
+        batch.wait_for_drains(2)
+    # Other test modules plan broadcasts to every chat in the shared database
+    database.remove_chat(CHAT_ID)
+
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body["accepted"], body["rejected"]) == (2, 3)
+    assert [result["status"] for result in body["results"]] == [
+        "accepted", "invalid", "duplicate", "accepted", "invalid",
+    ]
+    # Both stories were logged, planned for the chat and drained in order by one job
+    assert batch.drained == ["batch-1", "batch-3"]
+    for news_id in batch.drained:
+        assert database.get_broadcast(news_id) is not None
+        assert database.count_pending_outbox(news_id) >= 1
+    assert batch.producer.used_today == 2
+    _retract("batch-1", "batch-3")
+
+
+def test_retried_batch_is_answered_as_duplicate():
+    items = [_item("batch-retry-1"), _item("batch-retry-2")]
+    with BatchClient() as batch:
+        assert batch.post(items).status_code == 200
+        batch.wait_for_drains(2)
+        retry = batch.post(items)
+
+    assert retry.status_code == 200
+    assert retry.get_json()["status"] == "duplicate"
+    assert batch.producer.used_today == 2
+    _retract("batch-retry-1", "batch-retry-2")
+
+
+def test_rejected_batches():
+    with BatchClient(daily_quota=1) as batch:
+        invalid = batch.post([{"id": "batch-no-title"}])
+        empty = batch.post([])
+        too_large = batch.post([_item(f"batch-large-{n}") for n in range(webhook.MAX_BATCH_SIZE + 1)])
+        over_quota = batch.post([_item("batch-quota-1"), _item("batch-quota-2")])
+        wrong_type = batch.client.post('/news-webhook/batch', data="[]", content_type='text/plain',
+                                       headers={'X-Webhook-Secret': SECRET})
+        unknown = batch.client.post('/news-webhook/batch', json={"news": [_item("batch-unknown")]},
+                                    headers={'X-Webhook-Secret': "wrong"})
+
+    assert invalid.status_code == 400 and invalid.get_json()["results"][0]["status"] == "invalid"
+    assert empty.status_code == 400
+    assert too_large.status_code == 413
+    assert over_quota.status_code == 429 and 'Retry-After' in over_quota.headers
+    assert wrong_type.status_code == 415
+    assert unknown.status_code == 403
+    # Nothing from a rejected batch was logged or planned
+    assert database.get_broadcast("batch-quota-1") is None
+    assert batch.drained == []
+
+
+if __name__ == "__main__":
+    test_batch_accepts_valid_items_and_reports_the_rest()
+    test_retried_batch_is_answered_as_duplicate()
+    test_rejected_batches()
+    print("✅ News batches are validated per item and accepted as one job")
@@ -0,0 +1,113 @@
+"""POST /news-webhook/stream through Flask: one ack per NDJSON line, and per-line rejections.
+
+Drives the Flask blueprint with its test client against a throwaway SQLite
+database; the drain itself is replaced by a recorder, so nothing is sent.
+test_asgi_stream.py covers the native ASGI route:
+
+    python test_webhook_stream.py
+"""
+import json
+import os
+import tempfile
+import time
+
+# Must be set before config.py is imported
+os.environ['DATABASE_FILE'] = os.path.join(tempfile.mkdtemp(), 'test_webhook_stream.db')
+os.environ['DATABASE_URL'] = ''
+
+from flask import Flask
+import database
+import webhook
+from producers import Producer, ProducerRegistry
+
+SECRET = "test-webhook-stream-secret"
+CHAT_ID = 31_000  # clear of chats other test modules add to the shared database
+
+
+def _line(news_id, title="Title"):
+    return json.dumps({"id": news_id, "title": title, "content": f"Story {news_id}"}) + "\n"
+
+
+def _stream(body, daily_quota=100, secret=SECRET, content_type='application/x-ndjson'):
+    """POST `body`; returns (response, acks, drained news_ids, producer)."""
+    producer = Producer("test-stream", SECRET, rate=1000, burst=1000, daily_quota=daily_quota)
+    drained = []
+
+    async def drain(news, *args, **kwargs):
+        drained.append(news.news_id)
+        return 0, 0
+
+    app = Flask(__name__)
+    app.register_blueprint(webhook.webhook_bp)
+    saved = webhook.producers, webhook.drain_outbox
+    webhook.producers, webhook.drain_outbox = ProducerRegistry([producer]), drain
+    try:
+        response = app.test_client().post('/news-webhook/stream', data=body, content_type=content_type,
+                                          headers={'X-Webhook-Secret': secret})
+        acks = [json.loads(line) for line in response.get_data().splitlines()] if response.status_code == 200 else []
+        accepted = sum(ack['status'] == 'accepted' for ack in acks)
+        deadline = time.monotonic() + 5
+        while len(drained) < accepted and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        webhook.producers, webhook.drain_outbox = saved
+
+    for news_id in drained:
+        # Leave nothing pending for other modules that resume broadcasts from the shared database
+        database.retract_broadcast(news_id, "test finished")
+    return response, acks, drained, producer
+
+
+def test_every_line_is_acked():
+    database.init_db()
+    database.add_chat(CHAT_ID, "Stream chat", 'private')
+    body = (
+        _line("stream-1")
+        + "\n"                                              # blank lines are skipped
+        + "{not json\n"
+        + json.dumps({"id": "stream-no-title"}) + "\n"
+        + "x" * (webhook.MAX_STREAM_LINE_BYTES + 10) + "\n"   # too long to buffer
+        + _line("stream-1", "Retried")
+        + _line("stream-2")
+    )
+    response, acks, drained, producer = _stream(body)
+    # Other test modules plan broadcasts to every chat in the shared database
+    database.remove_chat(CHAT_ID)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert [(ack.get('line'), ack['status']) for ack in acks] == [
+        (1, 'accepted'), (3, 'invalid'), (4, 'invalid'), (5, 'invalid'),
+        (6, 'duplicate'), (7, 'accepted'), (None, 'done'),
+    ]
+    assert "exceeds" in acks[3]['error']
+    assert (acks[-1]['accepted'], acks[-1]['rejected']) == (2, 4)
+    # Each accepted item was logged, planned and queued as its own drain
+    assert sorted(drained) == ["stream-1", "stream-2"]
+    assert database.get_broadcast("stream-2") is not None
+    assert producer.used_today == 2
+
+
+def test_items_past_the_quota_are_refused_individually():
+    body = "".join(_line(f"stream-quota-{n}") for n in range(3))
+    response, acks, drained, producer = _stream(body, daily_quota=2)
+
+    assert [ack['status'] for ack in acks] == ['accepted', 'accepted', 'quota_exceeded', 'done']
+    assert acks[2]['retry_after'] > 0
+    assert database.get_broadcast("stream-quota-2") is None
+    assert producer.used_today == 2
+
+
+def test_rejected_streams():
+    wrong_type, _, _, _ = _stream(_line("stream-json"), content_type='application/json')
+    unknown, _, _, _ = _stream(_line("stream-unknown"), secret="wrong")
+    assert wrong_type.status_code == 415
+    assert unknown.status_code == 403
+    assert database.get_broadcast("stream-json") is None
+
+
+if __name__ == "__main__":
+    test_every_line_is_acked()
+    test_items_past_the_quota_are_refused_individually()
+    test_rejected_streams()
+    print("✅ Streamed news items are acked line by line")
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from config import UPDATE_CONCURRENCY, UPDATE_MAX_PENDING
+
+logger = logging.getLogger(__name__)
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently across chats but strictly in order within a chat.
+
+    Every chat has one logical lane: an update waits for the previous update
+    of the same chat to finish, then for one of `concurrency` global handler
+    slots. Waiting for a chat's turn does not hold a slot, so a busy group
+    can occupy at most one slot and never delays replies in other chats.
+    A lane exists only while its chat has updates in flight and is evicted
+    as soon as it goes idle.
+
+    PTB's own semaphore (`max_concurrent_updates`) bounds the updates admitted
+    at once, running or waiting.
+    """
+
+    def __init__(self, concurrency=UPDATE_CONCURRENCY, max_pending=UPDATE_MAX_PENDING):
+        super().__init__(max(max_pending, concurrency))
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tails = {}  # lane key -> future resolved when the lane's latest update finishes
+        self.pending = 0
+        self.running = 0
+        self.processed = 0
+
+    @staticmethod
+    def lane_key(update):
+        """The chat an update belongs to (falling back to its user), or None if it has neither."""
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update, coroutine):
+        key = self.lane_key(update)
+        previous = self._tails.get(key) if key is not None else None
+        finished = asyncio.get_running_loop().create_future()
+        if key is not None:
+            # Registered synchronously, so lanes keep the order updates were handed over in
+            self._tails[key] = finished
+
+        self.pending += 1
+        started = False
+        try:
+            if previous is not None:
+                # Shielded: cancelling this update must not cancel the one ahead of it
+                await asyncio.shield(previous)
+            async with self._slots:
+                self.pending -= 1
+                self.running += 1
+                started = True
+                try:
+                    await coroutine
+                finally:
+                    self.running -= 1
+                    self.processed += 1
+        finally:
+            if not started:
+                self.pending -= 1
+                coroutine.close()
+            finished.set_result(None)
+            if key is not None and self._tails.get(key) is finished:
+                del self._tails[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stats(self):
+        """Snapshot of update processing counters."""
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "pending": self.pending,
+            "active_lanes": len(self._tails),
+            "processed": self.processed,
+        }
@@ -1,32 +1,263 @@
+import asyncio
 import logging
 import json
-import asyncio
-import threading
-from flask import Blueprint, request, jsonify, render_template
+import math
+import time
+from functools import partial
+from flask import Blueprint, Response, request, jsonify, render_template, stream_with_context
 from telegram.constants import ParseMode
 from telegram import Update
-from config import WEBHOOK_SECRET
+from config import UPDATE_MAX_PENDING
 import database
-from models import News
-from bot import broadcast_news
+from async_db import db
+from chat_registry import chat_registry
+from models import News, render_cache
+from bot import plan_broadcast, plan_broadcasts, drain_outbox, update_news, retract_news
+from outbound import scheduler
+from progress import registry as progress_registry
+from dispatcher import dispatcher
+from dedup import news_dedup, news_keys
+from update_processor import ChatOrderedUpdateProcessor
+from producers import producers, ADMIT_OK, ADMIT_UNKNOWN, ADMIT_RATE_LIMITED
+from price_history import get_price_history, price_change
 
 logger = logging.getLogger(__name__)
 webhook_bp = Blueprint('webhook', __name__)
 
+# News webhook actions: publish a new story, edit it in place, or delete it everywhere
+ACTION_PUBLISH = 'publish'
+ACTION_UPDATE = 'update'
+ACTION_RETRACT = 'retract'
+NEWS_ACTIONS = (ACTION_PUBLISH, ACTION_UPDATE, ACTION_RETRACT)
+
+MAX_BATCH_SIZE = 500
+MAX_STREAM_LINE_BYTES = 1024 * 1024  # one NDJSON news item; longer lines are rejected, not buffered
+STREAM_MIMETYPES = ('application/x-ndjson', 'application/jsonl')
+MAX_HISTORY_HOURS = 24 * 366 * 5  # longest range /prices/<coin>/history serves
+
 # ✅ Bot Application placeholder - will be set from main.py
 application = None
+application_loop = None
 
-def set_bot_application(app):
-    global application
+def set_bot_application(app, loop=None):
+    """Register the bot Application and the event loop it runs on (default: the running loop)."""
+    global application, application_loop
     application = app
+    application_loop = loop or asyncio.get_running_loop()
 
 @webhook_bp.route('/', methods=['GET'])
 async def index():
     return render_template('index.html')
 
+def health_payload():
+    """Body of the /health endpoint (shared by the Flask and native ASGI handlers)."""
+    processor = getattr(application, 'update_processor', None)
+    return {
+        "status": "ok",
+        "service": "telegram-news-bot",
+        "render_cache": render_cache.stats(),
+        "dispatcher": dispatcher.stats(),
+        "dedup": news_dedup.stats(),
+        "database": db.stats(),
+        "chats": chat_registry.stats(),
+        "updates": processor.stats() if isinstance(processor, ChatOrderedUpdateProcessor) else None
+    }
+
 @webhook_bp.route('/health', methods=['GET'])
 async def health_check():
-    return jsonify({"status": "ok", "service": "telegram-news-bot"})
+    return jsonify(health_payload())
+
+@webhook_bp.route('/broadcasts', methods=['GET'])
+async def list_broadcasts():
+    """Live progress of in-flight (and recently finished) broadcasts."""
+    return jsonify({"broadcasts": progress_registry.all()})
+
+@webhook_bp.route('/broadcasts/<news_id>', methods=['GET'])
+async def get_broadcast(news_id):
+    """Live progress and ETA of one broadcast."""
+    progress = progress_registry.get(news_id)
+    if progress is None:
+        return jsonify({"error": "Unknown broadcast", "news_id": news_id}), 404
+    return jsonify(progress)
+
+def _queue_full():
+    logger.warning("Broadcast queue is full, rejecting webhook")
+    dispatcher.reject()
+    return ({"error": "Broadcast queue is full, retry later", "dispatcher": dispatcher.stats()}, 429,
+            {'Retry-After': str(dispatcher.retry_after())})
+
+def _queue_full_response():
+    payload, status, headers = _queue_full()
+    return jsonify(payload), status, headers
+
+def _producer_denied(producer, outcome, retry_after):
+    if outcome == ADMIT_UNKNOWN:
+        logger.warning("Invalid webhook secret received")
+        return {"error": "Invalid webhook secret"}, 403, {}
+    if outcome == ADMIT_RATE_LIMITED:
+        logger.warning(f"Producer {producer.name} is over its rate limit")
+        error = "Rate limit exceeded, retry later"
+    else:
+        logger.warning(f"Producer {producer.name} has used up its daily quota")
+        error = "Daily quota exceeded"
+    return {"error": error, "producer": producer.name}, 429, {'Retry-After': str(max(1, math.ceil(retry_after)))}
+
+def admit_producer(secret):
+    """Charge one request to the producer owning `secret`, in memory.
+
+    Returns `(producer, None)`, or `(None, (payload, status, headers))` when
+    the secret is unknown or the producer is over its rate limit.
+    """
+    producer, outcome, retry_after = producers.admit(secret)
+    if outcome != ADMIT_OK:
+        return None, _producer_denied(producer, outcome, retry_after)
+    return producer, None
+
+def _reserve_quota(producer, items=1):
+    """Charge `items` to the producer's daily quota; returns a denial response or None."""
+    outcome, retry_after = producers.reserve(producer, items)
+    if outcome != ADMIT_OK:
+        return _producer_denied(producer, outcome, retry_after)
+    return None
+
+def _header_secret():
+    # Producers that send X-Webhook-Secret are checked before the body is parsed
+    return request.headers.get('X-Webhook-Secret')
+
+def _publish_keys(data):
+    """Dedup keys of a publish request, or None for updates, retractions and malformed payloads."""
+    if not isinstance(data, dict) or data.get('action', ACTION_PUBLISH) != ACTION_PUBLISH:
+        return None
+    item = data.get('news')
+    if not isinstance(item, dict):
+        return None
+    return news_keys(item.get('id'), item, data.get('target_chat_id'))
+
+def check_duplicate(data):
+    """Answer a publish that was already accepted recently, without touching SQLite.
+
+    Call only after the producer was admitted. Returns `(payload, status,
+    headers)` for a duplicate, otherwise None.
+    """
+    keys = _publish_keys(data)
+    if not keys:
+        return None
+    matched = news_dedup.find(keys)
+    if matched is None:
+        return None
+    logger.info(f"Duplicate news webhook ignored ({matched})")
+    return {
+        "status": "duplicate",
+        "message": "News was already accepted",
+        "news_id": data['news'].get('id'),
+        "matched": matched.split(':', 1)[0]
+    }, 200, {}
+
+def handle_news_webhook(data, producer=None, deduplicated=False):
+    """Validate and accept one news webhook payload.
+
+    `producer` is the already admitted producer when the secret came in a
+    header; otherwise the body's secret is admitted here. Pass
+    `deduplicated=True` when the caller already ran `check_duplicate`.
+    Returns `(payload, status, headers)` so the Flask view and the native
+    ASGI handler can share it; the broadcast itself runs on the dispatcher.
+    """
+    if not isinstance(data, dict):
+        return {"error": "Expected a JSON object"}, 400, {}
+
+    if producer is None:
+        producer, denied = admit_producer(data.get('secret'))
+        if denied:
+            return denied
+
+    if not data.get('news'):
+        return {"error": "No news data provided"}, 400, {}
+
+    action = data.get('action', ACTION_PUBLISH)
+    if action not in NEWS_ACTIONS:
+        return {"error": f"Unknown action: {action}", "allowed": list(NEWS_ACTIONS)}, 400, {}
+
+    news = News.from_json(data['news'])
+    if action != ACTION_PUBLISH and not news.news_id:
+        return {"error": f"News id is required to {action} a story"}, 400, {}
+
+    # Producer retries are answered from memory before any logging or broadcasting
+    duplicate = None if deduplicated else check_duplicate(data)
+    if duplicate:
+        return duplicate
+
+    crypto_tags = data['news'].get('tags', [])
+    is_crypto_news = any(term in ' '.join(crypto_tags).lower() for term in ['crypto', 'bitcoin', 'ethereum', 'كريبتو', 'بيتكوين', 'إيثريوم'])
+    if is_crypto_news:
+        logger.info(f"Received cryptocurrency news: {news.title}")
+
+    # Claim a dispatcher slot before touching the database: once the outbox is
+    # planned the job must be accepted, or resume_broadcasts would deliver a
+    # story the producer was told to retry
+    if not dispatcher.reserve():
+        return _queue_full()
+
+    denied = _reserve_quota(producer)
+    if denied:
+        dispatcher.release()
+        return denied
+
+    target_chat_id = data.get('target_chat_id')
+    try:
+        db.call(database.log_webhook, news.news_id, json.dumps(data['news']))
+        if action == ACTION_PUBLISH and not target_chat_id:
+            # Persist one delivery row per chat before accepting, so a crash cannot lose the story
+            db.call(plan_broadcast, news)
+    except Exception:
+        dispatcher.release()
+        producers.refund(producer)
+        raise
+
+    async def process_broadcast():
+        try:
+            if action == ACTION_UPDATE:
+                success_count, error_count = await update_news(news, target_chat_id)
+            elif action == ACTION_RETRACT:
+                success_count, error_count = await retract_news(news.news_id, target_chat_id)
+            elif target_chat_id and await db.get_delivered_chat_ids(news.news_id, [target_chat_id]):
+                logger.info(f"News {news.news_id} was already delivered to chat {target_chat_id}, skipping")
+                success_count, error_count = 0, 0
+            elif target_chat_id:
+                logger.info(f"Sending news to specific chat ID: {target_chat_id}")
+                message_text = news.render()
+                message = await scheduler.send(target_chat_id, partial(
+                    application.bot.send_message,
+                    chat_id=target_chat_id,
+                    text=message_text,
+                    parse_mode=ParseMode.MARKDOWN,
+                    disable_web_page_preview=not bool(news.image_url)
+                ))
+                database.message_log.log_message(news.news_id, target_chat_id, message.message_id)
+                success_count, error_count = 1, 0
+            else:
+                success_count, error_count = await drain_outbox(news)
+
+            logger.info(f"Broadcast completed. Success: {success_count}, Errors: {error_count}")
+        except Exception as e:
+            logger.error(f"Error broadcasting news: {e}")
+
+    # Run on the long-lived dispatcher loop instead of a fresh thread and event loop per request
+    dispatcher.submit(process_broadcast, name=f"{action}:{news.news_id}", reserved=True)
+    if action == ACTION_PUBLISH:
+        news_dedup.add(_publish_keys(data))
+
+    response_data = {
+        "status": "success",
+        "message": "News broadcast request accepted",
+        "news_id": news.news_id,
+        "action": action,
+        "producer": producer.name,
+        "target_mode": "single_chat" if target_chat_id else "broadcast"
+    }
+    if target_chat_id:
+        response_data["target_chat_id"] = target_chat_id
+
+    return response_data, 200, {}
 
 @webhook_bp.route('/news-webhook', methods=['POST'])
 async def news_webhook():
@@ -34,78 +265,275 @@ async def news_webhook():
         return jsonify({"error": "Content-Type must be application/json"}), 415
 
     try:
-        data = request.json
-        if not data.get('secret') or data.get('secret') != WEBHOOK_SECRET:
-            logger.warning("Invalid webhook secret received")
-            return jsonify({"error": "Invalid webhook secret"}), 403
+        producer = None
+        if _header_secret():
+            producer, denied = admit_producer(_header_secret())
+            if denied:
+                payload, status, headers = denied
+                return jsonify(payload), status, headers
+
+        payload, status, headers = handle_news_webhook(request.json, producer)
+        return jsonify(payload), status, headers
+    except Exception as e:
+        logger.exception(f"Error processing webhook: {e}")
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
-        if not data.get('news'):
-            return jsonify({"error": "No news data provided"}), 400
+def _parse_news_item(item):
+    """Validate one news item from a batch or stream; raises ValueError."""
+    if not isinstance(item, dict) or not item.get('id') or not item.get('title'):
+        raise ValueError("Each news item needs at least an id and a title")
+    return News.from_json(item)
 
-        news = News.from_json(data['news'])
-        crypto_tags = data['news'].get('tags', [])
-        is_crypto_news = any(term in ' '.join(crypto_tags).lower() for term in ['crypto', 'bitcoin', 'ethereum', 'كريبتو', 'بيتكوين', 'إيثريوم'])
-        if is_crypto_news:
-            logger.info(f"Received cryptocurrency news: {news.title}")
+@webhook_bp.route('/news-webhook/batch', methods=['POST'])
+async def news_webhook_batch():
+    """Accept an array of news items: validate in one pass, log in one transaction, broadcast as one job."""
+    if request.content_type != 'application/json':
+        return jsonify({"error": "Content-Type must be application/json"}), 415
+
+    try:
+        secret = _header_secret()
+        if not secret:
+            data = request.json
+            secret = data.get('secret') if isinstance(data, dict) else None
+        producer, denied = admit_producer(secret)
+        if denied:
+            payload, status, headers = denied
+            return jsonify(payload), status, headers
 
-        database.log_webhook(news.news_id, json.dumps(data['news']))
-        target_chat_id = data.get('target_chat_id')
+        data = request.json
+        items = data.get('news') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "Expected a non-empty 'news' array"}), 400
+        if len(items) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"Batch too large (max {MAX_BATCH_SIZE} items)"}), 413
 
-        async def process_broadcast():
+        # Validate every item in one pass
+        results, accepted, seen = [], [], set()
+        for index, item in enumerate(items):
+            result = {"index": index, "news_id": item.get('id') if isinstance(item, dict) else None}
             try:
-                if target_chat_id:
-                    logger.info(f"Sending news to specific chat ID: {target_chat_id}")
-                    message_text = news.format_telegram_message()
-                    message = await application.bot.send_message(
-                        chat_id=target_chat_id,
-                        text=message_text,
-                        parse_mode=ParseMode.MARKDOWN,
-                        disable_web_page_preview=not bool(news.image_url)
-                    )
-                    database.log_message(news.news_id, target_chat_id, message.message_id)
-                    success_count, error_count = 1, 0
+                news = _parse_news_item(item)
+            except ValueError as e:
+                result.update(status="invalid", error=str(e))
+            else:
+                keys = news_keys(news.news_id, item)
+                if news.news_id in seen:
+                    result.update(status="duplicate", error="Repeated news id in this batch")
+                elif news_dedup.find(keys):
+                    result.update(status="duplicate", error="News was already accepted")
                 else:
-                    success_count, error_count = await broadcast_news(news)
+                    seen.add(news.news_id)
+                    accepted.append((news, item, keys))
+                    result["status"] = "accepted"
+            results.append(result)
 
-                logger.info(f"Broadcast completed. Success: {success_count}, Errors: {error_count}")
-            except Exception as e:
-                logger.error(f"Error broadcasting news: {e}")
+        if not accepted:
+            if all(result["status"] == "duplicate" for result in results):
+                # A retried batch: everything was accepted before
+                return jsonify({"status": "duplicate", "accepted": 0, "results": results})
+            return jsonify({"status": "error", "accepted": 0, "results": results}), 400
 
-        threading.Thread(target=lambda: asyncio.run(process_broadcast()), daemon=True).start()
+        # Claim the dispatcher slot before logging and planning (see handle_news_webhook)
+        if not dispatcher.reserve():
+            return _queue_full_response()
 
-        response_data = {
-            "status": "success",
-            "message": "News broadcast request accepted",
-            "news_id": news.news_id,
-            "target_mode": "single_chat" if target_chat_id else "broadcast"
-        }
-        if target_chat_id:
-            response_data["target_chat_id"] = target_chat_id
+        denied = _reserve_quota(producer, len(accepted))
+        if denied:
+            dispatcher.release()
+            payload, status, headers = denied
+            return jsonify(payload), status, headers
+
+        # Log and plan the whole batch in single transactions
+        news_items = [news for news, _, _ in accepted]
+        try:
+            db.call(database.log_webhooks, [(news.news_id, json.dumps(item)) for news, item, _ in accepted])
+            db.call(plan_broadcasts, news_items)
+        except Exception:
+            dispatcher.release()
+            producers.refund(producer, len(news_items))
+            raise
 
-        return jsonify(response_data)
+        async def process_batch():
+            for news in news_items:
+                try:
+                    success_count, error_count = await drain_outbox(news)
+                    logger.info(f"Batch broadcast of {news.news_id} completed. Success: {success_count}, Errors: {error_count}")
+                except Exception as e:
+                    logger.error(f"Error broadcasting news {news.news_id}: {e}")
+
+        dispatcher.submit(process_batch, name=f"batch:{len(news_items)}", reserved=True)
+        for _, _, keys in accepted:
+            news_dedup.add(keys)
+
+        return jsonify({
+            "status": "success",
+            "message": "News batch accepted",
+            "producer": producer.name,
+            "accepted": len(news_items),
+            "rejected": len(items) - len(news_items),
+            "results": results
+        })
 
     except Exception as e:
-        logger.exception(f"Error processing webhook: {e}")
+        logger.exception(f"Error processing webhook batch: {e}")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
-@webhook_bp.route('/telegram-webhook', methods=['POST'])
-async def telegram_webhook():
-    global application
-    if not application:
-        logger.error("Bot application is not initialized")
-        return jsonify({"error": "Bot not initialized"}), 503
+def _read_lines(stream):
+    """Yield (line_number, bytes) for each line of `stream`, reading at most one line at a time.
+
+    Lines longer than MAX_STREAM_LINE_BYTES are skipped to their end and yielded as None.
+    """
+    line_number = 0
+    while True:
+        line = stream.readline(MAX_STREAM_LINE_BYTES + 1)
+        if not line:
+            return
+        line_number += 1
+        if len(line) > MAX_STREAM_LINE_BYTES and not line.endswith(b'\n'):
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(MAX_STREAM_LINE_BYTES)
+            yield line_number, None
+            continue
+        yield line_number, line
+
+def _ingest_item(news, item, keys, producer):
+    """Charge, log, plan and queue one streamed item; returns the ack fields."""
+    # Claim the dispatcher slot before logging and planning (see handle_news_webhook)
+    if not dispatcher.reserve():
+        dispatcher.reject()
+        return {"status": "queue_full", "retry_after": dispatcher.retry_after()}
+
+    denied = _reserve_quota(producer)
+    if denied:
+        dispatcher.release()
+        return {"status": "quota_exceeded", "retry_after": int(denied[2]['Retry-After'])}
+
+    try:
+        db.call(database.log_webhook, news.news_id, json.dumps(item))
+        db.call(plan_broadcast, news)
+    except Exception:
+        dispatcher.release()
+        producers.refund(producer)
+        raise
+    dispatcher.submit(partial(drain_outbox, news), name=f"stream:{news.news_id}", reserved=True)
+    news_dedup.add(keys)
+    return {"status": "accepted"}
 
+def ingest_stream(stream, producer):
+    """Parse, log and enqueue NDJSON news items as they arrive, yielding one ack line per item."""
+    accepted = rejected = 0
+    for line_number, line in _read_lines(stream):
+        if line is not None and not line.strip():
+            continue
+
+        ack = {"line": line_number}
+        try:
+            if line is None:
+                raise ValueError(f"Line exceeds {MAX_STREAM_LINE_BYTES} bytes")
+            item = json.loads(line)
+            news = _parse_news_item(item)
+        except ValueError as e:
+            # json.JSONDecodeError is a ValueError
+            ack.update(status="invalid", error=str(e))
+        else:
+            ack["news_id"] = news.news_id
+            keys = news_keys(news.news_id, item)
+            if news_dedup.find(keys):
+                ack["status"] = "duplicate"
+            else:
+                ack.update(_ingest_item(news, item, keys, producer))
+
+        if ack["status"] == "accepted":
+            accepted += 1
+        else:
+            rejected += 1
+        yield json.dumps(ack) + "\n"
+
+    logger.info(f"📥 News stream finished. Accepted: {accepted}, Rejected: {rejected}")
+    yield json.dumps({"status": "done", "accepted": accepted, "rejected": rejected}) + "\n"
+
+@webhook_bp.route('/news-webhook/stream', methods=['POST'])
+def news_webhook_stream():
+    """Ingest a (chunked) newline-delimited JSON body of news items, acking each line as it is read.
+
+    The body is never buffered whole: each line is parsed, logged and queued
+    for broadcast before the next one is read. The secret travels in the
+    X-Webhook-Secret header since the body is the item stream itself.
+    """
+    producer, denied = admit_producer(_header_secret())
+    if denied:
+        payload, status, headers = denied
+        return jsonify(payload), status, headers
+
+    if request.mimetype not in STREAM_MIMETYPES:
+        return jsonify({"error": "Content-Type must be application/x-ndjson"}), 415
+
+    return Response(stream_with_context(ingest_stream(request.stream, producer)), mimetype='application/x-ndjson')
+
+@webhook_bp.route('/producers', methods=['GET'])
+async def producer_stats():
+    """Per-producer request and quota usage."""
+    return jsonify({"producers": producers.stats()})
+
+@webhook_bp.route('/prices/<coin>/history', methods=['GET'])
+async def price_history(coin):
+    """OHLC candles of one coin over the last `hours` (default 24), at the coarsest fitting resolution."""
     try:
-        update_json = request.get_json()
-        logger.debug(f"Received Telegram update: {update_json}")
+        hours = float(request.args.get('hours', 24))
+    except ValueError:
+        return jsonify({"error": "hours must be a number"}), 400
+    if not 0 < hours <= MAX_HISTORY_HOURS:
+        return jsonify({"error": f"hours must be between 0 and {MAX_HISTORY_HOURS}"}), 400
 
-        # ✅ Convert JSON to Update object (MUST)
-        update = Update.de_json(update_json, application.bot)
+    coin = coin.upper()
+    resolution, candles = await db.run(get_price_history, coin, time.time() - hours * 3600, write=False)
+    return jsonify({
+        "coin": coin,
+        "resolution": resolution,
+        "candles": [
+            {"time": bucket, "open": open_, "high": high, "low": low, "close": close, "ticks": ticks}
+            for bucket, open_, high, low, close, ticks in candles
+        ],
+        "change": price_change(candles),
+    })
 
-        # ✅ Process the update fully
-        await application.process_update(update)
+def handle_telegram_update(update_json):
+    """Hand one Telegram update to the bot's own loop and acknowledge it immediately.
 
-        return jsonify({"status": "success"}), 200
+    The update goes onto `application.update_queue` through
+    `call_soon_threadsafe`, so it is processed by the Application on the loop
+    it was started on, and Telegram gets its 200 without waiting for handlers.
+    Returns `(payload, status)` for either transport.
+    """
+    if not application or not application.running or application_loop is None:
+        logger.error("Bot application is not initialized")
+        return {"error": "Bot not initialized"}, 503
+
+    if not isinstance(update_json, dict):
+        return {"error": "Invalid update"}, 400
+
+    # Telegram redelivers on a non-2xx answer, so shed load once the backlog is full
+    backlog = application.update_queue.qsize() + getattr(application.update_processor, 'pending', 0)
+    if backlog >= UPDATE_MAX_PENDING:
+        logger.warning(f"Telegram update backlog is full ({backlog} >= UPDATE_MAX_PENDING={UPDATE_MAX_PENDING}), "
+                       f"asking Telegram to retry")
+        return {"error": "Update backlog is full"}, 503
+
+    logger.debug(f"Received Telegram update: {update_json}")
+
+    # ✅ Convert JSON to Update object (MUST)
+    update = Update.de_json(update_json, application.bot)
+
+    # ✅ Queue for the Application's update fetcher on its own loop
+    application_loop.call_soon_threadsafe(application.update_queue.put_nowait, update)
+
+    return {"status": "accepted"}, 200
+
+@webhook_bp.route('/telegram-webhook', methods=['POST'])
+def telegram_webhook():
+    try:
+        payload, status = handle_telegram_update(request.get_json(silent=True))
+        return jsonify(payload), status
     except Exception as e:
         logger.exception(f"Error processing Telegram webhook: {e}")
         return jsonify({"error": str(e)}), 500